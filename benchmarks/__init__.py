@@ -0,0 +1,9 @@
+"""
+Benchmarks of super_simple_stocks. The scripts are run as modules from the repository root,
+for example:
+
+    python -m benchmarks.suite --trades 1000000 --instruments 1000 --output results.json
+
+market generates seeded synthetic trades, harness measures throughput, latency percentiles
+and peak memory and stores the results, and suite runs the scenarios of the hot paths.
+"""
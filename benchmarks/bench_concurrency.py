@@ -0,0 +1,79 @@
+"""
+Measures an exchange shared between one thread recording trades and a number of threads
+reading snapshots of its stocks and the all share index. Run from the repository root:
+
+    python -m benchmarks.bench_concurrency [number_of_trades]
+"""
+import random
+import sys
+import threading
+import time
+
+from datetime import datetime, timedelta
+from super_simple_stocks import Trade, Stock, StockType, BuySellIndicator, GlobalBeverageCorporationExchange
+
+START = datetime(2018, 5, 4, 8)
+STOCKS = 64
+
+
+def make_exchange() -> GlobalBeverageCorporationExchange:
+    stocks = [Stock("S{i:02d}".format(i=i), StockType.COMMON, 100, 1.0, None) for i in range(STOCKS)]
+    return GlobalBeverageCorporationExchange({stock.symbol_and_type(): stock for stock in stocks})
+
+
+def make_trades(n: int, seed: int=1) -> [Trade]:
+    rng = random.Random(seed)
+    return [Trade("S{i:02d}".format(i=rng.randrange(STOCKS)), StockType.COMMON, START + timedelta(milliseconds=i),
+                  rng.randint(1, 500), rng.uniform(100, 200), BuySellIndicator.BUY)
+            for i in range(n)]
+
+
+def run(trades: [Trade], readers: int) -> (float, int):
+    """
+    :return: The seconds taken by the writer to record the trades, and the number of reads
+        done meanwhile by all the readers.
+    """
+    exchange = make_exchange()
+    done = threading.Event()
+    reads = [0] * readers
+
+    def write():
+        for trade in trades:
+            exchange.record_trade(trade)
+        done.set()
+
+    def read(reader: int):
+        rng = random.Random(reader)
+        keys = ["S{i:02d}_COMMON".format(i=i) for i in range(STOCKS)]
+        count = 0
+        while not done.is_set():
+            current_time = START + timedelta(milliseconds=rng.randrange(len(trades)))
+            if count % 10 == 0:
+                exchange.all_share_index(current_time)
+            else:
+                exchange.get_stock(rng.choice(keys)).price(current_time)
+            count += 1
+        reads[reader] = count
+
+    threads = [threading.Thread(target=read, args=(reader,)) for reader in range(readers)]
+    for thread in threads:
+        thread.start()
+    begin = time.perf_counter()
+    write()
+    seconds = time.perf_counter() - begin
+    for thread in threads:
+        thread.join()
+    return seconds, sum(reads)
+
+
+def main(n: int):
+    trades = make_trades(n)
+    print("{n} trades, {stocks} stocks".format(n=n, stocks=STOCKS))
+    print("{:<10}{:>20}{:>20}".format("readers", "trades per s", "reads per s"))
+    for readers in (0, 1, 2, 4, 8):
+        seconds, reads = run(trades, readers)
+        print("{:<10}{:>20.0f}{:>20.0f}".format(readers, n / seconds, reads / seconds))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -0,0 +1,117 @@
+"""
+Measures the throughput and the latency of ExchangeServer with a local load generator: the
+server runs in another process on a Unix socket, several connections send batches of trades,
+and another one sends queries meanwhile. Run from the repository root:
+
+    python -m benchmarks.bench_exchange_server [number_of_trades]
+"""
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+from datetime import datetime, timedelta
+from super_simple_stocks import Trade, Stock, StockType, BuySellIndicator, GlobalBeverageCorporationExchange
+from exchange_server import ExchangeServer, ExchangeClient
+from benchmarks.harness import percentile
+
+START = datetime(2018, 5, 4, 8)
+STOCKS = 16
+
+
+def make_exchange() -> GlobalBeverageCorporationExchange:
+    stocks = [Stock("S{i:02d}".format(i=i), StockType.COMMON, 100, 1.0, None) for i in range(STOCKS)]
+    return GlobalBeverageCorporationExchange({stock.symbol_and_type(): stock for stock in stocks})
+
+
+def make_trades(n: int, seed: int=1) -> [Trade]:
+    rng = random.Random(seed)
+    return [Trade("S{i:02d}".format(i=rng.randrange(STOCKS)), StockType.COMMON, START + timedelta(milliseconds=i),
+                  rng.randint(1, 500), rng.uniform(100, 200), BuySellIndicator.BUY)
+            for i in range(n)]
+
+
+def serve(path: str, ready):
+    async def run_server():
+        server = ExchangeServer(make_exchange())
+        await server.start(path=path)
+        ready.set()
+        await asyncio.Event().wait()
+    asyncio.run(run_server())
+
+
+async def generate_load(path: str, trades: [Trade], connections: int, batch: int, in_flight: int,
+                        query: bool) -> (float, [float], [float]):
+    """
+    :param query: Whether another connection sends one query after another while the trades are sent
+    :return: The seconds taken to record the trades, and the latencies of the requests of trades
+        and of the queries.
+    """
+    trade_latencies = []
+    query_latencies = []
+    batches = [trades[i:i + batch] for i in range(0, len(trades), batch)]
+    finished = asyncio.Event()
+
+    async def timed(request, latencies):
+        begin = time.perf_counter()
+        await request
+        latencies.append(time.perf_counter() - begin)
+
+    async def send_trades(client, my_batches):
+        requests = set()
+        for trades_batch in my_batches:
+            if len(requests) >= in_flight:
+                done, requests = await asyncio.wait(requests, return_when=asyncio.FIRST_COMPLETED)
+            requests.add(asyncio.ensure_future(timed(client.record_trades(trades_batch), trade_latencies)))
+        await asyncio.gather(*requests)
+
+    async def send_queries(client):
+        rng = random.Random(2)
+        while not finished.is_set():
+            trade = rng.choice(trades)
+            await timed(client.price(trade.symbol_and_type(), trade.timestamp), query_latencies)
+
+    clients = [await ExchangeClient.connect(path=path) for _ in range(connections + 1)]
+    queries = asyncio.ensure_future(send_queries(clients[-1]) if query else finished.wait())
+    begin = time.perf_counter()
+    await asyncio.gather(*[send_trades(client, batches[i::connections]) for i, client in enumerate(clients[:-1])])
+    seconds = time.perf_counter() - begin
+    finished.set()
+    await queries
+    for client in clients:
+        await client.close()
+    return seconds, trade_latencies, query_latencies
+
+
+def main(n: int):
+    trades = make_trades(n)
+    print("{n} trades, {cpus} CPUs".format(n=n, cpus=os.cpu_count()))
+    print("{:<34}{:>14}{:>16}{:>16}{:>16}".format("load", "trades per s", "trades p99 [ms]", "query p50 [ms]",
+                                                  "query p99 [ms]"))
+    loads = [("1 trade per round trip", 1, 1, 1, False),
+             ("batches of 100, 4 connections", 4, 100, 4, True),
+             ("batches of 1000, 4 connections", 4, 1000, 4, True)]
+    for name, connections, batch, in_flight, query in loads:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "exchange.sock")
+            ready = multiprocessing.Event()
+            server = multiprocessing.Process(target=serve, args=(path, ready), daemon=True)
+            server.start()
+            ready.wait()
+            # One trade per round trip is slow, so it only sends a tenth of the trades.
+            load_trades = trades[:n // 10] if batch == 1 else trades
+            seconds, trade_latencies, query_latencies = asyncio.run(
+                generate_load(path, load_trades, connections, batch, in_flight, query))
+            server.terminate()
+            server.join()
+
+        print("{:<34}{:>14.0f}{:>16.2f}{:>16.2f}{:>16.2f}".format(
+            name, len(load_trades) / seconds, percentile(trade_latencies, 0.99) * 1000,
+            percentile(query_latencies, 0.5) * 1000, percentile(query_latencies, 0.99) * 1000))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -0,0 +1,34 @@
+"""
+Measures the overhead of the instrumentation on the scenarios of the suite, by running each of
+them with the instrumentation disabled and enabled. Run from the repository root:
+
+    python -m benchmarks.bench_instrumentation [number_of_trades]
+"""
+import sys
+
+import instrumentation
+from benchmarks.market import Market
+from benchmarks.suite import SCENARIOS, run
+
+
+def main(n: int, repeat: int=3):
+    market = Market(instruments=100, out_of_order=0.01)
+    print("{n} trades, {config}".format(n=n, config=market.config()))
+    print("{:<18}{:>18}{:>18}{:>12}".format("scenario", "disabled [op/s]", "enabled [op/s]", "overhead"))
+    for name in SCENARIOS:
+        best = {}
+        for enabled in (False, True):
+            for _ in range(repeat):
+                if enabled:
+                    instrumentation.enable()
+                try:
+                    result, = run(market, n, [name], memory=False)
+                finally:
+                    instrumentation.disable()
+                best[enabled] = max(best.get(enabled, 0.0), result['throughput'])
+        print("{:<18}{:>18.0f}{:>18.0f}{:>11.1f}%".format(name, best[False], best[True],
+                                                          (best[False] / best[True] - 1) * 100))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
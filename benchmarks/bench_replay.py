@@ -0,0 +1,53 @@
+"""
+Compares sampling the all share index and the prices of every stock once a second over a
+synthetic day, replayed by replay.Replay, with calling all_share_index and Stock.price of an
+exchange holding the whole day for each sample. Run from the repository root:
+
+    python -m benchmarks.bench_replay [number_of_trades]
+"""
+import operator
+import sys
+import time
+
+from datetime import timedelta
+from benchmarks.market import Market
+from replay import Replay
+from super_simple_stocks import GlobalBeverageCorporationExchange
+
+
+def main(n: int, instruments: int=100):
+    market = Market(instruments=instruments, rate=10.0, out_of_order=0.01)
+    trades = sorted(market.trades(n), key=operator.attrgetter('timestamp'))
+    start = trades[0].timestamp
+    end = trades[-1].timestamp
+    step = timedelta(seconds=1)
+    print("{n} trades, {config}".format(n=n, config=market.config()))
+
+    started = time.perf_counter()
+    count = sum(1 for _ in Replay(market.stocks(), trades).samples(start, end, step))
+    replay_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    Replay(market.stocks(), trades).arrays(start, end, step)
+    arrays_seconds = time.perf_counter() - started
+
+    exchange = GlobalBeverageCorporationExchange(market.stocks())
+    exchange.record_trades(trades)
+    stocks = list(exchange.get_all_stocks().values())
+    started = time.perf_counter()
+    moment = start
+    while moment < end:
+        exchange.all_share_index(moment)
+        for stock in stocks:
+            stock.price(moment)
+        moment += step
+    exchange_seconds = time.perf_counter() - started
+
+    print("{:<34}{:>14}{:>14}".format("", "seconds", "samples/s"))
+    for name, seconds in (("Replay.samples", replay_seconds), ("Replay.arrays", arrays_seconds),
+                          ("all_share_index and Stock.price", exchange_seconds)):
+        print("{:<34}{:>14.3f}{:>14.0f}".format(name, seconds, count / seconds))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
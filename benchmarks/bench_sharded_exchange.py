@@ -0,0 +1,65 @@
+"""
+Compares GlobalBeverageCorporationExchange with ShardedExchange for 1 to N shards, recording
+batches of trades for many stocks and computing the all share index. Run from the repository
+root:
+
+    python -m benchmarks.bench_sharded_exchange [number_of_trades] [number_of_shards]
+"""
+import os
+import random
+import sys
+import time
+
+from datetime import datetime, timedelta
+from super_simple_stocks import Trade, Stock, StockType, BuySellIndicator, GlobalBeverageCorporationExchange
+from sharded_exchange import ShardedExchange
+
+START = datetime(2018, 5, 4, 8)
+
+
+def make_stocks(count: int) -> {str: Stock}:
+    stocks = [Stock("S{i:04d}".format(i=i), StockType.COMMON, 100, 1.0, None) for i in range(count)]
+    return {stock.symbol_and_type(): stock for stock in stocks}
+
+
+def make_trades(n: int, stocks: int, seed: int=1) -> [Trade]:
+    rng = random.Random(seed)
+    return [Trade("S{i:04d}".format(i=rng.randrange(stocks)), StockType.COMMON, START + timedelta(milliseconds=i),
+                  rng.randint(1, 500), rng.uniform(100, 200), BuySellIndicator.BUY)
+            for i in range(n)]
+
+
+def bench(exchange, trades: [Trade], batch: int=10000) -> (float, float):
+    """
+    :return: The seconds taken to record the trades, until the exchange has recorded all of them,
+        and the seconds taken to compute the all share index afterwards.
+    """
+    current_time = trades[-1].timestamp
+    begin = time.perf_counter()
+    for i in range(0, len(trades), batch):
+        exchange.record_trades(trades[i:i + batch])
+    # The first index waits for every shard to record its trades.
+    exchange.all_share_index(current_time)
+    ingest = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    exchange.all_share_index(current_time + timedelta(minutes=1))
+    return ingest, time.perf_counter() - begin
+
+
+def main(n: int, max_shards: int, stocks: int=256):
+    trades = make_trades(n, stocks)
+    print("{n} trades, {stocks} stocks, {cpus} CPUs".format(n=n, stocks=stocks, cpus=os.cpu_count()))
+    print("{:<24}{:>14}{:>18}{:>14}".format("exchange", "record [s]", "trades per s", "index [s]"))
+
+    ingest, index = bench(GlobalBeverageCorporationExchange(make_stocks(stocks)), trades)
+    print("{:<24}{:>14.3f}{:>18.0f}{:>14.4f}".format("in-process", ingest, n / ingest, index))
+    for shards in range(1, max_shards + 1):
+        with ShardedExchange(make_stocks(stocks), shards=shards) as exchange:
+            ingest, index = bench(exchange, trades)
+        print("{:<24}{:>14.3f}{:>18.0f}{:>14.4f}".format("{s} shards".format(s=shards), ingest, n / ingest, index))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1)
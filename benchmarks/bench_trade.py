@@ -0,0 +1,51 @@
+"""
+Measures the memory used per instance of Trade and the rate at which they are constructed,
+through the validating initializer and, when available, through Trade.from_tuples. Run from
+the repository root:
+
+    python -m benchmarks.bench_trade [number_of_trades]
+"""
+import sys
+import time
+import tracemalloc
+
+from datetime import datetime, timedelta
+from super_simple_stocks import Trade, StockType, BuySellIndicator
+
+
+def make_rows(n: int) -> [tuple]:
+    start = datetime(2018, 5, 4, 8)
+    return [("AMZN", StockType.COMMON, start + timedelta(milliseconds=i), 100 + i % 50, 150.0 + i % 7,
+             BuySellIndicator.BUY) for i in range(n)]
+
+
+def bytes_per_trade(rows: [tuple]) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    trades = [Trade(*row) for row in rows]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    # The list holding the trades is not part of their footprint.
+    return (used - sys.getsizeof(trades)) / len(trades)
+
+
+def trades_per_second(construct, rows: [tuple], repeat: int=5) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        construct(rows)
+        best = min(best, time.perf_counter() - begin)
+    return len(rows) / best
+
+
+def main(n: int):
+    rows = make_rows(n)
+    print("bytes per trade:                {:>12.1f}".format(bytes_per_trade(rows)))
+    print("trades per second, Trade():     {:>12.0f}".format(
+        trades_per_second(lambda rows: [Trade(*row) for row in rows], rows)))
+    if hasattr(Trade, 'from_tuples'):
+        print("trades per second, from_tuples: {:>12.0f}".format(trades_per_second(Trade.from_tuples, rows)))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -0,0 +1,84 @@
+"""
+Compares recording trades in a plain list with my_insort_left against TradeLog.insert,
+for in-order, slightly shuffled and fully random arrival. Run from the repository root:
+
+    python -m benchmarks.bench_trade_log [number_of_trades]
+"""
+import random
+import sys
+import time
+
+from datetime import datetime, timedelta
+from super_simple_stocks import Trade, TradeLog, StockType, BuySellIndicator, my_insort_left, my_bisect_left
+
+
+def make_trades(n: int, arrival: str, seed: int=1) -> [Trade]:
+    """
+    :param n: The number of trades
+    :param arrival: One of "in-order", "slightly shuffled" or "random"
+    :param seed: The seed of the random generator
+    :return: The trades in the order in which they arrive.
+    """
+    rng = random.Random(seed)
+    start = datetime(2018, 5, 4, 8)
+    trades = [Trade("AMZN", StockType.COMMON, start + timedelta(milliseconds=10 * i),
+                    rng.randint(1, 500), rng.uniform(100, 200), BuySellIndicator.BUY)
+              for i in range(n)]
+
+    if arrival == "slightly shuffled":
+        # Every 20th trade arrives up to 50 trades late.
+        for i in range(0, n - 50, 20):
+            j = i + rng.randint(1, 50)
+            trades[i], trades[j] = trades[j], trades[i]
+    elif arrival == "random":
+        rng.shuffle(trades)
+    return trades
+
+
+def bench_list(trades: [Trade]) -> float:
+    history = []
+    begin = time.perf_counter()
+    for trade in trades:
+        my_insort_left(history, trade, keyfunc=lambda v: v.timestamp)
+    return time.perf_counter() - begin
+
+
+def bench_trade_log(trades: [Trade]) -> float:
+    history = TradeLog("AMZN", StockType.COMMON)
+    begin = time.perf_counter()
+    for trade in trades:
+        history.insert(trade)
+    return time.perf_counter() - begin
+
+
+def bench_lookups(trades: [Trade], lookups: int=10000) -> (float, float):
+    ordered = sorted(trades, key=lambda v: v.timestamp)
+    history = TradeLog("AMZN", StockType.COMMON)
+    for trade in ordered:
+        history.insert(trade)
+    moments = [trade.timestamp for trade in random.Random(2).choices(ordered, k=lookups)]
+
+    begin = time.perf_counter()
+    for moment in moments:
+        my_bisect_left(ordered, moment, keyfunc=lambda v: v.timestamp if type(v) is Trade else v)
+    list_time = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    for moment in moments:
+        history.bisect_left(moment)
+    return list_time, time.perf_counter() - begin
+
+
+def main(n: int):
+    print("{n} trades".format(n=n))
+    print("{:<20}{:>22}{:>22}".format("arrival", "my_insort_left [s]", "TradeLog.insert [s]"))
+    for arrival in ("in-order", "slightly shuffled", "random"):
+        trades = make_trades(n, arrival)
+        print("{:<20}{:>22.3f}{:>22.3f}".format(arrival, bench_list(trades), bench_trade_log(trades)))
+
+    list_time, log_time = bench_lookups(make_trades(n, "in-order"))
+    print("{:<20}{:>22.3f}{:>22.3f}".format("10000 lookups", list_time, log_time))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
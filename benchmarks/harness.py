@@ -0,0 +1,125 @@
+"""
+Measures the operations of a benchmark scenario and stores the results as JSON, so the results
+of different commits can be compared.
+"""
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from array import array
+
+
+def percentile(values, fraction: float) -> float:
+    """
+    :param values: The measured values
+    :param fraction: The fraction of the values at or below the percentile, such as 0.99
+    :return: The nearest-rank percentile, or NaN if there are no values.
+    """
+    if len(values) == 0:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class Measurement:
+    """The time taken by the calls of an operation. Every sample_every-th call is timed on its own,
+    for the latency percentiles."""
+    def __init__(self, sample_every: int=1):
+        self.sample_every = sample_every
+        self.operations = 0
+        self.items = 0
+        self.seconds = 0.0
+        self.latencies = array('d')
+        self.peak_memory = None
+
+    def run(self, operation, arguments, size=None):
+        """Calls the operation with each of the arguments.
+        :param operation: A callable of one argument
+        :param arguments: A list of the arguments of the calls
+        :param size: A callable giving the number of items handled by a call from its argument,
+            such as len for batches of trades, or None if each call handles one item
+        """
+        self.items += sum(map(size, arguments)) if size is not None else len(arguments)
+        clock = time.perf_counter
+        latencies = self.latencies
+        sample_every = self.sample_every
+        count = self.operations
+        begin = clock()
+        for argument in arguments:
+            if count % sample_every == 0:
+                start = clock()
+                operation(argument)
+                latencies.append(clock() - start)
+            else:
+                operation(argument)
+            count += 1
+        self.seconds += clock() - begin
+        self.operations = count
+
+    def result(self) -> dict:
+        return {'operations': self.operations,
+                'seconds': self.seconds,
+                'throughput': self.operations / self.seconds if self.seconds > 0 else None,
+                'items': self.items,
+                'items_per_second': self.items / self.seconds if self.seconds > 0 else None,
+                'p50_us': percentile(self.latencies, 0.5) * 1e6,
+                'p99_us': percentile(self.latencies, 0.99) * 1e6,
+                'p999_us': percentile(self.latencies, 0.999) * 1e6,
+                'peak_memory_bytes': self.peak_memory}
+
+
+def peak_memory(function) -> int:
+    """
+    :param function: A callable without arguments
+    :return: The peak of the memory allocated while it runs, in bytes, as traced by tracemalloc.
+    .. note:: Tracing slows the allocations down, so timings are not taken in the same run.
+    """
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def environment() -> dict:
+    """
+    :return: The commit of the repository, if known, the version of Python and the platform.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                check=True).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'python': sys.version.split()[0], 'implementation': platform.python_implementation(),
+            'platform': platform.platform(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def save(path: str, config: dict, results: [dict]):
+    with open(path, 'w') as file:
+        json.dump({'environment': environment(), 'config': config, 'results': results}, file, indent=2)
+
+
+def load(path: str) -> dict:
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare(baseline: dict, results: [dict]) -> [(str, float, float)]:
+    """
+    :param baseline: Results as stored by save()
+    :param results: The results of the current run
+    :return: For each scenario in both, its name, the ratio of the current throughput to the
+        baseline one and the ratio of the current p99 latency to the baseline one.
+    """
+    old = {result['scenario']: result for result in baseline['results']}
+    ratios = []
+    for result in results:
+        before = old.get(result['scenario'])
+        if before is not None and before['throughput'] and before['p99_us']:
+            ratios.append((result['scenario'], result['throughput'] / before['throughput'],
+                           result['p99_us'] / before['p99_us']))
+    return ratios
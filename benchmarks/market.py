@@ -0,0 +1,93 @@
+"""
+A seeded synthetic market: instruments with a mix of COMMON and PREFERRED stocks, and trades
+arriving at a given rate, a fraction of them late.
+"""
+import heapq
+import math
+import random
+
+from datetime import datetime, timedelta
+from super_simple_stocks import Trade, Stock, StockType, BuySellIndicator
+
+START = datetime(2018, 5, 4, 8)
+
+
+class Market:
+    """The configuration of a synthetic market. The same configuration always generates the
+    same stocks and trades."""
+    def __init__(self, instruments: int=100, rate: float=1000.0, out_of_order: float=0.0,
+                 max_delay: timedelta=timedelta(seconds=5), preferred: float=0.2, seed: int=1):
+        """
+        :param instruments: The number of stocks
+        :param rate: The mean number of trades per second, which arrive as a Poisson process
+        :param out_of_order: The fraction of the trades that arrive late
+        :param max_delay: The longest delay of a late trade
+        :param preferred: The fraction of the stocks that are PREFERRED
+        :param seed: The seed of the random generators
+        :raise ValueError:
+        """
+        if instruments < 1 or rate <= 0 or not 0 <= out_of_order <= 1 or not 0 <= preferred <= 1:
+            msg = "Invalid market: instruments={i}, rate={r}, out_of_order={o}, preferred={p}".format(
+                i=instruments, r=rate, o=out_of_order, p=preferred)
+            raise ValueError(msg)
+
+        self.instruments = instruments
+        self.rate = rate
+        self.out_of_order = out_of_order
+        self.max_delay = max_delay
+        self.preferred = preferred
+        self.seed = seed
+
+        rng = random.Random(seed)
+        self.stock_types = [StockType.PREFERRED if rng.random() < preferred else StockType.COMMON
+                            for _ in range(instruments)]
+        self.symbols = ["S{i:05d}".format(i=i) for i in range(instruments)]
+        self.base_prices = [rng.uniform(10, 500) for _ in range(instruments)]
+
+    def config(self) -> dict:
+        return {'instruments': self.instruments, 'rate': self.rate, 'out_of_order': self.out_of_order,
+                'max_delay_seconds': self.max_delay.total_seconds(), 'preferred': self.preferred, 'seed': self.seed}
+
+    def stocks(self, **options) -> {str: Stock}:
+        """
+        :param options: Further keyword arguments of Stock, such as columnar
+        :return: A new stock for each instrument, by its symbol_and_type().
+        """
+        rng = random.Random(self.seed + 1)
+        stocks = {}
+        for symbol, stock_type in zip(self.symbols, self.stock_types):
+            fixed_dividend = rng.uniform(0.01, 0.1) if stock_type is StockType.PREFERRED else None
+            stock = Stock(symbol, stock_type, 100, rng.uniform(0, 20), fixed_dividend, **options)
+            stocks[stock.symbol_and_type()] = stock
+        return stocks
+
+    def trades(self, n: int):
+        """
+        :param n: The number of trades
+        :return: A generator of the trades in the order in which they arrive. Their timestamps
+            are those of a Poisson process, and a late trade arrives after the trades of up to
+            max_delay later. Only the late trades waiting to arrive are held in memory.
+        """
+        rng = random.Random(self.seed + 2)
+        mean_gap = 1e6 / self.rate
+        max_delay = self.max_delay / timedelta(microseconds=1)
+        late = []
+        elapsed = 0.0
+
+        for i in range(n):
+            elapsed += -math.log(1.0 - rng.random()) * mean_gap
+            k = rng.randrange(self.instruments)
+            price = self.base_prices[k] * (1 + rng.uniform(-0.01, 0.01))
+            trade = Trade(self.symbols[k], self.stock_types[k], START + timedelta(microseconds=int(elapsed)),
+                          rng.randint(1, 1000), round(price, 2),
+                          BuySellIndicator.BUY if rng.random() < 0.5 else BuySellIndicator.SELL)
+
+            while len(late) > 0 and late[0][0] <= elapsed:
+                yield heapq.heappop(late)[2]
+            if self.out_of_order > 0 and rng.random() < self.out_of_order:
+                heapq.heappush(late, (elapsed + rng.uniform(0, max_delay), i, trade))
+            else:
+                yield trade
+
+        while len(late) > 0:
+            yield heapq.heappop(late)[2]
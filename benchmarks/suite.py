@@ -0,0 +1,155 @@
+"""
+Runs the scenarios of the hot paths of the exchange on a synthetic market, and reports their
+throughput, latency percentiles and peak memory. Run from the repository root, for example:
+
+    python -m benchmarks.suite --trades 1000000 --instruments 1000 --out-of-order 0.05 \
+        --output results.json --compare baseline.json
+"""
+import argparse
+import random
+import sys
+
+import instrumentation
+
+from datetime import timedelta
+from itertools import islice
+from super_simple_stocks import GlobalBeverageCorporationExchange
+from benchmarks.market import Market, START
+from benchmarks.harness import Measurement, peak_memory, save, load, compare
+
+CHUNK = 100000
+
+
+def chunks(iterable, size: int):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+
+def loaded_exchange(market: Market, n: int) -> (GlobalBeverageCorporationExchange, {str: object}):
+    """
+    :return: An exchange with the n trades of the market recorded, and its stocks.
+    """
+    stocks = market.stocks()
+    exchange = GlobalBeverageCorporationExchange(stocks)
+    for chunk in chunks(market.trades(n), CHUNK):
+        exchange.record_trades(chunk)
+    return exchange, stocks
+
+
+def duration(market: Market, n: int) -> timedelta:
+    return timedelta(seconds=n / market.rate)
+
+
+def record_trade(market: Market, n: int, measurement: Measurement):
+    exchange = GlobalBeverageCorporationExchange(market.stocks())
+    for chunk in chunks(market.trades(n), CHUNK):
+        measurement.run(exchange.record_trade, chunk)
+
+
+def record_trades(market: Market, n: int, measurement: Measurement, batch: int=1000):
+    exchange = GlobalBeverageCorporationExchange(market.stocks())
+    for chunk in chunks(market.trades(n), CHUNK):
+        measurement.run(exchange.record_trades, [chunk[i:i + batch] for i in range(0, len(chunk), batch)], len)
+
+
+def price(market: Market, n: int, measurement: Measurement):
+    exchange, stocks = loaded_exchange(market, n)
+    rng = random.Random(market.seed + 3)
+    stocks = list(stocks.values())
+    seconds = duration(market, n).total_seconds()
+    moments = sorted(START + timedelta(seconds=rng.uniform(0, seconds)) for _ in range(min(n, CHUNK)))
+    measurement.run(lambda query: query[0].price(query[1]), [(rng.choice(stocks), moment) for moment in moments])
+
+
+def all_share_index(market: Market, n: int, measurement: Measurement):
+    exchange, stocks = loaded_exchange(market, n)
+    rng = random.Random(market.seed + 4)
+    seconds = duration(market, n).total_seconds()
+    moments = sorted(START + timedelta(seconds=rng.uniform(0, seconds)) for _ in range(min(n // 10 + 1, 10000)))
+    measurement.run(exchange.all_share_index, moments)
+
+
+def get_all_stocks(market: Market, n: int, measurement: Measurement):
+    exchange, stocks = loaded_exchange(market, n)
+    measurement.run(lambda call: exchange.get_all_stocks(), range(100))
+
+
+SCENARIOS = {'record_trade': record_trade,
+             'record_trades': record_trades,
+             'price': price,
+             'all_share_index': all_share_index,
+             'get_all_stocks': get_all_stocks}
+
+
+def run(market: Market, n: int, scenarios: [str], memory: bool=True) -> [dict]:
+    """
+    :param market: The synthetic market
+    :param n: The number of trades of each scenario
+    :param scenarios: The names of the scenarios to run, from SCENARIOS
+    :param memory: Whether to run each scenario a second time, to trace its peak memory
+    :return: The result of each scenario.
+    """
+    results = []
+    for name in scenarios:
+        measurement = Measurement(sample_every=max(1, n // CHUNK))
+        SCENARIOS[name](market, n, measurement)
+        if memory:
+            measurement.peak_memory = peak_memory(lambda: SCENARIOS[name](market, n, Measurement(n + 1)))
+        result = measurement.result()
+        result['scenario'] = name
+        results.append(result)
+    return results
+
+
+def main(argv: [str]):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--trades', type=int, default=100000)
+    parser.add_argument('--instruments', type=int, default=100)
+    parser.add_argument('--rate', type=float, default=1000.0, help="trades per second")
+    parser.add_argument('--out-of-order', type=float, default=0.0, help="fraction of late trades")
+    parser.add_argument('--max-delay', type=float, default=5.0, help="seconds")
+    parser.add_argument('--preferred', type=float, default=0.2, help="fraction of PREFERRED stocks")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--scenarios', default=",".join(SCENARIOS))
+    parser.add_argument('--no-memory', action='store_true', help="skip the traced runs of peak memory")
+    parser.add_argument('--instrument', action='store_true', help="run with the instrumentation enabled")
+    parser.add_argument('--output', help="path of the JSON results")
+    parser.add_argument('--compare', help="path of JSON results to compare with")
+    args = parser.parse_args(argv)
+
+    market = Market(args.instruments, args.rate, args.out_of_order, timedelta(seconds=args.max_delay),
+                    args.preferred, args.seed)
+    if args.instrument:
+        instrumentation.enable()
+    results = run(market, args.trades, args.scenarios.split(","), memory=not args.no_memory)
+
+    print("{n} trades, {config}".format(n=args.trades, config=market.config()))
+    print("{:<18}{:>12}{:>14}{:>16}{:>12}{:>12}{:>12}{:>14}".format(
+        "scenario", "operations", "ops per s", "items per s", "p50 [us]", "p99 [us]", "p99.9 [us]", "peak [MiB]"))
+    for result in results:
+        memory = result['peak_memory_bytes'] / 2 ** 20 if result['peak_memory_bytes'] is not None else float('nan')
+        print("{:<18}{:>12}{:>14.0f}{:>16.0f}{:>12.1f}{:>12.1f}{:>12.1f}{:>14.1f}".format(
+            result['scenario'], result['operations'], result['throughput'], result['items_per_second'],
+            result['p50_us'], result['p99_us'], result['p999_us'], memory))
+
+    if args.instrument:
+        print(instrumentation.active().text())
+        instrumentation.disable()
+
+    if args.compare is not None:
+        print("{:<18}{:>16}{:>16}".format("compared", "throughput x", "p99 x"))
+        for name, throughput, latency in compare(load(args.compare), results):
+            print("{:<18}{:>16.2f}{:>16.2f}".format(name, throughput, latency))
+
+    if args.output is not None:
+        config = market.config()
+        config['trades'] = args.trades
+        save(args.output, config, results)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
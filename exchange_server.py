@@ -0,0 +1,266 @@
+import asyncio
+import struct
+
+from datetime import datetime
+from super_simple_stocks import Trade, GlobalBeverageCorporationExchange, datetime_to_ns, ns_to_datetime
+from trade_journal import RECORD, pack_trade
+from trade_loader import LoadReport, parse_binary_chunk
+
+# Every frame is the length of its payload followed by the payload. The payload of a request
+# starts with REQUEST, and the one of a reply with REPLY.
+FRAME = struct.Struct('<I')
+# The id of the request, chosen by the client, and its kind.
+REQUEST = struct.Struct('<IB')
+# The id of the request answered, the status and the value of the answer. An error is followed
+# by its message in UTF-8.
+REPLY = struct.Struct('<IBd')
+# The body of a query: the current time in epoch nanoseconds, 0 for the time of the server,
+# followed by the symbol_and_type() of the stock in UTF-8.
+QUERY = struct.Struct('<q')
+
+# Kinds of request. The body of TRADES is a sequence of trade_journal.RECORD records, and the
+# value of its reply is the number of rejected trades.
+TRADES = 0
+PRICE = 1
+TICKER_PRICE = 2
+DIVIDEND_YIELD = 3
+ALL_SHARE_INDEX = 4
+
+STATUS_OK = 0
+STATUS_NONE = 1
+STATUS_ERROR = 2
+
+
+async def read_frame(reader: asyncio.StreamReader) -> bytes:
+    """
+    :param reader: The stream to read from
+    :return: The payload of the next frame.
+    :raise asyncio.IncompleteReadError: When the stream ends.
+    """
+    size, = FRAME.unpack(await reader.readexactly(FRAME.size))
+    return await reader.readexactly(size)
+
+
+def pack_frame(payload: bytes) -> bytes:
+    return FRAME.pack(len(payload)) + payload
+
+
+def pack_reply(request_id: int, value, error: Exception=None) -> bytes:
+    if error is not None:
+        return pack_frame(REPLY.pack(request_id, STATUS_ERROR, 0.0) + str(error).encode('utf-8'))
+    elif value is None:
+        return pack_frame(REPLY.pack(request_id, STATUS_NONE, 0.0))
+    else:
+        return pack_frame(REPLY.pack(request_id, STATUS_OK, value))
+
+
+def _pack_result(request_id: int, done: asyncio.Future) -> bytes:
+    if done.cancelled():
+        return pack_reply(request_id, None, asyncio.CancelledError("The request has been cancelled."))
+    elif done.exception() is not None:
+        return pack_reply(request_id, None, done.exception())
+    else:
+        return pack_reply(request_id, done.result())
+
+
+def _write(writer: asyncio.StreamWriter, data: bytes):
+    if not writer.is_closing():
+        writer.write(data)
+
+
+class ExchangeServer:
+    """Serves an exchange over TCP or a Unix socket with the framed protocol of this module.
+    .. note:: The trades received are put in a queue of at most queue_size requests, and recorded
+        in batches of up to batch_size trades by a single task, so a slow exchange stops the
+        server from reading more trades and the clients are held back by the socket. The batches
+        are recorded in the default executor of the loop, so queries are answered as soon as they
+        are read, from the trades recorded so far, without waiting for the queue. A batch that
+        fails to be recorded is answered with the error.
+    """
+    def __init__(self, exchange: GlobalBeverageCorporationExchange, queue_size: int=64, batch_size: int=10000):
+        """
+        :param exchange: The exchange served
+        :param queue_size: The number of requests of trades waiting to be recorded before the
+            server stops reading from the clients
+        :param batch_size: The number of trades recorded at once, at most
+        """
+        self.exchange = exchange
+        self.batch_size = batch_size
+        self._queue_size = queue_size
+        self._queue = None
+        self._ingest_task = None
+        self._server = None
+
+    async def start(self, host: str=None, port: int=None, path: str=None) -> asyncio.AbstractServer:
+        """Starts serving, on the Unix socket at path if it is given, on host and port otherwise.
+        :return: The asyncio server, whose sockets tell the address actually used.
+        """
+        self._queue = asyncio.Queue(self._queue_size)
+        self._ingest_task = asyncio.ensure_future(self._ingest())
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._serve_connection, path)
+        else:
+            self._server = await asyncio.start_server(self._serve_connection, host, port)
+        return self._server
+
+    async def close(self):
+        """Stops serving, after recording the trades already received."""
+        self._server.close()
+        await self._server.wait_closed()
+        await self._queue.join()
+        self._ingest_task.cancel()
+
+    async def _ingest(self):
+        queue = self._queue
+        while True:
+            items = [await queue.get()]
+            count = len(items[0][0])
+            while count < self.batch_size and not queue.empty():
+                items.append(queue.get_nowait())
+                count += len(items[-1][0])
+
+            trades = [trade for item_trades, invalid, future in items for trade in item_trades]
+            try:
+                rejected = await asyncio.get_event_loop().run_in_executor(None, self.exchange.record_trades, trades)
+            except Exception as error:
+                for item_trades, invalid, future in items:
+                    if not future.cancelled():
+                        future.set_exception(error)
+                    queue.task_done()
+                continue
+
+            item_of = {}
+            if len(rejected) > 0:
+                item_of = {trade: i for i, (item_trades, invalid, future) in enumerate(items)
+                           for trade in item_trades}
+            rejected_counts = [invalid for item_trades, invalid, future in items]
+            for trade, error in rejected:
+                rejected_counts[item_of[trade]] += 1
+
+            for (item_trades, invalid, future), rejected_count in zip(items, rejected_counts):
+                if not future.cancelled():
+                    future.set_result(rejected_count)
+                queue.task_done()
+
+    def _query(self, kind: int, body: bytes):
+        current_time, = QUERY.unpack_from(body)
+        current_time = ns_to_datetime(current_time) if current_time != 0 else datetime.now()
+        if kind == ALL_SHARE_INDEX:
+            return self.exchange.all_share_index(current_time)
+
+        symbol_and_type = body[QUERY.size:].decode('utf-8')
+        if kind == PRICE:
+            return self.exchange.stock_price(symbol_and_type, current_time)
+        elif kind == TICKER_PRICE:
+            return self.exchange.stock_ticker_price(symbol_and_type)
+        elif kind == DIVIDEND_YIELD:
+            return self.exchange.stock_dividend_yield(symbol_and_type)
+        else:
+            msg = "Unknown kind of request: {kind}".format(kind=kind)
+            raise ValueError(msg)
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                payload = await read_frame(reader)
+                request_id, kind = REQUEST.unpack_from(payload)
+                body = payload[REQUEST.size:]
+                try:
+                    if kind == TRADES:
+                        report = LoadReport(None, max_samples=0)
+                        trades, numbers = parse_binary_chunk(1, list(RECORD.iter_unpack(body)), report)
+                        future = asyncio.get_event_loop().create_future()
+                        future.add_done_callback(
+                            lambda done, request_id=request_id: _write(writer, _pack_result(request_id, done)))
+                        await self._queue.put((trades, report.rejected, future))
+                    else:
+                        writer.write(pack_reply(request_id, self._query(kind, body)))
+                except (AttributeError, KeyError, ValueError, ZeroDivisionError, struct.error) as error:
+                    writer.write(pack_reply(request_id, None, error))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+class ExchangeClient:
+    """A client of ExchangeServer. Requests may be sent concurrently over the same connection,
+    and are answered as soon as the server handles them."""
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._reader = reader
+        self._writer = writer
+        self._next_id = 0
+        self._pending = {}
+        self._reader_task = asyncio.ensure_future(self._read_replies())
+
+    @classmethod
+    async def connect(cls, host: str=None, port: int=None, path: str=None) -> 'ExchangeClient':
+        """
+        :return: A client connected to the Unix socket at path if it is given, to host and port otherwise.
+        """
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def close(self):
+        self._writer.close()
+        await self._reader_task
+
+    async def _read_replies(self):
+        try:
+            while True:
+                payload = await read_frame(self._reader)
+                request_id, status, value = REPLY.unpack_from(payload)
+                future = self._pending.pop(request_id)
+                if status == STATUS_OK:
+                    future.set_result(value)
+                elif status == STATUS_NONE:
+                    future.set_result(None)
+                else:
+                    future.set_exception(ValueError(payload[REPLY.size:].decode('utf-8')))
+        except (asyncio.IncompleteReadError, ConnectionError) as error:
+            for future in self._pending.values():
+                future.set_exception(ConnectionError(str(error)))
+            self._pending = {}
+
+    async def _request(self, kind: int, body: bytes):
+        request_id = self._next_id
+        self._next_id = (self._next_id + 1) % 2 ** 32
+        future = asyncio.get_event_loop().create_future()
+        self._pending[request_id] = future
+        self._writer.write(pack_frame(REQUEST.pack(request_id, kind) + body))
+        await self._writer.drain()
+        return await future
+
+    async def record_trades(self, trades: [Trade]) -> int:
+        """
+        :param trades: The trades to record
+        :return: The number of trades rejected by the server.
+        """
+        return int(await self._request(TRADES, b''.join(map(pack_trade, trades))))
+
+    def _query_body(self, current_time: datetime, symbol_and_type: str=''):
+        return QUERY.pack(datetime_to_ns(current_time) if current_time is not None else 0) + \
+            symbol_and_type.encode('utf-8')
+
+    async def price(self, symbol_and_type: str, current_time: datetime=None) -> float:
+        """
+        :return: Stock.price of the stock, at the time of the server if current_time is None.
+        :raise ValueError:
+        """
+        return await self._request(PRICE, self._query_body(current_time, symbol_and_type))
+
+    async def ticker_price(self, symbol_and_type: str) -> float:
+        return await self._request(TICKER_PRICE, self._query_body(None, symbol_and_type))
+
+    async def dividend_yield(self, symbol_and_type: str) -> float:
+        return await self._request(DIVIDEND_YIELD, self._query_body(None, symbol_and_type))
+
+    async def all_share_index(self, current_time: datetime=None) -> float:
+        """
+        :return: The all share index of the exchange, at the time of the server if current_time is None.
+        """
+        return await self._request(ALL_SHARE_INDEX, self._query_body(current_time))
@@ -0,0 +1,267 @@
+import functools
+import json
+import sys
+import threading
+import time
+
+from array import array
+from datetime import datetime, timedelta
+from super_simple_stocks import Stock, TradeLog, GlobalBeverageCorporationExchange
+
+
+class Histogram:
+    """A histogram of non-negative integers, such as latencies in nanoseconds, in the manner of
+    HdrHistogram: the buckets are log-linear, so any value is counted with a relative error of at
+    most 2 ** (1 - precision_bits), with a fixed amount of memory.
+    """
+    def __init__(self, precision_bits: int=7):
+        """
+        :param precision_bits: The number of significant bits kept of each value
+        """
+        self._bits = precision_bits
+        self._half = 1 << (precision_bits - 1)
+        # Enough buckets for values up to 2 ** 63.
+        self._counts = array('q', bytes(8 * (64 - precision_bits + 2) * self._half))
+        self.count = 0
+        self.total = 0
+        self._min = 1 << 63
+        self._max = 0
+
+    def _lowest(self, index: int) -> int:
+        """
+        :return: The lowest value counted in the bucket at index.
+        """
+        if index < 2 * self._half:
+            return index
+        shift = index // self._half - 1
+        return (index - shift * self._half) << shift
+
+    @property
+    def min(self) -> int:
+        return self._min if self.count > 0 else None
+
+    @property
+    def max(self) -> int:
+        return self._max if self.count > 0 else None
+
+    def record(self, value: int):
+        # The index of the bucket of value, the inverse of _lowest.
+        shift = value.bit_length() - self._bits
+        self._counts[shift * self._half + (value >> shift) if shift > 0 else value] += 1
+        self.count += 1
+        self.total += value
+        if value > self._max:
+            self._max = value
+        if value < self._min:
+            self._min = value
+
+    def merge(self, other: 'Histogram'):
+        """Adds the values counted by another histogram of the same precision to this one."""
+        for index, count in enumerate(other._counts):
+            if count:
+                self._counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        self._max = max(self._max, other._max)
+        self._min = min(self._min, other._min)
+
+    def percentile(self, fraction: float) -> int:
+        """
+        :param fraction: The fraction of the values at or below the percentile, such as 0.99
+        :return: The lowest value of the bucket holding the percentile, or None if it is empty.
+        """
+        if self.count == 0:
+            return None
+        rank = max(1, int(fraction * self.count + 0.5))
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank:
+                return min(max(self._lowest(index), self.min), self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {'count': self.count, 'mean': self.total / self.count if self.count else None,
+                'min': self.min, 'p50': self.percentile(0.5), 'p90': self.percentile(0.9),
+                'p99': self.percentile(0.99), 'p999': self.percentile(0.999), 'max': self.max}
+
+
+class Instrumentation:
+    """The statistics gathered while the instrumentation is enabled.
+    .. note:: The counts are updated without locks, so a few may be lost while several threads
+        call the same operation.
+    """
+    def __init__(self):
+        # Latencies in nanoseconds of each operation, by its qualified name.
+        self.latencies = {}
+        # The number of trades in the window of each call of Stock.price.
+        self.window_sizes = Histogram()
+        # The number of trades held by each stock, by its symbol_and_type(), as of the latest
+        # batch recorded for it.
+        self.trade_counts = {}
+
+    def histogram(self, name: str) -> Histogram:
+        histogram = self.latencies.get(name)
+        if histogram is None:
+            histogram = self.latencies[name] = Histogram()
+        return histogram
+
+    def stats(self) -> dict:
+        """
+        :return: The statistics as a dict of plain values, latencies in nanoseconds.
+        """
+        return {'latencies_ns': {name: histogram.to_dict() for name, histogram in sorted(self.latencies.items())},
+                'window_sizes': self.window_sizes.to_dict(),
+                'trade_counts': dict(self.trade_counts)}
+
+    def text(self) -> str:
+        """
+        :return: The statistics as a table, latencies in microseconds.
+        """
+        lines = ["{:<48}{:>10}{:>10}{:>10}{:>10}{:>10}{:>12}".format(
+            "operation [us]", "count", "mean", "p50", "p99", "p99.9", "max")]
+        for name, histogram in sorted(self.latencies.items()):
+            if histogram.count == 0:
+                continue
+            summary = histogram.to_dict()
+            lines.append("{:<48}{:>10}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}{:>12.2f}".format(
+                name, summary['count'], summary['mean'] / 1e3, summary['p50'] / 1e3, summary['p99'] / 1e3,
+                summary['p999'] / 1e3, summary['max'] / 1e3))
+        windows = self.window_sizes.to_dict()
+        if windows['count'] > 0:
+            lines.append("window sizes of Stock.price: mean {mean:.1f}, p50 {p50}, p99 {p99}, max {max}".format(
+                **windows))
+        if len(self.trade_counts) > 0:
+            lines.append("trades per stock: {stocks} stocks, {total} trades, at most {most} in {name}".format(
+                stocks=len(self.trade_counts), total=sum(self.trade_counts.values()),
+                most=max(self.trade_counts.values()),
+                name=max(self.trade_counts, key=self.trade_counts.get)))
+        return "\n".join(lines)
+
+    def dump(self, file=sys.stderr, format: str='text'):
+        """Writes the statistics to the file, as text or as JSON."""
+        if format == 'json':
+            json.dump(self.stats(), file)
+        else:
+            file.write(self.text())
+        file.write("\n")
+        file.flush()
+
+
+# The operations timed while the instrumentation is enabled.
+OPERATIONS = [(TradeLog, 'insert'), (TradeLog, 'extend_columns'), (TradeLog, 'copy'),
+              (Stock, 'record_trade'), (Stock, 'record_trades'), (Stock, 'load_columns'), (Stock, 'price'),
+              (Stock, 'snapshot'), (Stock, 'vwap'), (Stock, 'price_at'),
+              (GlobalBeverageCorporationExchange, 'record_trade'), (GlobalBeverageCorporationExchange, 'record_trades'),
+              (GlobalBeverageCorporationExchange, 'get_stock'), (GlobalBeverageCorporationExchange, 'get_all_stocks'),
+              (GlobalBeverageCorporationExchange, 'all_share_index')]
+
+_active = None
+_originals = {}
+
+
+def _timed(function, histogram: Histogram, after=None):
+    clock = time.perf_counter_ns
+    record = histogram.record
+
+    if after is None:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(clock() - start)
+    else:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(clock() - start)
+                after(*args, **kwargs)
+    return wrapper
+
+
+def enable() -> Instrumentation:
+    """Starts timing the OPERATIONS, by replacing them with timed wrappers in their classes. The
+    code runs unchanged while the instrumentation is disabled, so it costs nothing then.
+    :return: The instrumentation gathering the statistics, the same one until disable().
+    """
+    global _active
+    if _active is not None:
+        return _active
+
+    instrumentation = Instrumentation()
+
+    def window_size(stock: Stock, current_time: datetime=None, window: timedelta=None):
+        instrumentation.window_sizes.record(len(stock._trades) - stock._price_window(window)[0].start)
+
+    def trade_count(stock: Stock, *args):
+        instrumentation.trade_counts[stock.symbol_and_type()] = len(stock._trades)
+
+    after = {(Stock, 'price'): window_size, (Stock, 'record_trade'): trade_count,
+             (Stock, 'record_trades'): trade_count, (Stock, 'load_columns'): trade_count}
+    for cls, name in OPERATIONS:
+        function = cls.__dict__[name]
+        _originals[cls, name] = function
+        histogram = instrumentation.histogram("{cls}.{name}".format(cls=cls.__name__, name=name))
+        setattr(cls, name, _timed(function, histogram, after.get((cls, name))))
+
+    _active = instrumentation
+    return instrumentation
+
+
+def disable():
+    """Stops timing the OPERATIONS, restoring the original methods."""
+    global _active
+    for (cls, name), function in _originals.items():
+        setattr(cls, name, function)
+    _originals.clear()
+    _active = None
+
+
+def active() -> Instrumentation:
+    """
+    :return: The instrumentation gathering statistics, or None while it is disabled.
+    """
+    return _active
+
+
+class PeriodicDump(threading.Thread):
+    """Dumps the statistics of the active instrumentation every interval seconds, in a daemon thread."""
+    def __init__(self, interval: float, path: str=None, file=sys.stderr, format: str='text'):
+        """
+        :param interval: The seconds between two dumps
+        :param path: The path of a file rewritten with the latest statistics, or None to append
+            them to file instead
+        :param file: The file to which the statistics are appended when path is None
+        :param format: 'text' or 'json'
+        """
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.path = path
+        self.file = file
+        self.format = format
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.dump()
+
+    def dump(self):
+        instrumentation = active()
+        if instrumentation is None:
+            return
+        if self.path is not None:
+            with open(self.path, 'w') as file:
+                instrumentation.dump(file, self.format)
+        else:
+            instrumentation.dump(self.file, self.format)
+
+    def stop(self):
+        """Stops the thread after a last dump."""
+        self._stopped.set()
+        self.join()
+        self.dump()
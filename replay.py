@@ -0,0 +1,207 @@
+import math
+import time
+
+from array import array
+from collections import deque
+from datetime import datetime, timedelta
+from super_simple_stocks import Trade, Stock, _IndexState, combine_index_terms, datetime_to_ns, timedelta_to_ns
+
+
+class Replay:
+    """
+    Replays a historical stream of trades, sweeping time once across all stocks, and gives the
+    all share index and the price of the stocks as time goes by: on every trade, or sampled at a
+    fixed cadence.
+    .. note:: At each moment only the trades up to and including it have been replayed, so the
+        prices are the ones the exchange would have given at that moment while the trades were
+        recorded live. The trades are kept only while they are in the window, and each moment
+        costs only the stocks whose price it changes, besides the prices it gives.
+    """
+    def __init__(self, stocks: {str: Stock}, trades, window: timedelta=None, symbols: [str]=None):
+        """
+        :param stocks: The stocks of the exchange, by their symbol_and_type(). Their recorded trades
+            are not used, only the stocks in the index.
+        :param trades: An iterable of the trades to replay, sorted by timestamp. It is iterated by
+            each sweep, so it must be a collection to be swept more than once.
+        :param window: The length of the window of the prices, or None for Stock.price_time_interval
+        :param symbols: The symbol_and_type() of the stocks whose prices are given, or None for all
+        :raise KeyError:
+        """
+        self.stocks = list(stocks)
+        self.trades = trades
+        self.window = window if window is not None else Stock.price_time_interval
+        if symbols is None:
+            self.symbols = list(self.stocks)
+        else:
+            for symbol_and_type in symbols:
+                stocks[symbol_and_type]
+            self.symbols = list(symbols)
+
+    def on_trades(self, speed: float=None):
+        """
+        :param speed: How many times faster than the timestamps of the trades they are replayed in
+            wall-clock time, or None to replay them as fast as possible.
+        :return: A generator of (timestamp, all share index, {symbol_and_type: price}) after each trade.
+        :raise ValueError:
+        """
+        sweep = _Sweep(self)
+        pace = _Pace(speed)
+        for trade in self.trades:
+            timestamp = datetime_to_ns(trade.timestamp)
+            sweep.record(trade, timestamp)
+            sweep.advance(timestamp)
+            pace.wait(timestamp)
+            yield trade.timestamp, sweep.index(), sweep.prices()
+
+    def samples(self, start: datetime, end: datetime, step: timedelta, speed: float=None):
+        """
+        :param start: The first moment to sample
+        :param end: The moment before which the samples are taken
+        :param step: The time between two samples
+        :param speed: How many times faster than the moments of the samples they are given in
+            wall-clock time, or None to give them as fast as possible.
+        :return: A generator of (moment, all share index, {symbol_and_type: price}) at each sample.
+        :raise ValueError:
+        """
+        for moment, timestamp, sweep in self._sweep_samples(start, end, step, speed):
+            yield moment, sweep.index(), sweep.prices()
+
+    def arrays(self, start: datetime, end: datetime, step: timedelta) -> {str: array}:
+        """
+        :param start: The first moment to sample
+        :param end: The moment before which the samples are taken
+        :param step: The time between two samples
+        :return: The samples as columns: 'timestamp' in epoch nanoseconds, 'all_share_index', and the
+            price of each of the symbols, by its symbol_and_type(). Missing values are NaN.
+        :raise ValueError:
+        """
+        nan = math.nan
+        timestamps = array('q')
+        indexes = array('d')
+        prices = {symbol_and_type: array('d') for symbol_and_type in self.symbols}
+        columns = [(prices[symbol_and_type].append, symbol_and_type) for symbol_and_type in self.symbols]
+
+        for moment, timestamp, sweep in self._sweep_samples(start, end, step, None):
+            timestamps.append(timestamp)
+            index = sweep.index()
+            indexes.append(index if index is not None else nan)
+            current = sweep.current
+            for append, symbol_and_type in columns:
+                price = current[symbol_and_type]
+                append(price if price is not None else nan)
+
+        table = {'timestamp': timestamps, 'all_share_index': indexes}
+        table.update(prices)
+        return table
+
+    def _sweep_samples(self, start: datetime, end: datetime, step: timedelta, speed: float):
+        if step <= timedelta(0):
+            msg = "The step between samples has to be positive."
+            raise ValueError(msg)
+
+        sweep = _Sweep(self)
+        pace = _Pace(speed)
+        trades = iter(self.trades)
+        pending = next(trades, None)
+        pending_timestamp = datetime_to_ns(pending.timestamp) if pending is not None else None
+
+        moment = start
+        while moment < end:
+            timestamp = datetime_to_ns(moment)
+            while pending is not None and pending_timestamp <= timestamp:
+                sweep.record(pending, pending_timestamp)
+                pending = next(trades, None)
+                pending_timestamp = datetime_to_ns(pending.timestamp) if pending is not None else None
+            sweep.advance(timestamp)
+            pace.wait(timestamp)
+            yield moment, timestamp, sweep
+            moment += step
+
+
+class _Sweep:
+    """The state of one sweep of a Replay: the running sums of the window of each stock, and the index."""
+    def __init__(self, replay: Replay):
+        self.symbols = replay.symbols
+        self.window = timedelta_to_ns(replay.window)
+        self.latest = None
+
+        # The trades in the window, as (timestamp, symbol_and_type, notional, quantity) in the
+        # order of their timestamps, and their sums by stock.
+        self.live = deque()
+        self.notional = dict.fromkeys(replay.stocks, 0.0)
+        self.quantity = dict.fromkeys(replay.stocks, 0)
+        self.changed = set()
+
+        self.current = dict.fromkeys(replay.stocks)
+        self.terms = _IndexState(())
+        for symbol_and_type in replay.stocks:
+            self.terms.set_price(symbol_and_type, None)
+
+    def record(self, trade: Trade, timestamp: int):
+        """
+        :raise ValueError:
+        """
+        if self.latest is not None and timestamp < self.latest:
+            msg = "The trades must be sorted by timestamp: {trade}".format(trade=trade)
+            raise ValueError(msg)
+        symbol_and_type = trade.symbol_and_type()
+        if symbol_and_type not in self.notional:
+            msg = "There is no stock in the exchange symbol: %s, type: %s" % (trade.symbol, str(trade.stock_type))
+            raise ValueError(msg)
+
+        self.latest = timestamp
+        notional = trade.quantity * trade.price_per_share
+        self.live.append((timestamp, symbol_and_type, notional, trade.quantity))
+        self.notional[symbol_and_type] += notional
+        self.quantity[symbol_and_type] += trade.quantity
+        self.changed.add(symbol_and_type)
+
+    def advance(self, timestamp: int):
+        """Takes the trades older than the window of timestamp out of it, and prices again the
+        stocks that have changed."""
+        cutoff = timestamp - self.window
+        live = self.live
+        while len(live) > 0 and live[0][0] < cutoff:
+            _, symbol_and_type, notional, quantity = live.popleft()
+            self.quantity[symbol_and_type] -= quantity
+            if self.quantity[symbol_and_type] == 0:
+                self.notional[symbol_and_type] = 0.0
+            else:
+                self.notional[symbol_and_type] -= notional
+            self.changed.add(symbol_and_type)
+
+        for symbol_and_type in self.changed:
+            quantity = self.quantity[symbol_and_type]
+            price = self.notional[symbol_and_type] / float(quantity) if quantity > 0 else None
+            self.current[symbol_and_type] = price
+            self.terms.set_price(symbol_and_type, price)
+        self.changed.clear()
+
+    def index(self) -> float:
+        terms = self.terms
+        return combine_index_terms([(terms.log_sum, len(self.current), terms.missing, terms.zeros)])
+
+    def prices(self) -> {str: float}:
+        current = self.current
+        return {symbol_and_type: current[symbol_and_type] for symbol_and_type in self.symbols}
+
+
+class _Pace:
+    """Waits for the wall-clock time of each moment of a replay, speed times faster than the moments."""
+    def __init__(self, speed: float):
+        if speed is not None and speed <= 0:
+            msg = "The speed of a replay has to be positive."
+            raise ValueError(msg)
+        self.speed = speed
+        self.origin = None
+
+    def wait(self, timestamp: int):
+        if self.speed is None:
+            return
+        if self.origin is None:
+            self.origin = (time.monotonic(), timestamp)
+        else:
+            wall, start = self.origin
+            delay = wall + (timestamp - start) / 1e9 / self.speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
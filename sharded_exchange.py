@@ -0,0 +1,360 @@
+import multiprocessing
+import os
+
+from datetime import datetime, timedelta
+from super_simple_stocks import Trade, Stock, RetentionPolicy, GlobalBeverageCorporationExchange, \
+    TradeStatistics, combine_index_terms, _pack_records
+
+
+def _serve_shard(connection, stocks: {str: Stock}, retention: RetentionPolicy):
+    """Runs one shard: a GlobalBeverageCorporationExchange of some of the stocks, driven by the
+    (command, arguments) messages received from the connection. Only 'call' messages are answered,
+    with ('ok', result) or ('error', exception), so batches of trades are sent without waiting.
+    The trades the shard rejects are kept until the 'rejected' call takes them, and an error that
+    stops a batch is raised by the next call instead of the one it was asked for, so the shard
+    keeps running.
+    :param connection: The shard's end of the pipe
+    :param stocks: The stocks of the shard
+    :param retention: The retention policy of the exchange
+    """
+    exchange = GlobalBeverageCorporationExchange(stocks, retention)
+    rejected = []
+    failure = None
+    while True:
+        command, arguments = connection.recv()
+        if command == 'record':
+            try:
+                rejected.extend(exchange.record_trades(Trade.from_tuples(arguments)))
+            except Exception as error:
+                if failure is None:
+                    failure = error
+        elif command == 'call':
+            name, arguments = arguments
+            if failure is not None:
+                connection.send(('error', failure))
+                failure = None
+                continue
+            try:
+                if name == 'rejected':
+                    result, rejected = rejected, []
+                else:
+                    result = getattr(exchange, name)(*arguments)
+                connection.send(('ok', result))
+            except Exception as error:
+                connection.send(('error', error))
+        elif command == 'close':
+            connection.close()
+            return
+
+
+class ShardedExchange:
+    """The exchange with its stocks partitioned across processes, one
+    GlobalBeverageCorporationExchange per shard, so trades are recorded and stocks are priced on
+    several cores. It has the same methods as GlobalBeverageCorporationExchange, except subscribe,
+    unsubscribe and advance_time: the changes of the stocks are only seen by the shard processes,
+    so subscriptions are not supported.
+    .. note:: Recorded trades are buffered per shard and sent in batches of batch_size, so they are
+        recorded asynchronously. Every query first sends the buffered trades, so it sees all of them.
+        The trades a shard rejects are returned by rejected(), and an error that stops a batch in a
+        shard is raised by the next query of that shard.
+        Class attributes such as Stock.price_time_interval are read by the shards as they were when
+        the exchange was created.
+    """
+    def __init__(self, stocks: {Stock, Stock}, retention: RetentionPolicy=None, journal=None, shards: int=None,
+                 batch_size: int=10000):
+        """
+        :param stocks: The stocks traded at this exchange.
+        :param retention: How long the recorded trades are kept, for the stocks that do not have a
+            retention policy of their own. None to keep them all.
+        :param journal: A trade_journal.TradeJournal to which every recorded trade is appended, or None.
+        :param shards: The number of processes, by default the number of CPUs.
+        :param batch_size: The number of trades buffered for a shard before they are sent to it.
+        :raise ValueError:
+        """
+        if shards is None:
+            shards = os.cpu_count() or 1
+        if shards < 1:
+            msg = "The number of shards must be positive: {shards}".format(shards=shards)
+            raise ValueError(msg)
+
+        self.journal = journal
+        self._batch_size = batch_size
+        self._shard_of = {}
+        self._pending = [[] for _ in range(shards)]
+        self._windows = []
+
+        partitions = [{} for _ in range(shards)]
+        for symbol_and_type, stock in stocks.items():
+            shard = len(self._shard_of) % shards
+            self._shard_of[symbol_and_type] = shard
+            partitions[shard][symbol_and_type] = stock
+
+        self._connections = []
+        self._processes = []
+        for partition in partitions:
+            connection, shard_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_serve_shard, args=(shard_connection, partition, retention),
+                                              daemon=True)
+            process.start()
+            shard_connection.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Sends the buffered trades and stops the shards."""
+        if len(self._processes) > 0:
+            self.flush()
+            for connection, process in zip(self._connections, self._processes):
+                connection.send(('close', None))
+                process.join()
+                connection.close()
+            self._connections = []
+            self._processes = []
+
+    def flush(self):
+        """Sends the buffered trades to their shards."""
+        for shard, pending in enumerate(self._pending):
+            if len(pending) > 0:
+                self._connections[shard].send(('record', pending))
+                self._pending[shard] = []
+
+    def _call(self, shard: int, name: str, *arguments):
+        self._connections[shard].send(('call', (name, arguments)))
+        return self._receive(shard)
+
+    def _call_all(self, name: str, *arguments) -> list:
+        self.flush()
+        for connection in self._connections:
+            connection.send(('call', (name, arguments)))
+        return [self._receive(shard) for shard in range(len(self._connections))]
+
+    def _receive(self, shard: int):
+        status, result = self._connections[shard].recv()
+        if status == 'error':
+            raise result
+        return result
+
+    def _route(self, symbol_and_type: str, trade: Trade):
+        shard = self._shard_of[symbol_and_type]
+        pending = self._pending[shard]
+        pending.append(trade._fields())
+        if len(pending) >= self._batch_size:
+            self._connections[shard].send(('record', pending))
+            self._pending[shard] = []
+
+    def add_stock(self, stock):
+        symbol_and_type = stock.symbol_and_type()
+        if symbol_and_type not in self._shard_of:
+            sizes = [0] * len(self._connections)
+            for shard in self._shard_of.values():
+                sizes[shard] += 1
+            self._shard_of[symbol_and_type] = sizes.index(min(sizes))
+        self.flush()
+        self._call(self._shard_of[symbol_and_type], 'add_stock', stock)
+
+    def stock_in_exchange(self, symbol_and_type: str):
+        return symbol_and_type in self._shard_of
+
+    def get_stock(self, symbol_and_type: str):
+        self.flush()
+        return self._call(self._shard_of[symbol_and_type], 'get_stock', symbol_and_type)
+
+    def get_all_stocks(self):
+        stocks = {}
+        for shard_stocks in self._call_all('get_all_stocks'):
+            stocks.update(shard_stocks)
+        return stocks
+
+    def analytics(self, current_time: datetime=datetime.now()) -> {str: list}:
+        """
+        :return: The table of all stocks, as GlobalBeverageCorporationExchange.analytics returns it.
+        """
+        table = {}
+        for shard_table in self._call_all('analytics', current_time):
+            for name, column in shard_table.items():
+                table.setdefault(name, []).extend(column)
+        return table
+
+    def record_trade(self, trade: Trade):
+        """Records a trade for the proper stock.
+        :param trade: The trade to record.
+        """
+        symbol_and_type = trade.symbol_and_type()
+        if not self.stock_in_exchange(symbol_and_type):
+            msg = "There is no stock in the exchange symbol: %s, type: %s" % (trade.symbol, str(trade.stock_type))
+            raise ValueError(msg)
+        else:
+            record = self.journal.pack(trade) if self.journal is not None else None
+            self._route(symbol_and_type, trade)
+            if record is not None:
+                self.journal.append_records((record,))
+
+    def record_trades(self, trades) -> [(Trade, Exception)]:
+        """Records a batch of trades, routing each of them to the shard of its stock.
+        :param trades: An iterable of the trades to record.
+        :return: The rejected trades, each with the error that rejected it. The valid trades of
+            the batch are recorded regardless of them.
+        """
+        rejected = []
+        accepted = []
+        for trade in trades:
+            if type(trade) is not Trade:
+                msg = "Argument trade={trade} must be of type Trade.".format(trade=trade)
+                rejected.append((trade, TypeError(msg)))
+                continue
+
+            symbol_and_type = trade.symbol_and_type()
+            if not self.stock_in_exchange(symbol_and_type):
+                msg = "There is no stock in the exchange symbol: %s, type: %s" % (trade.symbol, str(trade.stock_type))
+                rejected.append((trade, ValueError(msg)))
+            else:
+                accepted.append(trade)
+
+        if self.journal is not None:
+            records = _pack_records(self.journal, accepted, rejected)
+            for trade, record in records:
+                self._route(trade.symbol_and_type(), trade)
+            self.journal.append_records(record for trade, record in records)
+        else:
+            for trade in accepted:
+                self._route(trade.symbol_and_type(), trade)
+        return rejected
+
+    def rejected(self) -> [(Trade, Exception)]:
+        """
+        :return: The trades the shards have rejected since the previous call, each with the error
+            that rejected it. record_trade and record_trades only report the trades rejected
+            before they are sent to the shards.
+        """
+        rejected = []
+        for shard_rejected in self._call_all('rejected'):
+            rejected.extend(shard_rejected)
+        return rejected
+
+    def load_columns(self, symbol_and_type: str, timestamps, prices, quantities, sides):
+        """Records a batch of trades of one stock given column by column, as
+        GlobalBeverageCorporationExchange.load_columns does.
+        :raise ValueError:
+        """
+        if not self.stock_in_exchange(symbol_and_type):
+            msg = "There is no stock in the exchange with key: %s" % symbol_and_type
+            raise ValueError(msg)
+        self.flush()
+        self._call(self._shard_of[symbol_and_type], 'load_columns', symbol_and_type, timestamps, prices, quantities,
+                   sides)
+
+    def bars(self, symbol_and_type: str, resolution: timedelta, start: datetime, end: datetime) -> dict:
+        """
+        :return: The columns of the bars as returned by GlobalBeverageCorporationExchange.bars.
+        :raise KeyError:
+        """
+        self.flush()
+        return self._call(self._shard_of[symbol_and_type], 'bars', symbol_and_type, resolution, start, end)
+
+    def stock_price(self, symbol_and_type: str, current_time: datetime=datetime.now(),
+                    window: timedelta=None) -> float:
+        """
+        :return: The price of the stock, as GlobalBeverageCorporationExchange.stock_price returns it.
+        :raise KeyError:
+        """
+        self.flush()
+        return self._call(self._shard_of[symbol_and_type], 'stock_price', symbol_and_type, current_time, window)
+
+    def stock_ticker_price(self, symbol_and_type: str) -> float:
+        """
+        :return: The ticker price of the stock, as GlobalBeverageCorporationExchange.stock_ticker_price returns it.
+        :raise KeyError:
+        :raise AttributeError:
+        """
+        self.flush()
+        return self._call(self._shard_of[symbol_and_type], 'stock_ticker_price', symbol_and_type)
+
+    def stock_dividend_yield(self, symbol_and_type: str) -> float:
+        """
+        :return: The dividend yield of the stock, as GlobalBeverageCorporationExchange.stock_dividend_yield
+            returns it.
+        :raise KeyError:
+        :raise AttributeError:
+        :raise ZeroDivisionError:
+        """
+        self.flush()
+        return self._call(self._shard_of[symbol_and_type], 'stock_dividend_yield', symbol_and_type)
+
+    def add_bar_resolution(self, resolution: timedelta):
+        """Starts keeping bars of the given resolution up to date for every stock in the exchange.
+        :raise ValueError:
+        """
+        self._call_all('add_bar_resolution', resolution)
+
+    def add_window(self, window: timedelta):
+        """Starts keeping a running window of the given length for every stock in the exchange,
+        and the all share index of that window.
+        :raise ValueError:
+        """
+        self._call_all('add_window', window)
+        if window not in self._windows:
+            self._windows.append(window)
+
+    @property
+    def windows(self) -> (timedelta,):
+        """
+        :return: The lengths of the windows kept for every stock, besides Stock.price_time_interval
+        """
+        return tuple(self._windows)
+
+    def track_statistics(self, window: timedelta=None, relative_accuracy: float=0.01):
+        """Starts keeping the statistics of the latest trades for every stock in the exchange.
+        :raise ValueError:
+        """
+        self._call_all('track_statistics', window, relative_accuracy)
+
+    def statistics(self, symbols_and_types: [str]=None) -> TradeStatistics:
+        """
+        :return: The statistics of the latest trades of the stocks, as
+            GlobalBeverageCorporationExchange.statistics returns them, merged across the shards.
+        :raise KeyError:
+        """
+        if symbols_and_types is None:
+            results = self._call_all('statistics')
+        else:
+            shards = {}
+            for symbol_and_type in symbols_and_types:
+                shards.setdefault(self._shard_of[symbol_and_type], []).append(symbol_and_type)
+            self.flush()
+            results = [self._call(shard, 'statistics', keys) for shard, keys in shards.items()]
+
+        merged = None
+        for statistics in results:
+            if statistics is None:
+                continue
+            elif merged is None:
+                merged = statistics
+            else:
+                merged.merge(statistics)
+        return merged
+
+    def all_share_index(self, current_time: datetime=datetime.now(), window: timedelta=None) -> float:
+        """
+        :param current_time: The point of time for which we want to obtain the index.
+        :param window: The length of one of the windows added by add_window(), or None for
+            Stock.price_time_interval
+        :return: The geometric mean of all stock prices. Returns None if any of them is
+            None.
+        :raise KeyError:
+        .. note:: Each shard prices its own stocks and returns its index terms, which are then
+            combined, so the shards price their stocks in parallel.
+        """
+        return combine_index_terms(self._call_all('index_terms', current_time, window))
+
+    def index_terms(self, current_time: datetime=datetime.now(), window: timedelta=None) -> (float, int, int, int):
+        """
+        :return: The terms of the index, as GlobalBeverageCorporationExchange.index_terms returns them.
+        """
+        terms = self._call_all('index_terms', current_time, window)
+        return tuple(map(sum, zip(*terms)))
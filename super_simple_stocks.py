@@ -1,9 +1,16 @@
+import bisect
 import copy
 import enum
+import heapq
+import math
 import operator
+import queue
+import threading
+import time
 
-from datetime import datetime, timedelta
-from functools import reduce
+from array import array
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate, chain, islice, repeat
 
 
 @enum.unique
@@ -20,8 +27,36 @@ class StockType(enum.Enum):
     PREFERRED = 2
 
 
+@enum.unique
+class Measure(enum.Enum):
+    """A value of the exchange that may be subscribed to"""
+    PRICE = 1
+    TICKER_PRICE = 2
+    DIVIDEND_YIELD = 3
+    ALL_SHARE_INDEX = 4
+
+
+_symbols_and_types = {}
+_SIDES = {indicator.value: indicator for indicator in BuySellIndicator}
+
+
+def symbol_and_type_key(symbol: str, stock_type: StockType) -> str:
+    """
+    :param symbol: The short name of the stock used in the exchange
+    :param stock_type: Indicator for the type of stock
+    :return: The key of the stock in the exchange. Equal keys are the same instance of str.
+    """
+    try:
+        return _symbols_and_types[symbol, stock_type]
+    except KeyError:
+        key = _symbols_and_types[symbol, stock_type] = symbol + "_" + str(stock_type.name)
+        return key
+
+
 class Trade:
     """A change of ownership of a collection of shares at a definite price per share"""
+    __slots__ = ('symbol', 'stock_type', 'timestamp', 'quantity', 'price_per_share', 'buy_sell_indicator')
+
     def __init__(self,
                  symbol: str,
                  stock_type: StockType,
@@ -58,24 +93,1302 @@ class Trade:
             msg = "The type of stock is wrong."
             raise ValueError(msg)
 
-        self.buy_sell_indicator = buy_sell_indicator
+        self.buy_sell_indicator = buy_sell_indicator
+
+    @classmethod
+    def from_tuples(cls, rows) -> ['Trade']:
+        """Constructs trades without validating them, for data the caller vouches for.
+        :param rows: An iterable of (symbol, stock_type, timestamp, quantity, price_per_share,
+            buy_sell_indicator) tuples, for example zip() over columns.
+        :return: The list of trades.
+        """
+        new = object.__new__
+        trades = []
+        for symbol, stock_type, timestamp, quantity, price_per_share, buy_sell_indicator in rows:
+            trade = new(cls)
+            trade.symbol = symbol
+            trade.stock_type = stock_type
+            trade.timestamp = timestamp
+            trade.quantity = quantity
+            trade.price_per_share = price_per_share
+            trade.buy_sell_indicator = buy_sell_indicator
+            trades.append(trade)
+        return trades
+
+    def _fields(self) -> tuple:
+        return (self.symbol, self.stock_type, self.timestamp, self.quantity, self.price_per_share,
+                self.buy_sell_indicator)
+
+    def equals(self, other: 'Trade') -> bool:
+        """
+        :param other: The trade to compare with
+        :return: Whether both trades have the same fields, for example a trade and its unpickled copy.
+        .. note:: Trades compare and hash by identity, like any object, so they can be kept in sets
+            and used as keys while their fields change.
+        """
+        return type(other) is Trade and self._fields() == other._fields()
+
+    @property
+    def total_price(self) -> float:
+        """
+        :return: The total price of the trade
+        """
+        return self.quantity * self.price_per_share
+
+    def symbol_and_type(self):
+        """
+        :return: The key of the stock of this trade in the exchange.
+        """
+        return symbol_and_type_key(self.symbol, self.stock_type)
+
+
+class _Chunk:
+    """A contiguous run of sorted rows inside a _ChunkedSeries, stored column by column in
+    arrays, and the token of the series that may write to it in place."""
+    __slots__ = ('owner',)
+    # The typecode of each column, by name.
+    columns = {}
+
+    def __init__(self, owner: object=None):
+        self.owner = owner
+        for name, typecode in self.columns.items():
+            setattr(self, name, array(typecode))
+
+    def copy(self) -> '_Chunk':
+        other = object.__new__(type(self))
+        other.owner = None
+        for name in self.columns:
+            setattr(other, name, getattr(self, name)[:])
+        return other
+
+    def split(self) -> '_Chunk':
+        """Moves the upper half of this chunk into a new one.
+        :return: The new chunk holding the upper half.
+        """
+        half = len(self) // 2
+        upper = object.__new__(type(self))
+        upper.owner = self.owner
+        for name in self.columns:
+            column = getattr(self, name)
+            setattr(upper, name, column[half:])
+            del column[half:]
+        return upper
+
+
+class _ChunkedSeries:
+    """Rows sorted by a key, stored column by column in chunks of at most chunk_size rows,
+    which copies share until either side writes to a chunk."""
+    chunk_size = 1024
+    # The type of the chunks, a subclass of _Chunk.
+    _chunk_type = _Chunk
+
+    def __init__(self):
+        self._chunks = []
+        # The key of the last row in each chunk, to find the chunk of a key by bisection.
+        self._maxes = []
+        self._len = 0
+        # The token of this series. Only the chunks it owns may be written in place, the others may be
+        # shared with a copy and are copied before writing. The token, unlike an id, survives pickling.
+        self._owner = object()
+
+    def __len__(self):
+        return self._len
+
+    def copy(self):
+        """
+        :return: An independent copy of this series, sharing the chunks until either side writes to them.
+        """
+        other = copy.copy(self)
+        other._chunks = list(self._chunks)
+        other._maxes = list(self._maxes)
+        # Both sides get a new token, so neither owns the chunks they share.
+        self._owner = object()
+        other._owner = object()
+        return other
+
+    def _own(self, k: int) -> _Chunk:
+        """
+        :param k: The position of a chunk
+        :return: The chunk, copied first if it may be shared with a copy of this series.
+        """
+        chunk = self._chunks[k]
+        if chunk.owner is not self._owner:
+            chunk = self._chunks[k] = chunk.copy()
+            chunk.owner = self._owner
+        return chunk
+
+    def _column(self, name: str) -> array:
+        column = array(self._chunk_type.columns[name])
+        for chunk in self._chunks:
+            column.extend(getattr(chunk, name))
+        return column
+
+
+class _TradeChunk(_Chunk):
+    """
+    A contiguous run of sorted trades inside a TradeLog, stored column by column, along with
+    the running sums of their total prices and quantities, and the token of the log that may
+    write to it in place.
+    .. note:: The running sums may cover only the first trades of the chunk: an insert cuts them
+        at the inserted trade, and they are computed again up to the last trade when they are read.
+    """
+    __slots__ = ('timestamps', 'prices', 'quantities', 'sides', 'objects', 'cumulative_notionals',
+                 'cumulative_quantities')
+    columns = {'timestamps': 'q', 'prices': 'd', 'quantities': 'q', 'sides': 'B'}
+
+    def __init__(self, keep_objects: bool, owner: object=None):
+        super().__init__(owner)
+        self.objects = [] if keep_objects else None
+        self.cumulative_notionals = array('d')
+        self.cumulative_quantities = array('q')
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @staticmethod
+    def values(trade: Trade) -> (float, int, int):
+        """
+        :param trade: The trade to be written to a chunk
+        :return: The price per share, quantity and buy/sell indicator value of the trade, as the
+            columns store them. They are built before any column is changed, so a trade with a
+            field of the wrong type leaves the chunk as it was.
+        :raise TypeError:
+        :raise AttributeError:
+        """
+        return float(trade.price_per_share), operator.index(trade.quantity), trade.buy_sell_indicator.value
+
+    def insert(self, index: int, timestamp: int, trade: Trade):
+        price, quantity, side = self.values(trade)
+        self.timestamps.insert(index, timestamp)
+        self.prices.insert(index, price)
+        self.quantities.insert(index, quantity)
+        self.sides.insert(index, side)
+        if self.objects is not None:
+            self.objects.insert(index, trade)
+        del self.cumulative_notionals[index:], self.cumulative_quantities[index:]
+
+    def insert_batch(self, timestamps, prices, quantities, sides, trades: [Trade]):
+        """Inserts a sorted batch of trades, each after the trades with equal timestamps, and
+        cuts the running sums at the first of them."""
+        first = len(self)
+        i = 0
+        for j, timestamp in enumerate(timestamps):
+            i = bisect.bisect_right(self.timestamps, timestamp, i)
+            if j == 0:
+                first = i
+            self.timestamps.insert(i, timestamp)
+            self.prices.insert(i, prices[j])
+            self.quantities.insert(i, quantities[j])
+            self.sides.insert(i, sides[j])
+            if self.objects is not None:
+                self.objects.insert(i, trades[j])
+            i += 1
+        del self.cumulative_notionals[first:], self.cumulative_quantities[first:]
+
+    def append(self, timestamp: int, trade: Trade):
+        price, quantity, side = self.values(trade)
+        current = len(self.cumulative_quantities) == len(self.quantities)
+        self.timestamps.append(timestamp)
+        self.prices.append(price)
+        self.quantities.append(quantity)
+        self.sides.append(side)
+        if self.objects is not None:
+            self.objects.append(trade)
+        if current:
+            self.append_sums(quantity, price)
+
+    def extend(self, timestamps, prices, quantities, sides, trades: [Trade]):
+        current = len(self.cumulative_quantities) == len(self.quantities)
+        notional = self.cumulative_notionals[-1] if len(self.cumulative_notionals) > 0 else 0.0
+        quantity = self.cumulative_quantities[-1] if len(self.cumulative_quantities) > 0 else 0
+
+        self.timestamps.extend(timestamps)
+        self.prices.extend(prices)
+        self.quantities.extend(quantities)
+        self.sides.extend(sides)
+        if self.objects is not None:
+            self.objects.extend(trades)
+        if not current:
+            return
+        self.cumulative_notionals.extend(islice(accumulate(chain([notional], map(operator.mul, quantities, prices))),
+                                                1, None))
+        self.cumulative_quantities.extend(islice(accumulate(chain([quantity], quantities)), 1, None))
+
+    def append_sums(self, quantity: int, price: float):
+        if len(self.cumulative_quantities) > 0:
+            self.cumulative_notionals.append(self.cumulative_notionals[-1] + quantity * price)
+            self.cumulative_quantities.append(self.cumulative_quantities[-1] + quantity)
+        else:
+            self.cumulative_notionals.append(quantity * price)
+            self.cumulative_quantities.append(quantity)
+
+    def running_sums(self, count: int) -> (float, int):
+        """
+        :param count: The number of trades to sum, at least 1
+        :return: The summed total price and the summed quantity of the first count trades.
+        """
+        if len(self.cumulative_quantities) < count:
+            self.accumulate()
+        return self.cumulative_notionals[count - 1], self.cumulative_quantities[count - 1]
+
+    def accumulate(self):
+        """Computes the running sums of the trades they do not cover yet.
+        .. note:: The readers of a chunk shared with a copy may run it at the same time, so the
+            running sums are replaced by new arrays instead of being extended in place, the
+            total prices first.
+        """
+        start = len(self.cumulative_quantities)
+        notional = self.cumulative_notionals[start - 1] if start > 0 else 0.0
+        quantity = self.cumulative_quantities[start - 1] if start > 0 else 0
+        quantities = self.quantities[start:]
+        notionals = self.cumulative_notionals[:start]
+        notionals.extend(islice(accumulate(chain([notional], map(operator.mul, quantities, self.prices[start:]))),
+                                1, None))
+        cumulative_quantities = self.cumulative_quantities[:start]
+        cumulative_quantities.extend(islice(accumulate(chain([quantity], quantities)), 1, None))
+        self.cumulative_notionals = notionals
+        self.cumulative_quantities = cumulative_quantities
+
+    def copy(self) -> '_TradeChunk':
+        other = super().copy()
+        other.objects = list(self.objects) if self.objects is not None else None
+        other.cumulative_notionals = self.cumulative_notionals[:]
+        other.cumulative_quantities = self.cumulative_quantities[:]
+        return other
+
+    def split(self) -> '_TradeChunk':
+        half = len(self) // 2
+        upper = super().split()
+        if self.objects is not None:
+            upper.objects = self.objects[half:]
+            del self.objects[half:]
+        else:
+            upper.objects = None
+        # The running sums of the upper half are computed when they are first read.
+        upper.cumulative_notionals = array('d')
+        upper.cumulative_quantities = array('q')
+        del self.cumulative_notionals[half:], self.cumulative_quantities[half:]
+        return upper
+
+
+class TradeLog(_ChunkedSeries):
+    """
+    The trades of a single stock, sorted by timestamp and stored column by column in
+    arrays: int64 epoch nanoseconds, float64 prices, int64 quantities and a uint8
+    buy/sell indicator.
+    .. note:: When keep_objects is False only the columns are kept, and instances of Trade are
+        materialized on access. When it is True the recorded instances are kept next to the
+        columns and returned as they are, and the trades inserted column by column without their
+        instances are materialized a chunk at a time, when the chunk is first read.
+    .. note:: The columns are split in chunks of at most TradeLog.chunk_size trades. A trade that
+        is not older than the last one is appended to the last chunk in O(1), while a late trade
+        is inserted in its chunk in O(log n + chunk_size), instead of moving the whole history.
+    .. note:: Copies share their chunks with the original, and a chunk is copied only when one of
+        them writes to it, so copying costs O(n / chunk_size).
+    """
+    _chunk_type = _TradeChunk
+
+    def __init__(self, symbol: str, stock_type: StockType, keep_objects: bool=True):
+        """
+        :param symbol: The short name of the stock the trades belong to
+        :param stock_type: Indicator for the type of stock the trades belong to
+        :param keep_objects: Whether to keep the recorded instances of Trade
+        """
+        super().__init__()
+        self.symbol = symbol
+        self.stock_type = stock_type
+        self._keep_objects = keep_objects
+        # The index of the first trade of each chunk. The entries from self._dirty on are stale.
+        self._offsets = []
+        self._dirty = 0
+        # The summed total prices and quantities of the trades before each chunk, rebuilt apart
+        # from the offsets, as only the queries of sums need them. The entries from
+        # min(self._summed, self._dirty) on are stale.
+        self._chunk_notionals = []
+        self._chunk_quantities = []
+        self._summed = 0
+
+    def copy(self) -> 'TradeLog':
+        """
+        :return: An independent copy of this log, sharing the chunks until either side writes to them.
+        """
+        # The running sums are brought up to date first, so the copies do not each rebuild them.
+        if self._dirty < len(self._chunks):
+            self._update_offsets()
+        if self._summed < len(self._chunks):
+            self._update_sums()
+        other = super().copy()
+        other._offsets = list(self._offsets)
+        other._chunk_notionals = list(self._chunk_notionals)
+        other._chunk_quantities = list(self._chunk_quantities)
+        return other
+
+    def _own(self, k: int, objects: bool=True) -> _TradeChunk:
+        """
+        :param k: The position of a chunk
+        :param objects: Whether instances of Trade are to be written to the chunk, so a log that
+            keeps them materializes the ones of the chunk first.
+        :return: The chunk, copied first if it may be shared with a copy of this log.
+        """
+        chunk = self._chunks[k]
+        if chunk.owner is not self._owner:
+            chunk = super()._own(k)
+        if objects and self._keep_objects:
+            self._objects(chunk)
+        return chunk
+
+    def _objects(self, chunk: _TradeChunk) -> [Trade]:
+        """
+        :param chunk: A chunk of a log that keeps instances of Trade
+        :return: The instances of the trades of the chunk, materialized first if they are not yet.
+        """
+        if chunk.objects is None:
+            chunk.objects = self._make_trades(chunk.timestamps, chunk.prices, chunk.quantities, chunk.sides)
+        return chunk.objects
+
+    def _make_trades(self, timestamps, prices, quantities, sides) -> [Trade]:
+        return Trade.from_tuples(zip(repeat(self.symbol), repeat(self.stock_type), map(ns_to_datetime, timestamps),
+                                     quantities, prices, map(_SIDES.__getitem__, sides)))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        else:
+            chunk, i = self._locate(index)
+            return self._materialize(chunk, i)
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            for i in range(len(chunk)):
+                yield self._materialize(chunk, i)
+
+    def _materialize(self, chunk: _TradeChunk, i: int) -> Trade:
+        if self._keep_objects:
+            return self._objects(chunk)[i]
+        elif chunk.objects is not None:
+            return chunk.objects[i]
+        else:
+            return Trade.from_tuples([(self.symbol, self.stock_type, ns_to_datetime(chunk.timestamps[i]),
+                                       chunk.quantities[i], chunk.prices[i], BuySellIndicator(chunk.sides[i]))])[0]
+
+    @property
+    def timestamps(self) -> array:
+        """
+        :return: A contiguous copy of the epoch nanosecond timestamps of all trades
+        """
+        return self._column('timestamps')
+
+    @property
+    def prices(self) -> array:
+        """
+        :return: A contiguous copy of the prices per share of all trades
+        """
+        return self._column('prices')
+
+    @property
+    def quantities(self) -> array:
+        """
+        :return: A contiguous copy of the quantities of all trades
+        """
+        return self._column('quantities')
+
+    @property
+    def sides(self) -> array:
+        """
+        :return: A contiguous copy of the buy/sell indicator values of all trades
+        """
+        return self._column('sides')
+
+    def iter_columns(self):
+        """
+        :return: A generator of the (timestamps, prices, quantities, sides) arrays of each chunk,
+            in order. They must not be modified.
+        """
+        for chunk in self._chunks:
+            yield chunk.timestamps, chunk.prices, chunk.quantities, chunk.sides
+
+    def _update_offsets(self):
+        offsets = self._offsets
+        del offsets[self._dirty:]
+        for k in range(self._dirty, len(self._chunks)):
+            offsets.append(offsets[k - 1] + len(self._chunks[k - 1]) if k > 0 else 0)
+        self._summed = min(self._summed, self._dirty)
+        self._dirty = len(self._chunks)
+
+    def _update_sums(self):
+        """Rebuilds the stale sums before each chunk, once the offsets are up to date."""
+        notionals = self._chunk_notionals
+        quantities = self._chunk_quantities
+        del notionals[self._summed:], quantities[self._summed:]
+        for k in range(self._summed, len(self._chunks)):
+            if k > 0:
+                previous = self._chunks[k - 1]
+                notional, quantity = previous.running_sums(len(previous))
+                notionals.append(notionals[k - 1] + notional)
+                quantities.append(quantities[k - 1] + quantity)
+            else:
+                notionals.append(0.0)
+                quantities.append(0)
+        self._summed = len(self._chunks)
+
+    def _locate(self, index: int) -> (_TradeChunk, int):
+        """
+        :param index: The position of a trade in the log, negative ones counting from the end
+        :return: The chunk holding the trade and the position of the trade inside of it.
+        :raise IndexError:
+        """
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            msg = "TradeLog index out of range."
+            raise IndexError(msg)
+
+        if index >= self._len - len(self._chunks[-1]):
+            chunk = self._chunks[-1]
+            return chunk, index - (self._len - len(chunk))
+
+        if self._dirty < len(self._chunks):
+            self._update_offsets()
+        k = bisect.bisect_right(self._offsets, index) - 1
+        return self._chunks[k], index - self._offsets[k]
+
+    def timestamp_at(self, index: int) -> int:
+        """
+        :return: The epoch nanosecond timestamp of the trade at index
+        """
+        chunk, i = self._locate(index)
+        return chunk.timestamps[i]
+
+    def price_at(self, index: int) -> float:
+        """
+        :return: The price per share of the trade at index
+        """
+        chunk, i = self._locate(index)
+        return chunk.prices[i]
+
+    def quantity_at(self, index: int) -> int:
+        """
+        :return: The quantity of the trade at index
+        """
+        chunk, i = self._locate(index)
+        return chunk.quantities[i]
+
+    def insert(self, trade: Trade, timestamp: int=None) -> int:
+        """Inserts a trade, keeping the log sorted by timestamp. Trades with equal timestamps
+        keep the order in which they have been inserted.
+        :param trade: The trade to be inserted
+        :param timestamp: The epoch nanoseconds of the trade, if they are known already
+        :return: The index at which the trade has been inserted.
+        """
+        if timestamp is None:
+            timestamp = datetime_to_ns(trade.timestamp)
+        chunks = self._chunks
+
+        if len(chunks) == 0 or timestamp >= self._maxes[-1]:
+            if len(chunks) == 0 or len(chunks[-1].timestamps) >= self.chunk_size:
+                chunks.append(_TradeChunk(self._keep_objects, self._owner))
+                self._maxes.append(timestamp)
+                self._dirty = min(self._dirty, len(chunks) - 1)
+            self._own(-1).append(timestamp, trade)
+            self._maxes[-1] = timestamp
+            self._len += 1
+            return self._len - 1
+
+        k = bisect.bisect_right(self._maxes, timestamp)
+        chunk = self._own(k)
+        i = bisect.bisect_right(chunk.timestamps, timestamp)
+        chunk.insert(i, timestamp, trade)
+        self._len += 1
+
+        if self._dirty <= k:
+            self._update_offsets()
+        index = self._offsets[k] + i
+        self._dirty = k + 1
+
+        if len(chunk) > 2 * self.chunk_size:
+            chunks.insert(k + 1, chunk.split())
+            self._maxes.insert(k + 1, self._maxes[k])
+            self._maxes[k] = chunk.timestamps[-1]
+        return index
+
+    def extend(self, trades: [Trade], timestamps: [int]=None):
+        """Inserts a batch of trades in one pass, keeping the log sorted by timestamp.
+        :param trades: The trades to be inserted, sorted by timestamp
+        :param timestamps: The epoch nanoseconds of the trades, if they are known already
+        """
+        if timestamps is None:
+            timestamps = [datetime_to_ns(trade.timestamp) for trade in trades]
+        self.extend_columns(timestamps, [trade.price_per_share for trade in trades],
+                            [trade.quantity for trade in trades],
+                            [trade.buy_sell_indicator.value for trade in trades], trades)
+
+    def extend_columns(self, timestamps, prices, quantities, sides, trades: [Trade]=None):
+        """Inserts a batch of trades given column by column, in one pass, keeping the log sorted
+        by timestamp.
+        :param timestamps: The epoch nanoseconds of the trades, sorted
+        :param prices: The prices per share of the trades
+        :param quantities: The quantities of the trades
+        :param sides: The buy/sell indicator values of the trades
+        :param trades: The instances of Trade, if they are known already. When the log keeps
+            instances and they are not given, they are materialized when they are read.
+        .. note:: The part of the batch that is not older than the last trade is appended. The late
+            trades before it are inserted in the chunks they fall in, so only those chunks are
+            rewritten, each once per batch.
+        """
+        if len(timestamps) == 0:
+            return
+        if not self._keep_objects:
+            trades = None
+        # The columns are converted whole first, so a value of the wrong type leaves the log as it was.
+        timestamps, prices, quantities, sides = (array('q', timestamps), array('d', prices), array('q', quantities),
+                                                 array('B', sides))
+
+        k = len(self._chunks)
+        if k > 0 and timestamps[0] < self._maxes[-1]:
+            late = bisect.bisect_left(timestamps, self._maxes[-1])
+            k = self._insert_late(timestamps[:late], prices[:late], quantities[:late], sides[:late],
+                                  trades[:late] if trades is not None else None)
+            timestamps, prices, quantities, sides = timestamps[late:], prices[late:], quantities[late:], sides[late:]
+            trades = trades[late:] if trades is not None else None
+
+        self._dirty = min(self._dirty, k)
+        if len(timestamps) > 0:
+            self._append_columns(timestamps, prices, quantities, sides, trades)
+
+    def _insert_late(self, timestamps, prices, quantities, sides, trades) -> int:
+        """Inserts a sorted batch of trades older than the last one, chunk by chunk.
+        :return: The position of the first chunk written to.
+        """
+        if self._keep_objects and trades is None:
+            trades = self._make_trades(timestamps, prices, quantities, sides)
+        first = None
+        start = 0
+        while start < len(timestamps):
+            # The trades of chunk k are the ones from the last trade of chunk k - 1 on, before its own last trade.
+            k = bisect.bisect_right(self._maxes, timestamps[start])
+            stop = bisect.bisect_left(timestamps, self._maxes[k], start)
+            self._own(k).insert_batch(timestamps[start:stop], prices[start:stop], quantities[start:stop],
+                                      sides[start:stop], trades[start:stop] if trades is not None else None)
+            self._len += stop - start
+            self._rechunk(k)
+            if first is None:
+                first = k
+            start = stop
+        self._dirty = min(self._dirty, first)
+        return first
+
+    def _rechunk(self, k: int):
+        """Cuts the chunk at k in chunks of chunk_size trades, if it holds more than twice as many."""
+        chunk = self._chunks[k]
+        if len(chunk) <= 2 * self.chunk_size:
+            return
+        pieces = []
+        for start in range(0, len(chunk), self.chunk_size):
+            stop = start + self.chunk_size
+            piece = _TradeChunk(chunk.objects is not None, self._owner)
+            piece.extend(chunk.timestamps[start:stop], chunk.prices[start:stop], chunk.quantities[start:stop],
+                         chunk.sides[start:stop], chunk.objects[start:stop] if chunk.objects is not None else None)
+            pieces.append(piece)
+        self._chunks[k:k + 1] = pieces
+        self._maxes[k:k + 1] = [piece.timestamps[-1] for piece in pieces]
+
+    def _append_columns(self, timestamps, prices, quantities, sides, trades):
+        chunks = self._chunks
+        if len(chunks) > 0:
+            self._own(-1, trades is not None)
+
+        start = 0
+        while start < len(timestamps):
+            if len(chunks) == 0 or len(chunks[-1].timestamps) >= self.chunk_size:
+                chunks.append(_TradeChunk(self._keep_objects and trades is not None, self._owner))
+                self._maxes.append(timestamps[start])
+            chunk = chunks[-1]
+            stop = min(len(timestamps), start + self.chunk_size - len(chunk.timestamps))
+
+            if trades is not None:
+                objects = trades[start:stop]
+            elif chunk.objects is not None:
+                objects = self._make_trades(timestamps[start:stop], prices[start:stop], quantities[start:stop],
+                                            sides[start:stop])
+            else:
+                objects = None
+            chunk.extend(timestamps[start:stop], prices[start:stop], quantities[start:stop], sides[start:stop],
+                         objects)
+            self._maxes[-1] = timestamps[stop - 1]
+            self._len += stop - start
+            start = stop
+
+    def bisect_left(self, timestamp: datetime) -> int:
+        """
+        :param timestamp: The moment to search for
+        :return: The index of the first trade that is not older than timestamp.
+        """
+        return self.bisect_left_ns(datetime_to_ns(timestamp))
+
+    def bisect_left_ns(self, timestamp: int) -> int:
+        """
+        :param timestamp: The moment to search for, in epoch nanoseconds
+        :return: The index of the first trade that is not older than timestamp.
+        """
+        k = bisect.bisect_left(self._maxes, timestamp)
+        if k == len(self._chunks):
+            return self._len
+        if self._dirty <= k:
+            self._update_offsets()
+        return self._offsets[k] + bisect.bisect_left(self._chunks[k].timestamps, timestamp)
+
+    def evictable(self, cutoff: int) -> int:
+        """
+        :param cutoff: The epoch nanoseconds before which trades may be evicted
+        :return: The number of trades evict() would drop for the same cutoff.
+        """
+        if len(self._chunks) == 0 or self._maxes[0] >= cutoff:
+            return 0
+        k = bisect.bisect_left(self._maxes, cutoff)
+        return sum(len(chunk) for chunk in self._chunks[:k])
+
+    def evict(self, cutoff: int) -> int:
+        """Drops the oldest trades, a whole chunk at a time, as long as every trade in the chunk
+        is older than cutoff.
+        :param cutoff: The epoch nanoseconds before which trades may be evicted
+        :return: The number of dropped trades.
+        """
+        removed = self.evictable(cutoff)
+        if removed > 0:
+            k = bisect.bisect_left(self._maxes, cutoff)
+            del self._chunks[:k], self._maxes[:k]
+            self._len -= removed
+            self._dirty = 0
+        return removed
+
+    def cumulative(self, index: int) -> (float, int):
+        """
+        :param index: The index after the last trade to sum
+        :return: The summed total price and the summed quantity of the trades before index.
+        """
+        if index <= 0:
+            return 0.0, 0
+        if self._dirty < len(self._chunks):
+            self._update_offsets()
+        if self._summed < len(self._chunks):
+            self._update_sums()
+
+        if index >= self._len:
+            k = len(self._chunks) - 1
+        else:
+            k = bisect.bisect_right(self._offsets, index) - 1
+        i = min(index - self._offsets[k], len(self._chunks[k]))
+
+        notional = self._chunk_notionals[k]
+        quantity = self._chunk_quantities[k]
+        if i > 0:
+            chunk_notional, chunk_quantity = self._chunks[k].running_sums(i)
+            notional += chunk_notional
+            quantity += chunk_quantity
+        return notional, quantity
+
+    def totals(self, start: int, stop: int) -> (float, int):
+        """
+        :param start: The index of the first trade to sum
+        :param stop: The index after the last trade to sum
+        :return: The summed total price and the summed quantity of the trades in [start, stop).
+        .. note:: Both are found from the running sums in O(log n), whatever the length of the range.
+        """
+        if start >= stop:
+            return 0.0, 0
+        start_notional, start_quantity = self.cumulative(start)
+        stop_notional, stop_quantity = self.cumulative(stop)
+        return stop_notional - start_notional, stop_quantity - start_quantity
+
+
+class _BarChunk(_Chunk):
+    """A contiguous run of sorted bars inside a BarSeries, stored column by column, and the
+    token of the series that may write to it in place."""
+    __slots__ = ('starts', 'opens', 'highs', 'lows', 'closes', 'volumes', 'notionals', 'counts',
+                 'open_times', 'close_times')
+    columns = {'starts': 'q', 'opens': 'd', 'highs': 'd', 'lows': 'd', 'closes': 'd', 'volumes': 'q',
+               'notionals': 'd', 'counts': 'q', 'open_times': 'q', 'close_times': 'q'}
+
+    def __len__(self):
+        return len(self.starts)
+
+
+def _bar_column(name: str) -> property:
+    def column(self) -> array:
+        return self._column(name)
+    column.__doc__ = ":return: A contiguous copy of the {name} of all bars".format(name=name.replace('_', ' '))
+    return property(column)
+
+
+class BarSeries(_ChunkedSeries):
+    """
+    Open, high, low, close, volume, total price and trade count bars of a fixed resolution,
+    kept up to date as trades are recorded, in any order.
+    .. note:: The bars are stored column by column in arrays, sorted by the epoch nanoseconds at
+        which they start. The open and close of a bar are the prices of its earliest and latest
+        trades, so late trades update them correctly.
+    .. note:: The columns are split in chunks of at most BarSeries.chunk_size bars, like the ones of
+        a TradeLog. Copies share the chunks with the original, and a chunk is copied only when one
+        of them writes to it, so the first trade after a copy copies the last chunk only.
+    """
+    columns = tuple(_BarChunk.columns)
+    _chunk_type = _BarChunk
+
+    def __init__(self, resolution: timedelta):
+        """
+        :param resolution: The length of time covered by each bar
+        :raise ValueError:
+        """
+        if resolution <= timedelta(0):
+            msg = "The resolution of the bars has to be positive."
+            raise ValueError(msg)
+
+        super().__init__()
+        self.resolution = resolution
+        self._resolution = timedelta_to_ns(resolution)
+
+    starts = _bar_column('starts')
+    opens = _bar_column('opens')
+    highs = _bar_column('highs')
+    lows = _bar_column('lows')
+    closes = _bar_column('closes')
+    volumes = _bar_column('volumes')
+    notionals = _bar_column('notionals')
+    counts = _bar_column('counts')
+    open_times = _bar_column('open_times')
+    close_times = _bar_column('close_times')
+
+    def add(self, timestamp: int, price: float, quantity: int):
+        """Adds a trade to the bar it falls in.
+        :param timestamp: The epoch nanoseconds of the trade
+        :param price: The price per share of the trade
+        :param quantity: The quantity of the trade
+        """
+        start = timestamp - timestamp % self._resolution
+        chunks = self._chunks
+        if len(chunks) == 0 or start > self._maxes[-1]:
+            if len(chunks) == 0 or len(chunks[-1]) >= self.chunk_size:
+                chunks.append(_BarChunk(self._owner))
+                self._maxes.append(start)
+            k = len(chunks) - 1
+            chunk = self._own(k)
+            i = len(chunk)
+        else:
+            k = bisect.bisect_left(self._maxes, start)
+            chunk = self._own(k)
+            i = bisect.bisect_left(chunk.starts, start)
+
+        if i < len(chunk) and chunk.starts[i] == start:
+            chunk.highs[i] = max(chunk.highs[i], price)
+            chunk.lows[i] = min(chunk.lows[i], price)
+            chunk.volumes[i] += quantity
+            chunk.notionals[i] += quantity * price
+            chunk.counts[i] += 1
+            if timestamp < chunk.open_times[i]:
+                chunk.opens[i] = price
+                chunk.open_times[i] = timestamp
+            if timestamp >= chunk.close_times[i]:
+                chunk.closes[i] = price
+                chunk.close_times[i] = timestamp
+            return
+
+        values = (start, price, price, price, price, quantity, quantity * price, 1, timestamp, timestamp)
+        for name, value in zip(self.columns, values):
+            getattr(chunk, name).insert(i, value)
+        self._maxes[k] = chunk.starts[-1]
+        self._len += 1
+
+        if len(chunk) > 2 * self.chunk_size:
+            chunks.insert(k + 1, chunk.split())
+            self._maxes.insert(k + 1, self._maxes[k])
+            self._maxes[k] = chunk.starts[-1]
+
+    def bars(self, start: datetime, end: datetime) -> {str: array}:
+        """
+        :param start: The earliest moment of the bars to return
+        :param end: The moment before which the bars to return start
+        :return: The columns of the bars that start in [start, end), by name, plus their
+            average prices per share under 'vwaps'.
+        """
+        start = datetime_to_ns(start)
+        end = datetime_to_ns(end)
+        bars = {name: array(typecode) for name, typecode in _BarChunk.columns.items()}
+        for chunk in self._chunks[bisect.bisect_left(self._maxes, start):]:
+            if chunk.starts[0] >= end:
+                break
+            lo = bisect.bisect_left(chunk.starts, start)
+            hi = bisect.bisect_left(chunk.starts, end)
+            for name in self.columns:
+                bars[name].extend(getattr(chunk, name)[lo:hi])
+        bars['vwaps'] = array('d', map(operator.truediv, bars['notionals'], bars['volumes']))
+        return bars
+
+
+class RetentionPolicy:
+    """
+    How long the recorded trades of a stock are kept. Trades older than the horizon, counted
+    back from the latest recorded trade, are dropped as new trades are recorded.
+    .. note:: The trades are dropped a whole chunk of the TradeLog at a time, so up to
+        TradeLog.chunk_size older trades may be kept. When a compaction resolution is given,
+        bars of that resolution are kept for the stock, so the dropped trades are still summed
+        up in them.
+    """
+    def __init__(self, horizon: timedelta, compaction_resolution: timedelta=None):
+        """
+        :param horizon: The length of time for which the recorded trades are kept, for example
+            4 * Stock.price_time_interval
+        :param compaction_resolution: The resolution of the bars to keep for the dropped trades,
+            or None to drop them without a trace
+        :raise ValueError:
+        """
+        if horizon <= timedelta(0):
+            msg = "The retention horizon has to be positive."
+            raise ValueError(msg)
+
+        self.horizon = horizon
+        self.compaction_resolution = compaction_resolution
+
+
+class _PriceWindow:
+    """
+    Running sums over the trades of a TradeLog from the index start on, the trades that are not
+    older than cutoff epoch nanoseconds (all of them while it is None). They are moved along as
+    trades are recorded and as the window is priced.
+    """
+    __slots__ = ('start', 'cutoff', 'notional', 'quantity')
+
+    def __init__(self, trades: TradeLog):
+        self.start = 0
+        self.cutoff = None
+        self.notional, self.quantity = trades.totals(0, len(trades))
+
+    def copy(self) -> '_PriceWindow':
+        window = object.__new__(_PriceWindow)
+        window.start = self.start
+        window.cutoff = self.cutoff
+        window.notional = self.notional
+        window.quantity = self.quantity
+        return window
+
+    def insert(self, timestamp: int, quantity: int, price: float):
+        """Takes a trade just inserted in the TradeLog into account."""
+        if self.cutoff is None or timestamp >= self.cutoff:
+            self.notional += quantity * price
+            self.quantity += quantity
+        else:
+            self.start += 1
+
+    def extend(self, timestamps, prices, quantities):
+        """Takes a sorted batch of trades just merged into the TradeLog into account."""
+        start = 0 if self.cutoff is None else bisect.bisect_left(timestamps, self.cutoff)
+        self.start += start
+        self.notional += sum(map(operator.mul, quantities[start:], prices[start:]))
+        self.quantity += sum(quantities[start:])
+
+    def evict(self, trades: TradeLog, removed: int):
+        """Takes the first removed trades, about to be evicted from the TradeLog, out of the window."""
+        if self.start < removed:
+            notional, quantity = trades.totals(self.start, removed)
+            self.notional -= notional
+            self.quantity -= quantity
+            self.start = 0
+        else:
+            self.start -= removed
+
+    def move(self, trades: TradeLog, cutoff: int):
+        """Moves the start of the window, so it holds only the trades not older than cutoff.
+        :param trades: The TradeLog the window is over
+        :param cutoff: The earliest timestamp of a trade that belongs to the window, in epoch nanoseconds.
+        .. note:: Only the trades that aged out since the previous call are taken out of the sums,
+            using the running sums of the TradeLog, so each call costs a few bisections.
+        """
+        old_start = self.start
+        start = trades.bisect_left_ns(cutoff)
+
+        if start >= old_start:
+            notional, quantity = trades.totals(old_start, start)
+            self.notional -= notional
+            self.quantity -= quantity
+        else:
+            notional, quantity = trades.totals(start, old_start)
+            self.notional += notional
+            self.quantity += quantity
+
+        if start == len(trades):
+            self.notional = 0.0
+            self.quantity = 0
+
+        self.start = start
+        self.cutoff = cutoff
+
+    def price(self, trades: TradeLog) -> float:
+        """
+        :return: The average price per share of the trades in the window, None if it is empty.
+        """
+        if self.start < len(trades):
+            return self.notional / float(self.quantity)
+        else:
+            return None
+
+    def expiry(self, trades: TradeLog, interval: int) -> int:
+        """
+        :param interval: The length of the window in nanoseconds
+        :return: The epoch nanoseconds after which the oldest trade in the window ages out of it,
+            or None if the window is empty.
+        """
+        if self.start < len(trades):
+            return trades.timestamp_at(self.start) + interval
+        else:
+            return None
+
+
+class QuantileSketch:
+    """
+    A mergeable sketch of the distribution of non-negative values, in the manner of DDSketch:
+    each positive value is counted in the bin of index ceil(log(value, gamma)), where
+    gamma = (1 + relative_accuracy) / (1 - relative_accuracy).
+    .. note:: Every quantile is estimated within relative_accuracy of the value of its rank, as
+        long as fewer than max_bins bins are needed. Beyond that, the lowest bins are collapsed
+        into one, which only the lowest quantiles lose accuracy for. Values ranging over a ratio
+        of r need about log(r) / (2 * relative_accuracy) bins, so the default 2048 bins at 1%
+        cover a ratio of e**40. Values may be removed as well as added.
+    """
+    def __init__(self, relative_accuracy: float=0.01, max_bins: int=2048):
+        """
+        :param relative_accuracy: The relative error of the quantiles, in (0, 1)
+        :param max_bins: The most bins kept, which bounds the memory of the sketch
+        :raise ValueError:
+        """
+        if not 0 < relative_accuracy < 1 or max_bins < 1:
+            msg = "Invalid sketch: relative_accuracy={a}, max_bins={b}".format(a=relative_accuracy, b=max_bins)
+            raise ValueError(msg)
+
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.count = 0
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._zeros = 0
+        self._bins = {}
+        # The index of the bin into which the lower bins have been collapsed, or None.
+        self._floor = None
+
+    def copy(self) -> 'QuantileSketch':
+        sketch = copy.copy(self)
+        sketch._bins = dict(self._bins)
+        return sketch
+
+    def _index(self, value: float) -> int:
+        index = math.ceil(math.log(value) / self._log_gamma)
+        if self._floor is not None and index < self._floor:
+            return self._floor
+        return index
+
+    def add(self, value: float, count: int=1):
+        """
+        :param value: The value to count, not negative
+        :param count: How many times to count it
+        :raise ValueError:
+        """
+        if value > 0:
+            index = self._index(value)
+            self._bins[index] = self._bins.get(index, 0) + count
+            if len(self._bins) > self.max_bins:
+                self._collapse()
+        elif value == 0:
+            self._zeros += count
+        else:
+            msg = "A sketch only counts values that are not negative: {value}".format(value=value)
+            raise ValueError(msg)
+        self.count += count
+
+    def remove(self, value: float, count: int=1):
+        """
+        :param value: A value counted by the sketch
+        :param count: How many times it is no longer counted
+        :raise ValueError:
+        """
+        if value > 0:
+            index = self._index(value)
+            left = self._bins.get(index, 0) - count
+            if left < 0:
+                msg = "The value {value} is not counted by the sketch.".format(value=value)
+                raise ValueError(msg)
+            elif left == 0:
+                del self._bins[index]
+            else:
+                self._bins[index] = left
+        elif value == 0 and self._zeros >= count:
+            self._zeros -= count
+        else:
+            msg = "The value {value} is not counted by the sketch.".format(value=value)
+            raise ValueError(msg)
+        self.count -= count
+
+    def _collapse(self):
+        indexes = sorted(self._bins)
+        floor = indexes[len(indexes) - self.max_bins]
+        for index in indexes[:len(indexes) - self.max_bins]:
+            self._bins[floor] += self._bins.pop(index)
+        self._floor = floor
+
+    def merge(self, other: 'QuantileSketch'):
+        """Counts the values counted by the other sketch as well.
+        :param other: A sketch of the same relative accuracy
+        :raise ValueError:
+        """
+        if other.relative_accuracy != self.relative_accuracy:
+            msg = "Only sketches of the same relative accuracy can be merged."
+            raise ValueError(msg)
+
+        if other._floor is not None and (self._floor is None or other._floor > self._floor):
+            self._floor = other._floor
+            for index in [index for index in self._bins if index < self._floor]:
+                count = self._bins.pop(index)
+                self._bins[self._floor] = self._bins.get(self._floor, 0) + count
+        for index, count in other._bins.items():
+            if self._floor is not None and index < self._floor:
+                index = self._floor
+            self._bins[index] = self._bins.get(index, 0) + count
+        if len(self._bins) > self.max_bins:
+            self._collapse()
+        self._zeros += other._zeros
+        self.count += other.count
+
+    def quantile(self, q: float) -> float:
+        """
+        :param q: The quantile, in [0, 1]
+        :return: The estimated value of rank q * (count - 1) among the counted values, None if
+            there are none.
+        :raise ValueError:
+        """
+        if not 0 <= q <= 1:
+            msg = "The quantile has to be in [0, 1]: {q}".format(q=q)
+            raise ValueError(msg)
+        if self.count == 0:
+            return None
+
+        rank = q * (self.count - 1)
+        seen = self._zeros
+        if seen > rank:
+            return 0.0
+        for index in sorted(self._bins):
+            seen += self._bins[index]
+            if seen > rank:
+                return 2 * self._gamma ** index / (self._gamma + 1)
+        return 2 * self._gamma ** max(self._bins) / (self._gamma + 1)
+
+
+class Moments:
+    """
+    The count, mean and variance of a stream of values, kept with Welford's algorithm. Values may
+    be removed as well as added, and moments of separate streams are merged with Chan's formula.
+    """
+    __slots__ = ('count', 'mean', '_m2')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def copy(self) -> 'Moments':
+        moments = Moments()
+        moments.count, moments.mean, moments._m2 = self.count, self.mean, self._m2
+        return moments
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    def remove(self, value: float):
+        """
+        :param value: A value added before
+        """
+        if self.count <= 1:
+            self.count, self.mean, self._m2 = 0, 0.0, 0.0
+            return
+        self.count -= 1
+        delta = value - self.mean
+        self.mean -= delta / self.count
+        self._m2 = max(self._m2 - delta * (value - self.mean), 0.0)
+
+    def merge(self, other: 'Moments'):
+        """Adds the values of the other moments as well."""
+        count = self.count + other.count
+        if count == 0:
+            return
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self.count = count
+
+    @property
+    def variance(self) -> float:
+        """
+        :return: The population variance of the values, None if there are none.
+        """
+        return self._m2 / self.count if self.count > 0 else None
+
+    @property
+    def sum_of_squares(self) -> float:
+        """
+        :return: The sum of the squares of the values.
+        """
+        return self._m2 + self.count * self.mean * self.mean
+
+
+class TradeStatistics:
+    """
+    The distributions of a set of trades: their prices and quantities as a QuantileSketch each,
+    and the logarithmic returns between trades consecutive in time as Moments. Statistics of
+    different stocks or shards are merged into the statistics of all their trades.
+    """
+    def __init__(self, relative_accuracy: float=0.01, max_bins: int=2048):
+        """
+        :param relative_accuracy: The relative error of the quantiles of the sketches
+        :param max_bins: The most bins kept by each sketch
+        :raise ValueError:
+        """
+        self.prices = QuantileSketch(relative_accuracy, max_bins)
+        self.quantities = QuantileSketch(relative_accuracy, max_bins)
+        self.returns = Moments()
+
+    def copy(self) -> 'TradeStatistics':
+        statistics = copy.copy(self)
+        statistics.prices = self.prices.copy()
+        statistics.quantities = self.quantities.copy()
+        statistics.returns = self.returns.copy()
+        return statistics
+
+    def merge(self, other: 'TradeStatistics'):
+        """Adds the trades of the other statistics as well.
+        :raise ValueError:
+        """
+        self.prices.merge(other.prices)
+        self.quantities.merge(other.quantities)
+        self.returns.merge(other.returns)
+
+    @property
+    def volatility(self) -> float:
+        """
+        :return: The standard deviation of the logarithmic returns, None if there are none.
+        """
+        variance = self.returns.variance
+        return math.sqrt(variance) if variance is not None else None
+
+    @property
+    def realized_volatility(self) -> float:
+        """
+        :return: The square root of the sum of the squared logarithmic returns, None if there are none.
+        """
+        return math.sqrt(self.returns.sum_of_squares) if self.returns.count > 0 else None
+
+
+def _log_return(price: float, next_price: float) -> float:
+    """
+    :return: The logarithmic return between two prices, None if either is 0.
+    """
+    if price > 0 and next_price > 0:
+        return math.log(next_price / price)
+    return None
+
+
+class _LiveStatistics:
+    """
+    The TradeStatistics of the trades of a TradeLog from the index start on, the trades not
+    older than cutoff epoch nanoseconds, which trails the latest trade by the window. Each trade
+    enters the statistics once, and leaves them once.
+    """
+    def __init__(self, trades: TradeLog, window: timedelta, relative_accuracy: float):
+        self.window = window
+        self.relative_accuracy = relative_accuracy
+        self.statistics = TradeStatistics(relative_accuracy)
+        self.start = 0
+        self.cutoff = None
+        if len(trades) > 0:
+            self.cutoff = trades.timestamp_at(-1) - timedelta_to_ns(window)
+            self.start = trades.bisect_left_ns(self.cutoff)
+            for index in range(self.start, len(trades)):
+                self.statistics.prices.add(trades.price_at(index))
+                self.statistics.quantities.add(trades.quantity_at(index))
+            self._returns(trades, self.start, len(trades), self.statistics.returns.add)
+
+    def copy(self) -> '_LiveStatistics':
+        live = copy.copy(self)
+        live.statistics = self.statistics.copy()
+        return live
 
-    @property
-    def total_price(self) -> float:
-        """
-        :return: The total price of the trade
+    def _returns(self, trades: TradeLog, first: int, end: int, update):
+        """Calls update with the returns between the consecutive trades in [first, end)."""
+        if end - first < 2:
+            return
+        price = trades.price_at(first)
+        for index in range(first + 1, end):
+            next_price = trades.price_at(index)
+            value = _log_return(price, next_price)
+            if value is not None:
+                update(value)
+            price = next_price
+
+    def record(self, trades: TradeLog, timestamps, prices, quantities, insert):
+        """Inserts a batch of trades into the TradeLog, and takes the ones in the window into account.
+        :param trades: The TradeLog
+        :param timestamps: The epoch nanoseconds of the trades, sorted
+        :param prices: The prices per share of the trades
+        :param quantities: The quantities of the trades
+        :param insert: A callable that inserts the trades into the TradeLog
+        .. note:: The returns are changed only around the trades inserted: the ones between the
+            trades preceding and following the batch are taken out, and put back once it is inserted.
         """
-        return self.quantity * self.price_per_share
+        dead = 0 if self.cutoff is None else bisect.bisect_left(timestamps, self.cutoff)
+        live = dead < len(timestamps)
+        if live:
+            first = max(self.start, trades.bisect_left_ns(timestamps[dead]) - 1)
+            end = min(trades.bisect_left_ns(timestamps[-1] + 1) + 1, len(trades))
+            self._returns(trades, first, end, self.statistics.returns.remove)
 
-    def symbol_and_type(self):
-        return self.symbol + "_" + str(self.stock_type.name)
+        insert()
+        self.start += dead
+
+        if live:
+            for price, quantity in zip(prices[dead:], quantities[dead:]):
+                self.statistics.prices.add(price)
+                self.statistics.quantities.add(quantity)
+            self._returns(trades, first + dead, end + len(timestamps), self.statistics.returns.add)
+        self._advance(trades)
+
+    def _advance(self, trades: TradeLog):
+        cutoff = trades.timestamp_at(-1) - timedelta_to_ns(self.window)
+        if self.cutoff is None or cutoff > self.cutoff:
+            self._leave(trades, trades.bisect_left_ns(cutoff))
+            self.cutoff = cutoff
+
+    def _leave(self, trades: TradeLog, stop: int):
+        """Takes the trades in [start, stop) out of the statistics."""
+        statistics = self.statistics
+        for index in range(self.start, stop):
+            statistics.prices.remove(trades.price_at(index))
+            statistics.quantities.remove(trades.quantity_at(index))
+        self._returns(trades, self.start, min(stop + 1, len(trades)), statistics.returns.remove)
+        self.start = max(self.start, stop)
+
+    def evict(self, trades: TradeLog, removed: int):
+        """Takes the first removed trades, about to be evicted from the TradeLog, out of the statistics."""
+        self._leave(trades, removed)
+        self.start -= removed
 
 
 class Stock:
     """
     .. note:: The class variable Stock.price_time_interval serves as a configuration value to
         define the length of the time interval that is significant to calculate the stock
-        price.
+        price. Each stock may also keep windows of other lengths, given by its windows.
+    .. note:: A stock may be shared between threads: the methods that record trades or read them
+        hold a lock of the stock while they run. The TradeLog returned by Stock.trades is not
+        locked, so other threads should read the trades of a snapshot() instead, which is
+        consistent and does not change.
     """
     price_time_interval = timedelta(minutes=15)
 
@@ -84,15 +1397,24 @@ class Stock:
                  stock_type: StockType,
                  par_value: float,
                  last_dividend: float,
-                 fixed_dividend: float):
+                 fixed_dividend: float,
+                 columnar: bool=False,
+                 bar_resolutions: [timedelta]=(),
+                 retention: RetentionPolicy=None,
+                 windows: [timedelta]=()):
         """
         :param symbol: The short name of the stock used in the exchange
         :param stock_type: Indicator for the type of stock
         :param par_value: The face value per share for this stock
         :param last_dividend: The last dividend paid on the stock
         :param fixed_dividend: In percentage (0.1 == 10%) the on the stock
-        .. note:: This initializer also creates the instance variable self.trades,
-                  which is to hold a list of recorded instances of Trade.
+        :param columnar: Whether to keep only the columns of the recorded trades, instead of the
+            instances of Trade themselves. This reduces the memory used by a long history.
+        :param bar_resolutions: The resolutions of the bars to keep up to date for this stock
+        :param retention: How long the recorded trades are kept, or None to keep them all
+        :param windows: The lengths of the windows to price, besides Stock.price_time_interval
+        .. note:: This initializer also creates the TradeLog exposed as self.trades,
+                  which is to hold the recorded trades.
         .. note :: There is no initial ticker price to be added, as there should be history fo trades on the stock,
                    from it private trades or from the initial public offering.
         """
@@ -106,10 +1428,107 @@ class Stock:
         else:
             self._fixed_dividend = fixed_dividend
 
-        self.trades = []
+        self._trades = TradeLog(symbol, stock_type, keep_objects=not columnar)
+        self._lock = threading.RLock()
+
+        # The running window of Stock.price_time_interval, and the windows of other lengths by
+        # their length, moved along by price() and kept up to date as trades are recorded.
+        self._window = _PriceWindow(self._trades)
+        self._windows = {}
+        for window in windows:
+            self.add_window(window)
+
+        # The statistics of the latest trades, or None while they are not tracked.
+        self._statistics = None
+
+        # Callables that are called with this stock after trades have been recorded for it.
+        self._listeners = []
+
+        self._bars = {}
+        for resolution in bar_resolutions:
+            self.add_bar_resolution(resolution)
+
+        self._retention = None
+        self.set_retention(retention)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_listeners'] = []
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def snapshot(self) -> 'Stock':
+        """
+        :return: An independent copy of this stock, which does not observe the trades recorded
+            after it has been taken, nor affects this stock when trades are recorded for it.
+        .. note:: The recorded trades are shared with the copy until either side writes to them,
+            so taking a snapshot does not copy the history.
+        """
+        with self._lock:
+            snapshot = copy.copy(self)
+            snapshot._trades = self._trades.copy()
+            snapshot._window = self._window.copy()
+            snapshot._windows = {window: price_window.copy() for window, price_window in self._windows.items()}
+            if self._statistics is not None:
+                snapshot._statistics = self._statistics.copy()
+            snapshot._bars = {resolution: bars.copy() for resolution, bars in self._bars.items()}
+            return snapshot
 
     def symbol_and_type(self):
-        return self.symbol + "_" + str(self.stock_type.name)
+        return symbol_and_type_key(self.symbol, self.stock_type)
+
+    @property
+    def retention(self) -> RetentionPolicy:
+        """
+        :return: How long the recorded trades are kept, or None if they are all kept
+        """
+        return self._retention
+
+    def set_retention(self, retention: RetentionPolicy):
+        """Sets how long the recorded trades are kept, and drops the ones that are too old already.
+        :param retention: The retention policy, or None to keep all trades recorded from now on
+        """
+        with self._lock:
+            self._retention = retention
+            if retention is not None:
+                if retention.compaction_resolution is not None:
+                    self.add_bar_resolution(retention.compaction_resolution)
+                self._apply_retention()
+
+    def _retention_cutoff(self) -> int:
+        """
+        :return: The epoch nanoseconds before which trades are not kept, or None if they all are.
+        """
+        if self._retention is None or len(self._trades) == 0:
+            return None
+        else:
+            return self._trades.timestamp_at(-1) - timedelta_to_ns(self._retention.horizon)
+
+    def _apply_retention(self):
+        """Drops the trades that are older than the retention policy allows."""
+        cutoff = self._retention_cutoff()
+        if cutoff is None:
+            return
+
+        removed = self._trades.evictable(cutoff)
+        if removed > 0:
+            self._window.evict(self._trades, removed)
+            for price_window in self._windows.values():
+                price_window.evict(self._trades, removed)
+            if self._statistics is not None:
+                self._statistics.evict(self._trades, removed)
+            self._trades.evict(cutoff)
+
+    @property
+    def trades(self) -> TradeLog:
+        """
+        :return: The recorded trades, sorted by timestamp
+        """
+        return self._trades
 
     @property
     def dividend(self) -> float:
@@ -125,8 +1544,8 @@ class Stock:
     def dividend_yield(self) -> float:
         return self.dividend / self.ticker_price
 
-    def record_trade(self, trade: Trade):
-        """Records a trade for this stock.
+    def _check_trade(self, trade: Trade):
+        """
         :param trade: The trade to be recorded
         :raise TypeError:
         :raise ValueError:
@@ -134,11 +1553,284 @@ class Stock:
         if type(trade) is not Trade:
             msg = "Argument trade={trade} must be of type Trade.".format(trade=trade)
             raise TypeError(msg)
-        elif self.symbol is not trade.symbol or self.stock_type is not trade.stock_type:
+        elif self.symbol != trade.symbol or self.stock_type is not trade.stock_type:
             msg = "Argument trade={trade} does not belong to this stock.".format(trade=trade)
             raise ValueError(msg)
+        elif not isinstance(trade.timestamp, datetime):
+            msg = "The timestamp of trade={trade} has to be a datetime.".format(trade=trade)
+            raise TypeError(msg)
+        elif not isinstance(trade.quantity, int):
+            msg = "The quantity of shares of trade={trade} has to be an integer.".format(trade=trade)
+            raise TypeError(msg)
+        elif not 0 < trade.quantity < 2 ** 63:
+            msg = "The quantity of shares of trade={trade} has to be positive and below 2 ** 63.".format(trade=trade)
+            raise ValueError(msg)
+        elif not isinstance(trade.price_per_share, (int, float)):
+            msg = "The price per share of trade={trade} has to be a number.".format(trade=trade)
+            raise TypeError(msg)
+        elif type(trade.buy_sell_indicator) is not BuySellIndicator:
+            msg = "The buy/sell indicator of trade={trade} is wrong.".format(trade=trade)
+            raise ValueError(msg)
+
+    def record_trade(self, trade: Trade):
+        """Records a trade for this stock.
+        :param trade: The trade to be recorded
+        :raise TypeError:
+        :raise ValueError:
+        """
+        with self._lock:
+            self._check_trade(trade)
+            timestamp = datetime_to_ns(trade.timestamp)
+
+            retention_cutoff = self._retention_cutoff()
+            if retention_cutoff is not None and timestamp < retention_cutoff:
+                # The trade is too old to be kept, but the bars still sum it up.
+                for bars in self._bars.values():
+                    bars.add(timestamp, trade.price_per_share, trade.quantity)
+                return
+
+            if self._statistics is None:
+                self._trades.insert(trade, timestamp)
+            else:
+                self._statistics.record(self._trades, (timestamp,), (trade.price_per_share,), (trade.quantity,),
+                                        lambda: self._trades.insert(trade, timestamp))
+
+            # The bars are updated once the trade is in the log, so a trade the log refuses is not in them.
+            for bars in self._bars.values():
+                bars.add(timestamp, trade.price_per_share, trade.quantity)
+
+            self._window.insert(timestamp, trade.quantity, trade.price_per_share)
+            for price_window in self._windows.values():
+                price_window.insert(timestamp, trade.quantity, trade.price_per_share)
+
+            if retention_cutoff is not None:
+                self._apply_retention()
+
+            for listener in self._listeners:
+                listener(self)
+
+    def record_trades(self, trades) -> [(Trade, Exception)]:
+        """Records a batch of trades for this stock. The batch is sorted once and merged into the
+        recorded trades in one pass.
+        :param trades: An iterable of the trades to be recorded
+        :return: The rejected trades, each with the error that rejected it.
+        .. note:: Every trade of the batch is checked, and its timestamp converted, before any of
+            them is recorded, so a rejected trade leaves no trace of the batch behind.
+        """
+        with self._lock:
+            rows = []
+            rejected = []
+            for trade in trades:
+                try:
+                    self._check_trade(trade)
+                    rows.append((datetime_to_ns(trade.timestamp), trade))
+                except (TypeError, ValueError) as error:
+                    rejected.append((trade, error))
+
+            rows.sort(key=operator.itemgetter(0))
+            accepted = [trade for timestamp, trade in rows]
+            self._record_columns([timestamp for timestamp, trade in rows],
+                                 [trade.price_per_share for trade in accepted], [trade.quantity for trade in accepted],
+                                 [trade.buy_sell_indicator.value for trade in accepted], accepted)
+            return rejected
+
+    def load_columns(self, timestamps, prices, quantities, sides):
+        """Records a batch of trades given column by column, without validating them, for data the
+        caller vouches for. Instances of Trade are only materialized if this stock keeps them.
+        :param timestamps: The epoch nanoseconds of the trades
+        :param prices: The prices per share of the trades
+        :param quantities: The quantities of the trades
+        :param sides: The buy/sell indicator values of the trades
+        """
+        with self._lock:
+            if any(map(operator.gt, timestamps, islice(timestamps, 1, None))):
+                order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+                timestamps, prices, quantities, sides = ([column[i] for i in order]
+                                                         for column in (timestamps, prices, quantities, sides))
+            self._record_columns(timestamps, prices, quantities, sides)
+
+    def _record_columns(self, timestamps, prices, quantities, sides, trades: [Trade]=None):
+        """Records a batch of valid trades given column by column.
+        :param timestamps: The epoch nanoseconds of the trades, sorted
+        :param prices: The prices per share of the trades
+        :param quantities: The quantities of the trades
+        :param sides: The buy/sell indicator values of the trades
+        :param trades: The instances of Trade, if they are known already
+        """
+        if len(timestamps) == 0:
+            return
+        # The bars sum up the trades retention drops as well.
+        bar_columns = timestamps, prices, quantities
+
+        if self._retention is not None:
+            latest = timestamps[-1]
+            if len(self._trades) > 0:
+                latest = max(latest, self._trades.timestamp_at(-1))
+            start = bisect.bisect_left(timestamps, latest - timedelta_to_ns(self._retention.horizon))
+            timestamps, prices, quantities, sides = (timestamps[start:], prices[start:], quantities[start:],
+                                                     sides[start:])
+            trades = trades[start:] if trades is not None else None
+
+        if self._statistics is None:
+            self._trades.extend_columns(timestamps, prices, quantities, sides, trades)
+        else:
+            self._statistics.record(self._trades, timestamps, prices, quantities,
+                                    lambda: self._trades.extend_columns(timestamps, prices, quantities, sides, trades))
+
+        # The bars are updated once the trades are in the log, so a batch the log refuses is not in them.
+        for bars in self._bars.values():
+            for timestamp, price, quantity in zip(*bar_columns):
+                bars.add(timestamp, price, quantity)
+
+        self._window.extend(timestamps, prices, quantities)
+        for price_window in self._windows.values():
+            price_window.extend(timestamps, prices, quantities)
+
+        self._apply_retention()
+
+        if len(timestamps) > 0:
+            for listener in self._listeners:
+                listener(self)
+
+    def _price_window(self, window: timedelta) -> (_PriceWindow, timedelta):
+        """
+        :param window: The length of one of the windows of this stock, or None for Stock.price_time_interval
+        :return: The running window, and its length.
+        :raise KeyError:
+        """
+        if window is None:
+            return self._window, self.price_time_interval
         else:
-            my_insort_left(self.trades, trade, keyfunc=lambda v: v.timestamp)
+            return self._windows[window], window
+
+    def _window_expiry(self, window: timedelta=None) -> int:
+        """
+        :param window: The length of one of the windows of this stock, or None for Stock.price_time_interval
+        :return: The epoch nanoseconds after which the oldest trade in the running window ages
+            out of it, or None if the window is empty.
+        """
+        price_window, interval = self._price_window(window)
+        return price_window.expiry(self._trades, timedelta_to_ns(interval))
+
+    def track_statistics(self, window: timedelta=None, relative_accuracy: float=0.01):
+        """Starts keeping the TradeStatistics of the trades not older than the window, counted back
+        from the latest recorded trade, built first from the trades recorded so far.
+        :param window: The length of time of the window, or None for Stock.price_time_interval
+        :param relative_accuracy: The relative error of the quantiles of the prices and quantities
+        :raise ValueError:
+        .. note:: The statistics are kept up to date as trades are recorded, at the cost of a few
+            bisections per trade, and take a fixed amount of memory, whatever the number of trades.
+        """
+        if window is None:
+            window = self.price_time_interval
+        if window <= timedelta(0):
+            msg = "The length of a window has to be positive."
+            raise ValueError(msg)
+        if not 0 < relative_accuracy < 1:
+            msg = "The relative accuracy of the statistics has to be in (0, 1)."
+            raise ValueError(msg)
+        with self._lock:
+            statistics = self._statistics
+            if statistics is None or statistics.window != window or \
+                    statistics.relative_accuracy != relative_accuracy:
+                self._statistics = _LiveStatistics(self._trades, window, relative_accuracy)
+
+    def statistics(self) -> TradeStatistics:
+        """
+        :return: A copy of the statistics of the latest trades, None if they are not tracked.
+        """
+        with self._lock:
+            if self._statistics is None:
+                return None
+            return self._statistics.statistics.copy()
+
+    @property
+    def windows(self) -> (timedelta,):
+        """
+        :return: The lengths of the windows priced by this stock, besides Stock.price_time_interval
+        """
+        return tuple(self._windows)
+
+    def add_window(self, window: timedelta):
+        """Starts keeping a running window of the given length, besides the one of
+        Stock.price_time_interval, which price() and price_at() may be asked for.
+        :param window: The length of time of the window
+        :raise ValueError:
+        .. note:: The trades dropped by the retention policy of the stock leave every window, so
+            the retention horizon should be longer than the longest window.
+        """
+        if window <= timedelta(0):
+            msg = "The length of a window has to be positive."
+            raise ValueError(msg)
+        with self._lock:
+            if window not in self._windows:
+                self._windows[window] = _PriceWindow(self._trades)
+
+    def add_bar_resolution(self, resolution: timedelta):
+        """Starts keeping bars of the given resolution up to date, built first from the trades
+        recorded so far.
+        :param resolution: The length of time covered by each bar
+        :raise ValueError:
+        """
+        with self._lock:
+            if resolution not in self._bars:
+                bars = BarSeries(resolution)
+                for timestamps, prices, quantities, sides in self._trades.iter_columns():
+                    for timestamp, price, quantity in zip(timestamps, prices, quantities):
+                        bars.add(timestamp, price, quantity)
+                self._bars[resolution] = bars
+
+    def bars(self, resolution: timedelta, start: datetime, end: datetime) -> {str: array}:
+        """
+        :param resolution: One of the resolutions of the bars kept for this stock
+        :param start: The earliest moment of the bars to return
+        :param end: The moment before which the bars to return start
+        :return: The columns of the bars as returned by BarSeries.bars.
+        :raise KeyError:
+        """
+        with self._lock:
+            return self._bars[resolution].bars(start, end)
+
+    def vwap(self, start: datetime, end: datetime) -> float:
+        """
+        :param start: The earliest moment of the trades to consider
+        :param end: The moment before which the trades to consider have taken place
+        :return: The average price per share based on trades recorded in [start, end). None if
+            there are 0 trades that satisfy this condition.
+        """
+        with self._lock:
+            lo = self._trades.bisect_left(start)
+            hi = self._trades.bisect_left(end)
+
+            if hi > lo:
+                notional, quantity = self._trades.totals(lo, hi)
+                return notional / float(quantity)
+            else:
+                return None
+
+    def price_at(self, timestamps, window: timedelta=None) -> [float]:
+        """
+        :param timestamps: An iterable of the points of time to be taken as the current one.
+        :param window: The length of one of the windows of this stock, or None for Stock.price_time_interval
+        :return: The price for each of them, as price() would return it.
+        :raise KeyError:
+        .. note:: Each price is found from the running sums of the recorded trades with a bisection,
+            so the cost does not depend on the number of trades in each window.
+        """
+        with self._lock:
+            trades = self._trades
+            interval = timedelta_to_ns(self._price_window(window)[1])
+            total_notional, total_quantity = trades.cumulative(len(trades))
+
+            prices = []
+            for timestamp in timestamps:
+                start = trades.bisect_left_ns(datetime_to_ns(timestamp) - interval)
+                if start < len(trades):
+                    notional, quantity = trades.cumulative(start)
+                    prices.append((total_notional - notional) / float(total_quantity - quantity))
+                else:
+                    prices.append(None)
+            return prices
 
     @property
     def ticker_price(self) -> float:
@@ -148,96 +1840,773 @@ class Stock:
         .. note:: We don't know if the trades will be registered in chronological order.
             That is why self.trades is explicitly sorted.
         """
-        if len(self.trades) > 0:
-            return float(self.trades[-1].price_per_share)
-        else:
-            msg = "The last ticker price is not yet available."
-            raise AttributeError(msg)
+        with self._lock:
+            if len(self._trades) > 0:
+                return float(self._trades.price_at(-1))
+            else:
+                msg = "The last ticker price is not yet available."
+                raise AttributeError(msg)
 
     @property
     def price_earnings_ratio(self) -> float:
         """
         :return: The P/E ratio for this stock
         """
-        if self.dividend != 0:
-            return self.ticker_price / self.dividend
+        dividend = self.dividend
+        if dividend != 0:
+            return self.ticker_price / dividend
         else:
             return None
 
-    def price(self, current_time: datetime=datetime.now()) -> float:
+    def price(self, current_time: datetime=datetime.now(), window: timedelta=None) -> float:
         """
         :param current_time: The point of time defined as the current one.
+        :param window: The length of one of the windows of this stock, or None for Stock.price_time_interval
         :return: The average price per share based on trades recorded in the last
-            Stock.price_time_interval. None if there are 0 trades that satisfy this
+            Stock.price_time_interval, or window. None if there are 0 trades that satisfy this
             condition.
+        :raise KeyError:
         .. note:: The existence of the current_time parameter avoids the inner user
             of datetime.now, thus keeping referential transparency and moving state out.
         """
-        separation_index = my_bisect_left(self.trades, current_time - self.price_time_interval,
-                                          keyfunc=datetime_extract)
-        recent_trades = self.trades[separation_index:]
+        with self._lock:
+            price_window, interval = self._price_window(window)
+            price_window.move(self._trades, datetime_to_ns(current_time - interval))
+            return price_window.price(self._trades)
 
-        if len(recent_trades) > 0:
-            summed_price = sum([trade.total_price for trade in recent_trades])
-            quantities = sum([trade.quantity for trade in recent_trades])
-            return summed_price / float(quantities)
+    def prices(self, current_time: datetime=datetime.now()) -> {timedelta: float}:
+        """
+        :param current_time: The point of time defined as the current one.
+        :return: The price of each of the windows of this stock, by their length, as price()
+            returns it.
+        """
+        with self._lock:
+            return {window: self.price(current_time, window) for window in self._windows}
+
+
+class Subscription:
+    """A listener of the changes of a measure of the exchange, for one stock or for the whole
+    exchange. Created by GlobalBeverageCorporationExchange.subscribe.
+    """
+    def __init__(self, measure: Measure, symbol_and_type: str, listener, coalesce: bool, min_interval: float,
+                 dispatcher):
+        self.measure = measure
+        self.symbol_and_type = symbol_and_type
+        self.listener = listener
+        self.coalesce = coalesce
+        self.min_interval = min_interval
+        self.dispatcher = dispatcher
+        # The latest value of the measure, which the listener has been or is to be called with.
+        self.value = None
+        self.active = True
+        self._held = False
+        self._next_delivery = 0.0
+        self._queued = False
+
+    def _update(self, value, now: float) -> bool:
+        """
+        :param value: The current value of the measure
+        :param now: The time.monotonic() seconds
+        :return: Whether the change is held back by min_interval, and is to be released later.
+        """
+        if value == self.value and (value is None) == (self.value is None):
+            return self._held
+        self.value = value
+        if self.min_interval is not None and now < self._next_delivery:
+            self._held = True
         else:
-            return None
+            self._deliver(now)
+        return self._held
+
+    def _release(self, now: float) -> bool:
+        """Delivers the change held back, once min_interval has passed.
+        :return: Whether it is still held back.
+        """
+        if self._held and now >= self._next_delivery:
+            self._deliver(now)
+        return self._held
+
+    def _deliver(self, now: float):
+        self._held = False
+        if self.min_interval is not None:
+            self._next_delivery = now + self.min_interval
+        if not self.coalesce:
+            self.dispatcher(lambda value=self.value: self._call(value))
+        elif not self._queued:
+            self._queued = True
+            self.dispatcher(self._call_latest)
+
+    def _call_latest(self):
+        # The flag is cleared before the value is read, so a change made meanwhile is delivered
+        # again rather than lost.
+        self._queued = False
+        self._call(self.value)
+
+    def _call(self, value):
+        if self.active:
+            self.listener(self.symbol_and_type, self.measure, value)
+
+
+class ThreadDispatcher:
+    """Calls the listeners of subscriptions in a thread of its own, so slow listeners do not hold
+    back the thread recording trades. Pass it as the dispatcher of
+    GlobalBeverageCorporationExchange.subscribe.
+    """
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __call__(self, function):
+        self._queue.put(function)
+
+    def _run(self):
+        while True:
+            function = self._queue.get()
+            if function is None:
+                return
+            function()
+
+    def stop(self):
+        """Stops the thread once it has called the listeners already queued."""
+        self._queue.put(None)
+        self._thread.join()
+
+
+def _call_now(function):
+    function()
+
+
+def _pack_records(journal, trades: [Trade], rejected: [(Trade, Exception)]) -> [(Trade, bytes)]:
+    """
+    :param journal: The journal the trades are to be appended to
+    :param trades: The trades to pack
+    :param rejected: The list to which the trades the journal cannot hold are added, with their error
+    :return: The packed trades, each with its record.
+    """
+    records = []
+    for trade in trades:
+        try:
+            records.append((trade, journal.pack(trade)))
+        except ValueError as error:
+            rejected.append((trade, error))
+    return records
+
+
+class _IndexState:
+    """
+    The all share index of one window, kept as the sum of the logarithms of the positive stock
+    prices, plus the number of missing and zero prices, as of time epoch nanoseconds. Only the
+    stocks in changed, and the ones whose window expires in expiries, are priced again.
+    """
+    def __init__(self, stocks):
+        self.prices = {}
+        self.log_sum = 0.0
+        self.missing = 0
+        self.zeros = 0
+        self.time = None
+        self.interval = None
+        self.changed = set(stocks)
+        self.expiries = []
+        self.expiry_of = {}
+
+    def set_price(self, symbol_and_type: str, price: float):
+        if symbol_and_type in self.prices:
+            self.add_price(self.prices[symbol_and_type], -1)
+        self.prices[symbol_and_type] = price
+        self.add_price(price, 1)
+
+    def add_price(self, price: float, sign: int):
+        if price is None:
+            self.missing += sign
+        elif price == 0:
+            self.zeros += sign
+        else:
+            self.log_sum += sign * math.log(price)
 
 
 class GlobalBeverageCorporationExchange:
-    """The whole exchange where the trades take place"""
-    def __init__(self, stocks: {Stock, Stock}):
+    """The whole exchange where the trades take place
+    .. note:: One thread may record trades while any number of threads read from the exchange.
+        Each stock is locked by its own lock, so threads only wait for each other while they use
+        the same stock, and the getters return snapshots, which the readers use without locks.
+    """
+    def __init__(self, stocks: {Stock, Stock}, retention: RetentionPolicy=None, journal=None):
         """
         :param stocks: The stocks traded at this exchange.
+        :param retention: How long the recorded trades are kept, for the stocks that do not have a
+            retention policy of their own. None to keep them all.
+        :param journal: A trade_journal.TradeJournal to which every recorded trade is appended, or None.
         :raise ValueError:
         """
         self.__stocks = stocks
+        self.__retention = retention
+        self.journal = journal
+
+        # self.__lock guards the stocks in self.__stocks, and self.__index_lock the state of the
+        # all share indexes. The listeners of the stocks add to the changed sets of the indexes
+        # without a lock, as adding to a set is atomic, and an index takes a stock out of its set
+        # before pricing it. self.__indexes is replaced, not changed, when a window is added.
+        self.__lock = threading.Lock()
+        self.__index_lock = threading.Lock()
+
+        # The all share index of each window, by its length, or None for Stock.price_time_interval.
+        self.__indexes = {None: _IndexState(stocks)}
+        self.__windows = []
+        self.__bar_resolutions = []
+        # The arguments of track_statistics(), or None while it has not been called.
+        self.__tracked_statistics = None
+
+        # The subscriptions, by the symbol_and_type() of their stock or None for the index, are
+        # evaluated at self.__clock epoch nanoseconds when the stocks in self.__unpublished
+        # have changed, or when the windows in self.__published_expiries expire. They are
+        # guarded by self.__publish_lock, which listeners called inline may take again.
+        self.__publish_lock = threading.RLock()
+        self.__subscriptions = {}
+        self.__held = set()
+        self.__clock = None
+        self.__unpublished = set()
+        self.__published_expiries = []
+        self.__published_expiry_of = {}
+
+        for stock in stocks.values():
+            stock._listeners.append(self.__stock_changed)
+            if stock.retention is None and retention is not None:
+                stock.set_retention(retention)
+
+    def __stock_changed(self, stock: Stock):
+        for index in self.__indexes.values():
+            index.changed.add(stock.symbol_and_type())
+        if self.__subscriptions:
+            self.__unpublished.add(stock.symbol_and_type())
 
     def add_stock(self, stock):
-        if stock not in self.__stocks:
-            self.__stocks[stock.symbol_and_type()] = stock
+        symbol_and_type = stock.symbol_and_type()
+        replaced = self.__stocks.get(symbol_and_type)
+        if replaced is not stock:
+            for resolution in list(self.__bar_resolutions):
+                stock.add_bar_resolution(resolution)
+            for window in list(self.__windows):
+                stock.add_window(window)
+            if self.__tracked_statistics is not None:
+                stock.track_statistics(*self.__tracked_statistics)
+            if stock.retention is None and self.__retention is not None:
+                stock.set_retention(self.__retention)
+            stock._listeners.append(self.__stock_changed)
+
+            with self.__lock:
+                self.__stocks[symbol_and_type] = stock
+                for index in self.__indexes.values():
+                    index.changed.add(symbol_and_type)
+            if replaced is not None:
+                replaced._listeners.remove(self.__stock_changed)
+            if self.__subscriptions:
+                self.__unpublished.add(symbol_and_type)
+                self.__publish()
 
     def stock_in_exchange(self, symbol_and_type: str):
         return symbol_and_type in self.__stocks
 
     def get_stock(self, symbol_and_type: str):
-        return copy.deepcopy(self.__stocks[symbol_and_type])
+        return self.__stocks[symbol_and_type].snapshot()
 
     def get_all_stocks(self):
-        return copy.deepcopy(self.__stocks)
+        with self.__lock:
+            stocks = list(self.__stocks.items())
+        return {symbol_and_type: stock.snapshot() for symbol_and_type, stock in stocks}
+
+    def analytics(self, current_time: datetime=datetime.now()) -> {str: list}:
+        """
+        :param current_time: The point of time defined as the current one.
+        :return: A table of all stocks as a dict of columns of equal length, keyed by
+            'symbol_and_type', 'symbol', 'stock_type', 'ticker_price', 'price', 'dividend',
+            'dividend_yield' and 'price_earnings_ratio'. Where the scalar property of a stock
+            would raise, because it has no trades or a ticker price of 0, the column holds None,
+            and the P/E of a stock with a dividend of 0 is None, as Stock.price_earnings_ratio is.
+        .. note:: Each stock is visited once, under its lock, for its last price and the running
+            sums of its window, which cost a bisection, without moving the window kept by
+            Stock.price. The derived columns are computed over the whole columns afterwards.
+        """
+        with self.__lock:
+            stocks = list(self.__stocks.items())
+
+        cutoff = datetime_to_ns(current_time - Stock.price_time_interval)
+        keys = []
+        symbols = []
+        stock_types = []
+        ticker_prices = []
+        prices = []
+        dividends = []
+        for symbol_and_type, stock in stocks:
+            keys.append(symbol_and_type)
+            symbols.append(stock.symbol)
+            stock_types.append(stock.stock_type)
+            dividends.append(stock.dividend)
+
+            with stock._lock:
+                trades = stock._trades
+                n = len(trades)
+                if n == 0:
+                    ticker_prices.append(None)
+                    prices.append(None)
+                    continue
+                ticker_prices.append(float(trades.price_at(-1)))
+                start = trades.bisect_left_ns(cutoff)
+                if start < n:
+                    notional, quantity = trades.totals(start, n)
+                    prices.append(notional / float(quantity))
+                else:
+                    prices.append(None)
+
+        return {'symbol_and_type': keys,
+                'symbol': symbols,
+                'stock_type': stock_types,
+                'ticker_price': ticker_prices,
+                'price': prices,
+                'dividend': dividends,
+                'dividend_yield': [dividend / ticker_price if ticker_price else None
+                                   for dividend, ticker_price in zip(dividends, ticker_prices)],
+                'price_earnings_ratio': [ticker_price / dividend if dividend != 0 and ticker_price is not None
+                                         else None
+                                         for dividend, ticker_price in zip(dividends, ticker_prices)]}
 
     def record_trade(self, trade: Trade):
         """Records a trade for the proper stock.
         :param trade: The trade to record.
+        .. note:: With a journal, the trade is packed into its record before it is recorded, so
+            a trade the journal cannot hold raises ValueError and is not recorded.
         """
         symbol_and_type = trade.symbol_and_type()
         if not self.stock_in_exchange(symbol_and_type):
-            msg = "There is no stock in the exchange symbol: %s, type: %s" % trade.symbol % str(trade.stock_type)
+            msg = "There is no stock in the exchange symbol: %s, type: %s" % (trade.symbol, str(trade.stock_type))
             raise ValueError(msg)
         else:
+            record = self.journal.pack(trade) if self.journal is not None else None
             self.__stocks[symbol_and_type].record_trade(trade)
+            if record is not None:
+                self.journal.append_records((record,))
+            if self.__subscriptions:
+                self.__publish()
+
+    def record_trades(self, trades) -> [(Trade, Exception)]:
+        """Records a batch of trades. The batch is grouped by stock, and each group is recorded
+        by the proper stock in one pass.
+        :param trades: An iterable of the trades to record.
+        :return: The rejected trades, each with the error that rejected it. The valid trades of
+            the batch are recorded regardless of them.
+        """
+        groups = {}
+        rejected = []
+        for trade in trades:
+            if type(trade) is not Trade:
+                msg = "Argument trade={trade} must be of type Trade.".format(trade=trade)
+                rejected.append((trade, TypeError(msg)))
+            else:
+                groups.setdefault(trade.symbol_and_type(), []).append(trade)
+
+        for symbol_and_type, group in groups.items():
+            if not self.stock_in_exchange(symbol_and_type):
+                for trade in group:
+                    msg = "There is no stock in the exchange symbol: %s, type: %s" % (trade.symbol,
+                                                                                      str(trade.stock_type))
+                    rejected.append((trade, ValueError(msg)))
+            elif self.journal is None:
+                rejected.extend(self.__stocks[symbol_and_type].record_trades(group))
+            else:
+                records = _pack_records(self.journal, group, rejected)
+                group_rejected = self.__stocks[symbol_and_type].record_trades(
+                    [trade for trade, record in records])
+                rejected.extend(group_rejected)
+                rejected_trades = {trade for trade, error in group_rejected}
+                self.journal.append_records(record for trade, record in records if trade not in rejected_trades)
+        if self.__subscriptions:
+            self.__publish()
+        return rejected
+
+    def load_columns(self, symbol_and_type: str, timestamps, prices, quantities, sides):
+        """Records a batch of trades of one stock given column by column, as Stock.load_columns
+        does, without validating them nor appending them to the journal.
+        :param symbol_and_type: The key of the stock in the exchange
+        :param timestamps: The epoch nanoseconds of the trades
+        :param prices: The prices per share of the trades
+        :param quantities: The quantities of the trades
+        :param sides: The buy/sell indicator values of the trades
+        :raise ValueError:
+        """
+        if not self.stock_in_exchange(symbol_and_type):
+            msg = "There is no stock in the exchange with key: %s" % symbol_and_type
+            raise ValueError(msg)
+        else:
+            self.__stocks[symbol_and_type].load_columns(timestamps, prices, quantities, sides)
+            if self.__subscriptions:
+                self.__publish()
+
+    def bars(self, symbol_and_type: str, resolution: timedelta, start: datetime, end: datetime) -> {str: array}:
+        """
+        :param symbol_and_type: The key of the stock in the exchange
+        :param resolution: The resolution of the bars, which must be kept for the stock
+        :param start: The earliest moment of the bars to return
+        :param end: The moment before which the bars to return start
+        :return: The columns of the bars as returned by BarSeries.bars.
+        :raise KeyError:
+        """
+        return self.__stocks[symbol_and_type].bars(resolution, start, end)
+
+    def stock_price(self, symbol_and_type: str, current_time: datetime=datetime.now(),
+                    window: timedelta=None) -> float:
+        """
+        :param symbol_and_type: The key of the stock in the exchange
+        :param current_time: The point of time defined as the current one.
+        :param window: The length of one of the windows of the stock, or None for Stock.price_time_interval
+        :return: Stock.price of the stock, read under its lock without taking a snapshot of it.
+        :raise KeyError:
+        """
+        return self.__stocks[symbol_and_type].price(current_time, window)
+
+    def stock_ticker_price(self, symbol_and_type: str) -> float:
+        """
+        :param symbol_and_type: The key of the stock in the exchange
+        :return: Stock.ticker_price of the stock, read under its lock without taking a snapshot of it.
+        :raise KeyError:
+        :raise AttributeError:
+        """
+        return self.__stocks[symbol_and_type].ticker_price
+
+    def stock_dividend_yield(self, symbol_and_type: str) -> float:
+        """
+        :param symbol_and_type: The key of the stock in the exchange
+        :return: Stock.dividend_yield of the stock, read under its lock without taking a snapshot of it.
+        :raise KeyError:
+        :raise AttributeError:
+        :raise ZeroDivisionError:
+        """
+        return self.__stocks[symbol_and_type].dividend_yield
+
+    def add_bar_resolution(self, resolution: timedelta):
+        """Starts keeping bars of the given resolution up to date for every stock in the exchange,
+        including the ones added later.
+        :param resolution: The length of time covered by each bar
+        :raise ValueError:
+        """
+        if resolution <= timedelta(0):
+            msg = "The resolution of the bars has to be positive."
+            raise ValueError(msg)
+        with self.__lock:
+            if resolution not in self.__bar_resolutions:
+                self.__bar_resolutions.append(resolution)
+            stocks = list(self.__stocks.values())
+        for stock in stocks:
+            stock.add_bar_resolution(resolution)
+
+    def add_window(self, window: timedelta):
+        """Starts keeping a running window of the given length for every stock in the exchange,
+        including the ones added later, and the all share index of that window.
+        :param window: The length of time of the window
+        :raise ValueError:
+        """
+        if window <= timedelta(0):
+            msg = "The length of a window has to be positive."
+            raise ValueError(msg)
+        with self.__lock:
+            if window not in self.__windows:
+                self.__windows.append(window)
+            stocks = list(self.__stocks.values())
+        for stock in stocks:
+            stock.add_window(window)
+        with self.__index_lock:
+            if window not in self.__indexes:
+                indexes = dict(self.__indexes)
+                indexes[window] = _IndexState(self.__stocks)
+                self.__indexes = indexes
 
-    def all_share_index(self, current_time: datetime=datetime.now()) -> float:
+    @property
+    def windows(self) -> (timedelta,):
+        """
+        :return: The lengths of the windows kept for every stock, besides Stock.price_time_interval
+        """
+        return tuple(self.__windows)
+
+    def track_statistics(self, window: timedelta=None, relative_accuracy: float=0.01):
+        """Starts keeping the statistics of the latest trades for every stock in the exchange,
+        including the ones added later, as Stock.track_statistics does.
+        :param window: The length of time of the window, or None for Stock.price_time_interval
+        :param relative_accuracy: The relative error of the quantiles of the prices and quantities
+        :raise ValueError:
+        """
+        with self.__lock:
+            stocks = list(self.__stocks.values())
+        for stock in stocks:
+            stock.track_statistics(window, relative_accuracy)
+        self.__tracked_statistics = (window, relative_accuracy)
+
+    def statistics(self, symbols_and_types: [str]=None) -> TradeStatistics:
+        """
+        :param symbols_and_types: The keys of the stocks to include, or None for all of them
+        :return: The statistics of the latest trades of the stocks, merged, None if none of them
+            tracks its statistics.
+        :raise KeyError:
+        :raise ValueError:
+        """
+        with self.__lock:
+            if symbols_and_types is None:
+                stocks = list(self.__stocks.values())
+            else:
+                stocks = [self.__stocks[symbol_and_type] for symbol_and_type in symbols_and_types]
+
+        merged = None
+        for stock in stocks:
+            statistics = stock.statistics()
+            if statistics is None:
+                continue
+            elif merged is None:
+                merged = statistics
+            else:
+                merged.merge(statistics)
+        return merged
+
+    def subscribe(self, measure: Measure, listener, symbol_and_type: str=None, coalesce: bool=False,
+                  min_interval: float=None, dispatcher=None) -> Subscription:
+        """Calls the listener whenever the measure changes, with the symbol_and_type() of the
+        stock (None for the index), the measure and its new value. The measures are evaluated at
+        the current time of the exchange: the latest timestamp of the recorded trades, or the
+        time given to advance_time() if it is later.
+        :param measure: The measure to listen to
+        :param listener: A callable of (symbol_and_type, measure, value)
+        :param symbol_and_type: The key of the stock, or None for Measure.ALL_SHARE_INDEX
+        :param coalesce: Whether changes made before the listener is called are merged into one
+            call with the latest value
+        :param min_interval: The least seconds between two calls of the listener, or None. The
+            changes made meanwhile are merged, and delivered when the exchange next records
+            trades or advances its time after the interval.
+        :param dispatcher: A callable that calls a function without arguments, now or later, such
+            as a ThreadDispatcher or the call_soon_threadsafe of an asyncio loop. None to call
+            the listener in the thread recording the trades.
+        :return: The subscription, whose value is the current one of the measure.
+        :raise ValueError:
+        :raise KeyError:
+        .. note:: Subscriptions are evaluated by the thread recording trades, after the trades of
+            each call are recorded. Trades recorded by a Stock directly are published with the
+            next trades recorded by the exchange, or by the next advance_time().
+        """
+        if (measure is Measure.ALL_SHARE_INDEX) != (symbol_and_type is None):
+            msg = "A stock must be given for {measure}, and only for it.".format(measure=measure)
+            raise ValueError(msg)
+        if symbol_and_type is not None:
+            self.__stocks[symbol_and_type]
+
+        subscription = Subscription(measure, symbol_and_type, listener, coalesce, min_interval,
+                                    dispatcher if dispatcher is not None else _call_now)
+        with self.__publish_lock:
+            if self.__clock is None:
+                with self.__lock:
+                    stocks = list(self.__stocks.values())
+                latest = [stock._trades.timestamp_at(-1) for stock in stocks if len(stock._trades) > 0]
+                self.__clock = max(latest) if len(latest) > 0 else None
+            subscription.value = self.__measure(measure, symbol_and_type)
+            self.__subscriptions.setdefault(symbol_and_type, []).append(subscription)
+            if measure is Measure.PRICE:
+                self.__push_expiry(symbol_and_type)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Stops calling the listener of the subscription, even for changes already queued."""
+        subscription.active = False
+        with self.__publish_lock:
+            subscriptions = self.__subscriptions.get(subscription.symbol_and_type, [])
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+                if len(subscriptions) == 0:
+                    del self.__subscriptions[subscription.symbol_and_type]
+            self.__held.discard(subscription)
+
+    def advance_time(self, current_time: datetime):
+        """Moves the current time of the exchange forward, calling the listeners of the measures
+        changed by the trades that aged out of the windows of the prices.
+        :param current_time: The new current time. An earlier one is ignored.
+        """
+        now = datetime_to_ns(current_time)
+        with self.__publish_lock:
+            advanced = self.__clock is None or now > self.__clock
+            if advanced:
+                self.__clock = now
+            self.__publish(index=advanced)
+
+    def __measure(self, measure: Measure, symbol_and_type: str):
+        """
+        :return: The value of the measure at self.__clock, None if it is not available.
+        """
+        if self.__clock is None:
+            return None
+        if measure is Measure.ALL_SHARE_INDEX:
+            return self.all_share_index(ns_to_datetime(self.__clock))
+
+        stock = self.__stocks[symbol_and_type]
+        if measure is Measure.PRICE:
+            return stock.price(ns_to_datetime(self.__clock))
+        try:
+            ticker_price = stock.ticker_price
+        except AttributeError:
+            return None
+        if measure is Measure.TICKER_PRICE:
+            return ticker_price
+        else:
+            return stock.dividend / ticker_price if ticker_price != 0 else None
+
+    def __push_expiry(self, symbol_and_type: str):
+        expiry = self.__stocks[symbol_and_type]._window_expiry()
+        if expiry is not None and self.__published_expiry_of.get(symbol_and_type) != expiry:
+            self.__published_expiry_of[symbol_and_type] = expiry
+            heapq.heappush(self.__published_expiries, (expiry, symbol_and_type))
+
+    def __publish(self, index: bool=False):
+        """Evaluates the subscriptions of the stocks changed since the previous call, and of the
+        index if any of them has, and releases the changes held back by min_interval.
+        :param index: Whether to evaluate the index even if no stock has changed
+        """
+        with self.__publish_lock:
+            self.__publish_changes(index)
+
+    def __publish_changes(self, index: bool):
+        unpublished = self.__unpublished
+        if len(unpublished) > 0 or index:
+            self.__unpublished = set()
+            for symbol_and_type in unpublished:
+                trades = self.__stocks[symbol_and_type]._trades
+                if len(trades) > 0 and (self.__clock is None or trades.timestamp_at(-1) > self.__clock):
+                    self.__clock = trades.timestamp_at(-1)
+
+            # The windows that expired before the clock, moved by advance_time() or by the trades.
+            expiries = self.__published_expiries
+            while self.__clock is not None and len(expiries) > 0 and expiries[0][0] < self.__clock:
+                expiry, symbol_and_type = heapq.heappop(expiries)
+                if self.__published_expiry_of.get(symbol_and_type) == expiry:
+                    del self.__published_expiry_of[symbol_and_type]
+                    unpublished.add(symbol_and_type)
+
+            now = time.monotonic()
+            for symbol_and_type in unpublished:
+                subscriptions = self.__subscriptions.get(symbol_and_type)
+                if subscriptions is not None:
+                    for subscription in list(subscriptions):
+                        if subscription._update(self.__measure(subscription.measure, symbol_and_type), now):
+                            self.__held.add(subscription)
+                    self.__push_expiry(symbol_and_type)
+
+            subscriptions = self.__subscriptions.get(None)
+            if subscriptions is not None:
+                value = self.__measure(Measure.ALL_SHARE_INDEX, None)
+                for subscription in list(subscriptions):
+                    if subscription._update(value, now):
+                        self.__held.add(subscription)
+
+        if len(self.__held) > 0:
+            now = time.monotonic()
+            self.__held = {subscription for subscription in self.__held if subscription._release(now)}
+
+    def all_share_index(self, current_time: datetime=datetime.now(), window: timedelta=None) -> float:
         """
         :param current_time: The point of time for which we want to obtain the index.
+        :param window: The length of one of the windows added by add_window(), or None for
+            Stock.price_time_interval
         :return: The geometric mean of all stock prices. Returns None if any of them is
             None.
+        :raise KeyError:
+        .. note:: The prices are combined in log space, so the index does not overflow for a large
+            number of stocks. Only the stocks that recorded trades, or whose window lost trades
+            since the previous call, are priced again.
         """
-        n = len(self.__stocks)
-        stock_prices = [stock.price(current_time) for stock in self.__stocks.values()]
+        return combine_index_terms([self.index_terms(current_time, window)])
 
-        if None in stock_prices:
-            return None
+    def index_terms(self, current_time: datetime=datetime.now(), window: timedelta=None) -> (float, int, int, int):
+        """
+        :param current_time: The point of time for which we want to obtain the terms.
+        :param window: The length of one of the windows added by add_window(), or None for
+            Stock.price_time_interval
+        :return: The sum of the logarithms of the positive stock prices, the number of stocks, the
+            number of missing prices and the number of zero prices. combine_index_terms gives the
+            index of the stocks of several exchanges from their terms.
+        :raise KeyError:
+        """
+        with self.__index_lock:
+            index = self.__indexes[window]
+            n = self.__update_prices(current_time, window, index)
+            return index.log_sum, n, index.missing, index.zeros
+
+    def __update_prices(self, current_time: datetime, window: timedelta, index: _IndexState) -> int:
+        """Prices again the stocks whose price in the window may have changed since the previous call.
+        :param current_time: The point of time for which the prices are needed.
+        :param window: The length of the window, or None for Stock.price_time_interval
+        :param index: The state of the index of the window
+        :return: The number of stocks priced so far.
+        """
+        now = datetime_to_ns(current_time)
+        interval = window if window is not None else Stock.price_time_interval
+
+        reset = index.time is None or now < index.time or interval != index.interval
+        with self.__lock:
+            if reset:
+                index.changed.update(self.__stocks)
+            changed = set(index.changed)
+            n = len(self.__stocks)
+
+        if reset:
+            index.expiries = []
+            index.expiry_of = {}
         else:
-            product = reduce(operator.mul, stock_prices, 1)
-            return product**(1/n)
+            expiries = index.expiries
+            while len(expiries) > 0 and expiries[0][0] < now:
+                expiry, symbol_and_type = heapq.heappop(expiries)
+                if index.expiry_of.get(symbol_and_type) == expiry:
+                    del index.expiry_of[symbol_and_type]
+                    changed.add(symbol_and_type)
+
+        for symbol_and_type in changed:
+            # A trade recorded after this is priced by the next call, one recorded before it by
+            # this one, as the stock is priced once its lock is free.
+            index.changed.discard(symbol_and_type)
+            stock = self.__stocks[symbol_and_type]
+            with stock._lock:
+                price = stock.price(current_time, window)
+                expiry = stock._window_expiry(window)
+            index.set_price(symbol_and_type, price)
+            if expiry is not None and index.expiry_of.get(symbol_and_type) != expiry:
+                index.expiry_of[symbol_and_type] = expiry
+                heapq.heappush(index.expiries, (expiry, symbol_and_type))
+
+        index.time = now
+        index.interval = interval
+        return n
+
+
+def combine_index_terms(terms) -> float:
+    """
+    :param terms: The terms returned by GlobalBeverageCorporationExchange.index_terms for exchanges
+        that do not share any stock
+    :return: The geometric mean of the prices of all their stocks, None if any of them is None.
+    """
+    log_sum = 0.0
+    n = 0
+    missing = 0
+    zeros = 0
+    for term_log_sum, term_n, term_missing, term_zeros in terms:
+        log_sum += term_log_sum
+        n += term_n
+        missing += term_missing
+        zeros += term_zeros
+
+    if missing > 0:
+        return None
+    elif zeros > 0:
+        return 0.0
+    else:
+        return math.exp(log_sum / n)
 
 
 def my_insort_left(a, x, lo=0, hi=None, keyfunc=lambda v: v):
     """
     A slight modification to bisect.insort_left(), so it can get keys.
     https://stackoverflow.com/questions/27672494/how-to-use-bisect-insort-left-with-a-key
+    :return: The index at which x has been inserted.
     """
     x_key = keyfunc(x)
 
@@ -250,6 +2619,7 @@ def my_insort_left(a, x, lo=0, hi=None, keyfunc=lambda v: v):
         if keyfunc(a[mid]) < x_key: lo = mid+1
         else: hi = mid
     a.insert(lo, x)
+    return lo
 
 
 def my_bisect_left(a, x, lo=0, hi=None, keyfunc=lambda v: v):
@@ -269,6 +2639,37 @@ def my_bisect_left(a, x, lo=0, hi=None, keyfunc=lambda v: v):
     return lo
 
 
+_EPOCH = datetime(1970, 1, 1)
+
+
+def datetime_to_ns(value: datetime) -> int:
+    """
+    :param value: The moment to convert. Naive values are taken as they are, aware ones are
+        converted to UTC first.
+    :return: The nanoseconds elapsed since the epoch.
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    delta = value - _EPOCH
+    return ((delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds) * 1000
+
+
+def timedelta_to_ns(value: timedelta) -> int:
+    """
+    :param value: The duration to convert.
+    :return: The duration in nanoseconds.
+    """
+    return ((value.days * 86400 + value.seconds) * 1000000 + value.microseconds) * 1000
+
+
+def ns_to_datetime(value: int) -> datetime:
+    """
+    :param value: The nanoseconds elapsed since the epoch.
+    :return: The naive moment, as the inverse of datetime_to_ns.
+    """
+    return _EPOCH + timedelta(microseconds=value // 1000)
+
+
 def datetime_extract(value):
     if type(value) is Trade:
         return value.timestamp
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+from super_simple_stocks import Stock, StockType, Trade, BuySellIndicator, GlobalBeverageCorporationExchange
+
+
+class ExchangeFixture:
+    """
+    The stocks and trades shared by the tests of the modules built on the exchange. A test case
+    mixes it in before unittest.TestCase, and overrides the class attributes it needs to, such as
+    the (symbol, stock_type) of the stocks it trades.
+    """
+    stocks = [("AMZN", StockType.COMMON), ("JPM", StockType.PREFERRED)]
+    par_value = 25
+    last_dividend = 1.0
+    fixed_dividend = 0.02
+    timestamp_start = datetime(2018, 5, 4, 12, 30)
+    step = timedelta(minutes=1)
+
+    def make_stocks(self, **options) -> {str: Stock}:
+        """
+        :param options: Further keyword arguments of Stock, such as columnar
+        :return: A new stock for each of self.stocks, by its symbol_and_type(). Only the PREFERRED
+            ones have a fixed dividend.
+        """
+        stocks = [Stock(symbol, stock_type, self.par_value, self.last_dividend,
+                        self.fixed_dividend if stock_type is StockType.PREFERRED else None, **options)
+                  for symbol, stock_type in self.stocks]
+        return {stock.symbol_and_type(): stock for stock in stocks}
+
+    def make_exchange(self, journal=None, **options) -> GlobalBeverageCorporationExchange:
+        """
+        :param journal: The journal of the exchange
+        :param options: Further keyword arguments of Stock, such as columnar
+        :return: A new exchange of the stocks of make_stocks.
+        """
+        return GlobalBeverageCorporationExchange(self.make_stocks(**options), journal=journal)
+
+    def assert_same_trades(self, first, second):
+        """Asserts that two iterables of trades hold trades with the same fields, in the same order."""
+        first, second = list(first), list(second)
+        self.assertEqual(len(first), len(second))
+        for i, (trade, other) in enumerate(zip(first, second)):
+            self.assertTrue(trade.equals(other), "The trades at {i} differ.".format(i=i))
+
+    def make_trades(self, start: int, stop: int, late: bool=False) -> [Trade]:
+        """
+        :param start: The number of the first trade
+        :param stop: The number after the last trade
+        :param late: Whether the timestamps jump back and forth, up to 60 steps, so many trades are late
+        :return: The trades from start to stop, for each of self.stocks in turn, self.step apart.
+        """
+        trades = []
+        for i in range(start, stop):
+            symbol, stock_type = self.stocks[i % len(self.stocks)]
+            steps = i % 7 * 10 + i if late else i
+            trades.append(Trade(symbol, stock_type, self.timestamp_start + self.step * steps, i % 13 + 1,
+                                100.0 + i % 17, BuySellIndicator.BUY if i % 2 else BuySellIndicator.SELL))
+        return trades
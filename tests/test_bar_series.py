@@ -0,0 +1,140 @@
+import random
+import unittest
+
+from datetime import datetime, timedelta
+from super_simple_stocks import BarSeries, Stock, StockType, Trade, BuySellIndicator, GlobalBeverageCorporationExchange
+from super_simple_stocks import datetime_to_ns
+
+
+class TestBarSeries(unittest.TestCase):
+    symbol = "AMZN"
+    par_value = 25
+    last_dividend = 1.0
+    fixed_dividend = None
+    minute = timedelta(minutes=1)
+    timestamp_start = datetime(2018, 5, 4, 12, 30)
+
+    def add(self, bars, seconds, price, quantity):
+        bars.add(datetime_to_ns(self.timestamp_start + timedelta(seconds=seconds)), price, quantity)
+
+    def test_wrong_resolution(self):
+        with self.assertRaises(ValueError):
+            BarSeries(timedelta(0))
+        with self.assertRaises(ValueError):
+            GlobalBeverageCorporationExchange(dict()).add_bar_resolution(timedelta(0))
+
+    def test_add(self):
+        bars = BarSeries(self.minute)
+
+        self.add(bars, 10, 100.0, 10)
+        self.add(bars, 50, 120.0, 30)
+        self.add(bars, 70, 90.0, 10)
+        self.add(bars, 5, 110.0, 10)
+        self.add(bars, 200, 95.0, 10)
+        self.add(bars, 30, 80.0, 50)
+
+        self.assertEqual(len(bars), 3)
+        self.assertEqual(list(bars.starts), [datetime_to_ns(self.timestamp_start + self.minute * i) for i in (0, 1, 3)])
+        self.assertEqual(list(bars.opens), [110.0, 90.0, 95.0])
+        self.assertEqual(list(bars.highs), [120.0, 90.0, 95.0])
+        self.assertEqual(list(bars.lows), [80.0, 90.0, 95.0])
+        self.assertEqual(list(bars.closes), [120.0, 90.0, 95.0])
+        self.assertEqual(list(bars.volumes), [100, 10, 10])
+        self.assertEqual(list(bars.counts), [4, 1, 1])
+
+    def test_late_bar(self):
+        bars = BarSeries(self.minute)
+
+        self.add(bars, 130, 100.0, 10)
+        self.add(bars, 10, 90.0, 10)
+
+        self.assertEqual(list(bars.opens), [90.0, 100.0])
+        self.assertEqual(list(bars.counts), [1, 1])
+
+    def test_chunks_and_copy(self):
+        bars = BarSeries(self.minute)
+        bars.chunk_size = 4
+        seconds = list(range(0, 3000, 20))
+        random.Random(5).shuffle(seconds)
+        for second in seconds[:100]:
+            self.add(bars, second, 100.0 + second, 10)
+        copied = bars.copy()
+        for second in seconds[100:]:
+            self.add(bars, second, 100.0 + second, 10)
+
+        self.assertEqual(len(bars), 50)
+        self.assertEqual(list(bars.starts), [datetime_to_ns(self.timestamp_start + self.minute * i) for i in range(50)])
+        self.assertEqual(list(bars.opens), [100.0 + 60 * i for i in range(50)])
+        self.assertEqual(list(bars.closes), [140.0 + 60 * i for i in range(50)])
+        self.assertEqual(list(bars.counts), [3] * 50)
+        self.assertEqual(sum(copied.counts), 100)
+        self.assertEqual(list(bars.bars(self.timestamp_start + self.minute * 10,
+                                        self.timestamp_start + self.minute * 13)['vwaps']), [720.0, 780.0, 840.0])
+
+        copied = bars.copy()
+        self.add(bars, 3000, 1.0, 1)
+        self.assertIs(copied._chunks[0], bars._chunks[0])
+        self.assertEqual(len(copied), 50)
+        self.assertEqual(len(bars), 51)
+
+    def test_bars(self):
+        bars = BarSeries(self.minute)
+        for seconds in range(0, 600, 20):
+            self.add(bars, seconds, 100.0 + seconds, 10)
+
+        result = bars.bars(self.timestamp_start + self.minute * 2, self.timestamp_start + self.minute * 4)
+
+        self.assertEqual(list(result['opens']), [220.0, 280.0])
+        self.assertEqual(list(result['closes']), [260.0, 320.0])
+        self.assertEqual(list(result['vwaps']), [240.0, 300.0])
+
+    def test_stock_bars(self):
+        stock = Stock(self.symbol, StockType.COMMON, self.par_value, self.last_dividend, self.fixed_dividend,
+                      bar_resolutions=[self.minute])
+        stock.record_trade(Trade(self.symbol, StockType.COMMON, self.timestamp_start,
+                                 10, 100.0, BuySellIndicator.BUY))
+        stock.record_trades([Trade(self.symbol, StockType.COMMON, self.timestamp_start + timedelta(seconds=90),
+                                   30, 200.0, BuySellIndicator.BUY),
+                             Trade(self.symbol, StockType.COMMON, self.timestamp_start + timedelta(seconds=30),
+                                   10, 120.0, BuySellIndicator.SELL)])
+        stock.add_bar_resolution(self.minute * 5)
+
+        result = stock.bars(self.minute, self.timestamp_start, self.timestamp_start + self.minute * 5)
+        result_5 = stock.bars(self.minute * 5, self.timestamp_start, self.timestamp_start + self.minute * 5)
+
+        self.assertEqual(list(result['closes']), [120.0, 200.0])
+        self.assertEqual(list(result['volumes']), [20, 30])
+        self.assertEqual(list(result_5['counts']), [3])
+        self.assertEqual(list(result_5['vwaps']), [(1000 + 1200 + 6000) / 50])
+
+    def test_refused_trades_are_not_in_bars(self):
+        stock = Stock(self.symbol, StockType.COMMON, self.par_value, self.last_dividend, self.fixed_dividend,
+                      bar_resolutions=[self.minute])
+        stock.record_trade(Trade(self.symbol, StockType.COMMON, self.timestamp_start,
+                                 10, 100.0, BuySellIndicator.BUY))
+        timestamp = datetime_to_ns(self.timestamp_start)
+        with self.assertRaises(TypeError):
+            stock.load_columns([timestamp, timestamp], [110.0, 120.0], [10, 2.5], [1, 1])
+
+        result = stock.bars(self.minute, self.timestamp_start, self.timestamp_start + self.minute)
+        self.assertEqual(list(result['counts']), [1])
+        self.assertEqual(len(stock.trades), 1)
+
+    def test_exchange_bars(self):
+        exchange = GlobalBeverageCorporationExchange(dict())
+        exchange.add_bar_resolution(self.minute)
+        stock = Stock(self.symbol, StockType.COMMON, self.par_value, self.last_dividend, self.fixed_dividend)
+        exchange.add_stock(stock)
+
+        exchange.record_trade(Trade(self.symbol, StockType.COMMON, self.timestamp_start,
+                                    10, 100.0, BuySellIndicator.BUY))
+        snapshot = exchange.get_stock(stock.symbol_and_type())
+        exchange.record_trade(Trade(self.symbol, StockType.COMMON, self.timestamp_start,
+                                    30, 200.0, BuySellIndicator.BUY))
+
+        result = exchange.bars(stock.symbol_and_type(), self.minute, self.timestamp_start,
+                               self.timestamp_start + self.minute)
+        snapshot_result = snapshot.bars(self.minute, self.timestamp_start, self.timestamp_start + self.minute)
+
+        self.assertEqual(list(result['counts']), [2])
+        self.assertEqual(list(snapshot_result['counts']), [1])
@@ -0,0 +1,72 @@
+import asyncio
+import unittest
+
+from unittest import mock
+
+from datetime import timedelta
+from super_simple_stocks import StockType, Trade, BuySellIndicator
+from exchange_server import ExchangeServer, ExchangeClient
+from exchange_fixture import ExchangeFixture
+
+
+class TestExchangeServer(ExchangeFixture, unittest.TestCase):
+    def run_with_server(self, exchange, session, batch_size=10000):
+        async def main():
+            server = ExchangeServer(exchange, queue_size=2, batch_size=batch_size)
+            host, port = (await server.start('127.0.0.1', 0)).sockets[0].getsockname()[:2]
+            client = await ExchangeClient.connect(host, port)
+            try:
+                await session(client)
+            finally:
+                await client.close()
+                await server.close()
+        asyncio.run(main())
+
+    def test_record_and_query(self):
+        exchange = self.make_exchange()
+        expected = self.make_exchange()
+        trades = self.make_trades(0, 30)
+        expected.record_trades(trades)
+        current_time = self.timestamp_start + timedelta(minutes=31)
+
+        async def session(client):
+            self.assertIsNone(await client.all_share_index(current_time))
+            results = await asyncio.gather(*[client.record_trades(trades[i:i + 4]) for i in range(0, 30, 4)])
+            self.assertEqual(results, [0] * 8)
+
+            self.assertAlmostEqual(await client.price("AMZN_COMMON", current_time),
+                                   expected.get_stock("AMZN_COMMON").price(current_time))
+            self.assertEqual(await client.ticker_price("JPM_PREFERRED"),
+                             expected.get_stock("JPM_PREFERRED").ticker_price)
+            self.assertAlmostEqual(await client.dividend_yield("JPM_PREFERRED"),
+                                   expected.get_stock("JPM_PREFERRED").dividend_yield)
+            self.assertAlmostEqual(await client.all_share_index(current_time), expected.all_share_index(current_time))
+            self.assertIsNone(await client.price("AMZN_COMMON", current_time + timedelta(hours=1)))
+
+        self.run_with_server(exchange, session, batch_size=5)
+        self.assert_same_trades(exchange.get_stock("AMZN_COMMON").trades, expected.get_stock("AMZN_COMMON").trades)
+
+    def test_errors(self):
+        unknown = Trade("BEER", StockType.COMMON, self.timestamp_start, 1, 1.0, BuySellIndicator.BUY)
+
+        async def session(client):
+            # The ticker price of a stock without trades is not available.
+            with self.assertRaises(ValueError):
+                await client.ticker_price("JPM_PREFERRED")
+            self.assertEqual(await client.record_trades(self.make_trades(0, 3) + [unknown]), 1)
+            with self.assertRaises(ValueError):
+                await client.price("BEER_COMMON")
+            self.assertEqual(await client.ticker_price("JPM_PREFERRED"), 101.0)
+
+        self.run_with_server(self.make_exchange(), session)
+
+    def test_failed_batch(self):
+        exchange = self.make_exchange()
+        exchange.record_trades = mock.Mock(side_effect=OSError("The journal is full."))
+
+        async def session(client):
+            with self.assertRaises(ValueError):
+                await client.record_trades(self.make_trades(0, 3))
+            self.assertIsNone(await client.price("AMZN_COMMON", self.timestamp_start))
+
+        self.run_with_server(exchange, session)
@@ -1,7 +1,13 @@
+import math
+import random
+import sys
+import threading
+import time
 import unittest
 
-from datetime import datetime
-from super_simple_stocks import Stock, StockType, GlobalBeverageCorporationExchange, BuySellIndicator, Trade
+from datetime import datetime, timedelta
+from super_simple_stocks import Stock, StockType, GlobalBeverageCorporationExchange, BuySellIndicator, Trade, Measure, \
+    ThreadDispatcher
 
 
 class TestGlobalBeverageCorporationExchange(unittest.TestCase):
@@ -80,3 +86,325 @@ class TestGlobalBeverageCorporationExchange(unittest.TestCase):
         exchange.record_trade(trade_3)
 
         self.assertEqual(int(exchange.all_share_index()), 64)
+
+    def test_record_trades(self):
+        exchange = GlobalBeverageCorporationExchange(dict())
+        stock_1 = Stock(self.symbol_1, StockType.COMMON, self.par_value_1, self.last_dividend_1, self.fixed_dividend_0)
+        stock_2 = Stock(self.symbol_1, StockType.PREFERRED, self.par_value_1, self.last_dividend_0, self.fixed_dividend_1)
+
+        exchange.add_stock(stock_1)
+        exchange.add_stock(stock_2)
+
+        trade_1 = Trade(self.symbol_1, StockType.COMMON, self.timestamp_now,
+                        self.quantity_1, self.price_per_share_1, BuySellIndicator.SELL)
+        trade_2 = Trade(self.symbol_1, StockType.PREFERRED, self.timestamp_now,
+                        self.quantity_2, self.price_per_share_2, BuySellIndicator.SELL)
+        trade_3 = Trade(self.symbol_2, StockType.COMMON, self.timestamp_now,
+                        self.quantity_2, self.price_per_share_2, BuySellIndicator.SELL)
+        trade_4 = Trade(self.symbol_1, StockType.COMMON, self.timestamp_now,
+                        self.quantity_2, self.price_per_share_2, BuySellIndicator.BUY)
+
+        rejected = exchange.record_trades([trade_1, trade_2, trade_3, None, trade_4])
+
+        self.assertEqual([trade for trade, error in rejected], [None, trade_3])
+        self.assertIsInstance(rejected[0][1], TypeError)
+        self.assertIsInstance(rejected[1][1], ValueError)
+
+        stocks = exchange.get_all_stocks()
+
+        self.assertEqual(len(stocks[stock_1.symbol_and_type()].trades), 2)
+        self.assertEqual(len(stocks[stock_2.symbol_and_type()].trades), 1)
+
+    def test_record_trade_unknown_stock(self):
+        exchange = GlobalBeverageCorporationExchange(dict())
+        trade = Trade(self.symbol_2, StockType.COMMON, self.timestamp_now,
+                      self.quantity_1, self.price_per_share_1, BuySellIndicator.SELL)
+
+        with self.assertRaises(ValueError):
+            exchange.record_trade(trade)
+
+    def test_all_share_index_many_stocks(self):
+        stocks = {}
+        for i in range(500):
+            stock = Stock("S%d" % i, StockType.COMMON, self.par_value_1, self.last_dividend_1, self.fixed_dividend_0)
+            stock.record_trade(Trade(stock.symbol, StockType.COMMON, self.timestamp_now,
+                                     self.quantity_1, 1e10, BuySellIndicator.SELL))
+            stocks[stock.symbol_and_type()] = stock
+        exchange = GlobalBeverageCorporationExchange(stocks)
+
+        self.assertAlmostEqual(exchange.all_share_index(self.timestamp_now) / 1e10, 1.0)
+
+    def test_all_share_index_updates(self):
+        exchange = GlobalBeverageCorporationExchange(dict())
+        stock_1 = Stock(self.symbol_1, StockType.COMMON, self.par_value_1, self.last_dividend_1, self.fixed_dividend_0)
+        stock_2 = Stock(self.symbol_2, StockType.COMMON, self.par_value_1, self.last_dividend_1, self.fixed_dividend_0)
+
+        exchange.add_stock(stock_1)
+        exchange.add_stock(stock_2)
+
+        stock_1.record_trade(Trade(self.symbol_1, StockType.COMMON, self.timestamp_now - timedelta(minutes=10),
+                                   self.quantity_1, 25, BuySellIndicator.SELL))
+        self.assertEqual(exchange.all_share_index(self.timestamp_now), None)
+
+        stock_2.record_trade(Trade(self.symbol_2, StockType.COMMON, self.timestamp_now,
+                                   self.quantity_1, 100, BuySellIndicator.SELL))
+        self.assertAlmostEqual(exchange.all_share_index(self.timestamp_now), 50)
+
+        exchange.record_trade(Trade(self.symbol_1, StockType.COMMON, self.timestamp_now,
+                                    self.quantity_1, 225, BuySellIndicator.SELL))
+        self.assertAlmostEqual(exchange.all_share_index(self.timestamp_now + timedelta(minutes=10)), 150)
+
+        self.assertAlmostEqual(exchange.all_share_index(self.timestamp_now), 125 ** 0.5 * 10)
+        self.assertEqual(exchange.all_share_index(self.timestamp_now + timedelta(minutes=20)), None)
+
+    def test_get_stock_snapshot(self):
+        exchange = GlobalBeverageCorporationExchange(dict())
+        stock = Stock(self.symbol_1, StockType.COMMON, self.par_value_1, self.last_dividend_1, self.fixed_dividend_0)
+        exchange.add_stock(stock)
+        exchange.record_trade(Trade(self.symbol_1, StockType.COMMON, self.timestamp_now,
+                                    self.quantity_1, self.price_per_share_1, BuySellIndicator.SELL))
+
+        snapshot = exchange.get_stock(stock.symbol_and_type())
+        exchange.record_trade(Trade(self.symbol_1, StockType.COMMON, self.timestamp_now,
+                                    self.quantity_1, self.price_per_share_2, BuySellIndicator.SELL))
+
+        self.assertIsNot(snapshot, stock)
+        self.assertEqual(len(snapshot.trades), 1)
+        self.assertEqual(snapshot.price(self.timestamp_now), self.price_per_share_1)
+
+        snapshot.record_trade(Trade(self.symbol_1, StockType.COMMON, self.timestamp_now,
+                                    self.quantity_2, self.price_per_share_1, BuySellIndicator.SELL))
+
+        self.assertEqual(len(stock.trades), 2)
+        self.assertEqual(stock.price(self.timestamp_now), 175)
+        self.assertAlmostEqual(exchange.all_share_index(self.timestamp_now), 175)
+
+    def test_concurrent_readers(self):
+        stocks = [Stock("S%d" % i, StockType.COMMON, self.par_value_1, self.last_dividend_1, self.fixed_dividend_0,
+                        bar_resolutions=[timedelta(minutes=1)]) for i in range(4)]
+        exchange = GlobalBeverageCorporationExchange({stock.symbol_and_type(): stock for stock in stocks})
+        rng = random.Random(1)
+        trades = [Trade("S%d" % (i % 4), StockType.COMMON, self.timestamp_now + timedelta(seconds=i - rng.randint(0, 30)),
+                        rng.randint(1, 100), float(rng.randint(1, 100)), BuySellIndicator.BUY) for i in range(4000)]
+        done = threading.Event()
+        errors = []
+
+        def write():
+            try:
+                for i in range(0, len(trades), 10):
+                    exchange.record_trade(trades[i])
+                    exchange.record_trades(trades[i + 1:i + 10])
+            finally:
+                done.set()
+
+        def read():
+            lengths = {}
+            try:
+                while not done.is_set():
+                    for symbol_and_type, stock in exchange.get_all_stocks().items():
+                        history = list(stock.trades)
+                        self.assertGreaterEqual(len(history), lengths.get(symbol_and_type, 0))
+                        lengths[symbol_and_type] = len(history)
+                        self.assertEqual(history, sorted(history, key=lambda trade: trade.timestamp))
+                        self.assertEqual(sum(stock.bars(timedelta(minutes=1), self.timestamp_now - timedelta(hours=1),
+                                                        self.timestamp_now + timedelta(hours=2))['counts']), len(history))
+                        current_time = self.timestamp_now + timedelta(seconds=len(history))
+                        window = [trade for trade in history
+                                  if trade.timestamp >= current_time - Stock.price_time_interval]
+                        if len(window) > 0:
+                            self.assertAlmostEqual(stock.price(current_time),
+                                                   sum(trade.total_price for trade in window) /
+                                                   sum(trade.quantity for trade in window))
+                    exchange.all_share_index(self.timestamp_now + timedelta(minutes=rng.randint(0, 60)))
+            except Exception as error:
+                errors.append(error)
+
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-5)
+        try:
+            threads = [threading.Thread(target=write)] + [threading.Thread(target=read) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sum(len(stock.trades) for stock in exchange.get_all_stocks().values()), len(trades))
+
+    def make_exchange(self):
+        stock_1 = Stock(self.symbol_1, StockType.COMMON, self.par_value_1, self.last_dividend_1, self.fixed_dividend_0)
+        stock_2 = Stock(self.symbol_2, StockType.COMMON, self.par_value_1, self.last_dividend_1, self.fixed_dividend_0)
+        return GlobalBeverageCorporationExchange({stock_1.symbol_and_type(): stock_1,
+                                                  stock_2.symbol_and_type(): stock_2})
+
+    def trade(self, symbol, minutes, price, quantity=None):
+        return Trade(symbol, StockType.COMMON, self.timestamp_now + timedelta(minutes=minutes),
+                     quantity or self.quantity_1, price, BuySellIndicator.BUY)
+
+    def test_subscriptions(self):
+        exchange = self.make_exchange()
+        key = "AMZN_COMMON"
+        calls = []
+        listener = lambda symbol_and_type, measure, value: calls.append(
+            (symbol_and_type, measure, value if value is None else round(value, 9)))
+        for measure in (Measure.PRICE, Measure.TICKER_PRICE, Measure.DIVIDEND_YIELD):
+            self.assertIsNone(exchange.subscribe(measure, listener, key).value)
+        exchange.subscribe(Measure.ALL_SHARE_INDEX, listener)
+
+        exchange.record_trade(self.trade(self.symbol_1, 0, 100))
+        self.assertEqual(calls, [(key, Measure.PRICE, 100.0), (key, Measure.TICKER_PRICE, 100.0),
+                                 (key, Measure.DIVIDEND_YIELD, 0.01)])
+
+        # Neither the price, nor the ticker price, nor the index changes.
+        del calls[:]
+        exchange.record_trade(self.trade(self.symbol_1, 1, 100))
+        exchange.record_trade(self.trade(self.symbol_2, 1, 400))
+        self.assertEqual(calls, [(None, Measure.ALL_SHARE_INDEX, 200.0)])
+
+        # A late trade changes the price, but not the ticker price.
+        del calls[:]
+        exchange.record_trades([self.trade(self.symbol_1, -1, 200, 200)])
+        self.assertEqual(calls, [(key, Measure.PRICE, 150.0), (None, Measure.ALL_SHARE_INDEX, round(150 ** 0.5 * 20, 9))])
+
+        # The trades age out of the window of the price.
+        del calls[:]
+        exchange.advance_time(self.timestamp_now + timedelta(minutes=15))
+        self.assertEqual(calls, [(key, Measure.PRICE, 100.0), (None, Measure.ALL_SHARE_INDEX, 200.0)])
+        del calls[:]
+        exchange.advance_time(self.timestamp_now + timedelta(minutes=17))
+        self.assertEqual(calls, [(key, Measure.PRICE, None), (None, Measure.ALL_SHARE_INDEX, None)])
+
+        with self.assertRaises(ValueError):
+            exchange.subscribe(Measure.PRICE, listener)
+        with self.assertRaises(KeyError):
+            exchange.subscribe(Measure.PRICE, listener, "BEER_COMMON")
+
+    def test_subscription_expiry_on_trade(self):
+        exchange = self.make_exchange()
+        calls = []
+        listener = lambda symbol_and_type, measure, value: calls.append((symbol_and_type, measure, value))
+        exchange.subscribe(Measure.PRICE, listener, "AMZN_COMMON")
+        exchange.subscribe(Measure.ALL_SHARE_INDEX, listener)
+        exchange.record_trades([self.trade(self.symbol_1, 0, 100), self.trade(self.symbol_2, 0, 400)])
+
+        # Only JPM trades, but the window of AMZN expires as the clock moves forward.
+        del calls[:]
+        exchange.record_trade(self.trade(self.symbol_2, 30, 400))
+        self.assertIn(("AMZN_COMMON", Measure.PRICE, None), calls)
+        self.assertIn((None, Measure.ALL_SHARE_INDEX, None), calls)
+
+    def test_subscription_delivery(self):
+        exchange = self.make_exchange()
+        queued = []
+        calls = []
+        listener = lambda symbol_and_type, measure, value: calls.append(value)
+        coalesced = exchange.subscribe(Measure.TICKER_PRICE, listener, "AMZN_COMMON", coalesce=True,
+                                       dispatcher=queued.append)
+        exchange.subscribe(Measure.TICKER_PRICE, listener, "JPM_COMMON", min_interval=0.05)
+
+        for minutes in range(5):
+            exchange.record_trade(self.trade(self.symbol_1, minutes, 100 + minutes))
+            exchange.record_trade(self.trade(self.symbol_2, minutes, 200 + minutes))
+        self.assertEqual(len(queued), 1)
+        self.assertEqual(calls, [200.0])
+
+        queued.pop()()
+        self.assertEqual(calls, [200.0, 104.0])
+        time.sleep(0.06)
+        exchange.advance_time(self.timestamp_now)
+        self.assertEqual(calls, [200.0, 104.0, 204.0])
+
+        exchange.unsubscribe(coalesced)
+        exchange.record_trade(self.trade(self.symbol_1, 10, 1))
+        self.assertEqual(queued, [])
+
+        dispatcher = ThreadDispatcher()
+        threads = []
+        exchange.subscribe(Measure.PRICE, lambda *args: threads.append(threading.current_thread()), "AMZN_COMMON",
+                           dispatcher=dispatcher)
+        exchange.record_trade(self.trade(self.symbol_1, 11, 2))
+        dispatcher.stop()
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+
+    def test_analytics(self):
+        stocks = [Stock(self.symbol_1, StockType.COMMON, self.par_value_1, self.last_dividend_1, self.fixed_dividend_0),
+                  Stock(self.symbol_1, StockType.PREFERRED, self.par_value_1, self.last_dividend_0, self.fixed_dividend_1),
+                  Stock(self.symbol_2, StockType.COMMON, self.par_value_1, self.last_dividend_0, self.fixed_dividend_0),
+                  Stock(self.symbol_2, StockType.PREFERRED, self.par_value_1, self.last_dividend_0, self.fixed_dividend_1)]
+        exchange = GlobalBeverageCorporationExchange({stock.symbol_and_type(): stock for stock in stocks})
+        exchange.record_trades([
+            Trade(self.symbol_1, StockType.COMMON, self.timestamp_now - timedelta(minutes=20), self.quantity_1, 90,
+                  BuySellIndicator.BUY),
+            Trade(self.symbol_1, StockType.COMMON, self.timestamp_now, self.quantity_2, 110, BuySellIndicator.SELL),
+            Trade(self.symbol_1, StockType.PREFERRED, self.timestamp_now - timedelta(minutes=20), self.quantity_1, 0,
+                  BuySellIndicator.BUY),
+            Trade(self.symbol_2, StockType.COMMON, self.timestamp_now, self.quantity_1, 120, BuySellIndicator.BUY)])
+
+        table = exchange.analytics(self.timestamp_now)
+        self.assertEqual(table['symbol_and_type'], [stock.symbol_and_type() for stock in stocks])
+        self.assertEqual(table['symbol'], [stock.symbol for stock in stocks])
+        self.assertEqual(table['stock_type'], [stock.stock_type for stock in stocks])
+        self.assertEqual(table['ticker_price'], [110.0, 0.0, 120.0, None])
+        self.assertEqual(table['price'], [110.0, None, 120.0, None])
+        self.assertEqual(table['dividend'], [stock.dividend for stock in stocks])
+        self.assertEqual(table['dividend_yield'], [stocks[0].dividend_yield, None, 0.0, None])
+        self.assertEqual(table['price_earnings_ratio'], [stocks[0].price_earnings_ratio, 0.0, None, None])
+        self.assertEqual(table['price_earnings_ratio'][1], stocks[1].price_earnings_ratio)
+        self.assertEqual(table['price_earnings_ratio'][2], stocks[2].price_earnings_ratio)
+
+        self.assertEqual(exchange.analytics(self.timestamp_now + timedelta(hours=1))['price'], [None] * 4)
+
+    def test_windows(self):
+        one_minute, one_hour = timedelta(minutes=1), timedelta(hours=1)
+        exchange = self.make_exchange()
+        exchange.record_trades([self.trade(self.symbol_1, -30, 100), self.trade(self.symbol_2, -30, 400),
+                                self.trade(self.symbol_2, 0, 900)])
+        exchange.add_window(one_hour)
+        exchange.add_window(one_minute)
+        self.assertEqual(exchange.windows, (one_hour, one_minute))
+
+        self.assertAlmostEqual(exchange.all_share_index(self.timestamp_now, one_hour), (100 * 650) ** 0.5)
+        self.assertIsNone(exchange.all_share_index(self.timestamp_now, one_minute))
+        self.assertIsNone(exchange.all_share_index(self.timestamp_now))
+
+        exchange.record_trade(self.trade(self.symbol_1, 0, 400))
+        self.assertAlmostEqual(exchange.all_share_index(self.timestamp_now, one_minute), 600.0)
+        self.assertAlmostEqual(exchange.all_share_index(self.timestamp_now), 600.0)
+        self.assertAlmostEqual(exchange.all_share_index(self.timestamp_now, one_hour), (250 * 650) ** 0.5)
+        self.assertIsNone(exchange.all_share_index(self.timestamp_now + timedelta(minutes=2), one_minute))
+        self.assertAlmostEqual(exchange.all_share_index(self.timestamp_now + timedelta(minutes=2), one_hour),
+                               (250 * 650) ** 0.5)
+
+        stock = Stock("TEA", StockType.COMMON, self.par_value_1, self.last_dividend_1, self.fixed_dividend_0)
+        exchange.add_stock(stock)
+        self.assertEqual(stock.windows, (one_hour, one_minute))
+        self.assertIsNone(exchange.all_share_index(self.timestamp_now, one_hour))
+
+        with self.assertRaises(KeyError):
+            exchange.all_share_index(self.timestamp_now, timedelta(minutes=2))
+
+    def test_statistics(self):
+        exchange = self.make_exchange()
+        self.assertIsNone(exchange.statistics())
+        exchange.record_trades([self.trade(self.symbol_1, -30, 100), self.trade(self.symbol_1, 0, 110),
+                                self.trade(self.symbol_2, 0, 400)])
+        exchange.track_statistics(timedelta(hours=1))
+        exchange.record_trade(self.trade(self.symbol_2, 1, 440))
+
+        amzn = exchange.statistics(["AMZN_COMMON"])
+        self.assertEqual(amzn.prices.count, 2)
+        self.assertAlmostEqual(amzn.realized_volatility, math.log(1.1))
+        merged = exchange.statistics()
+        self.assertEqual(merged.prices.count, 4)
+        self.assertAlmostEqual(merged.prices.quantile(1.0), 440, delta=4.4)
+        self.assertAlmostEqual(merged.returns.sum_of_squares, 2 * math.log(1.1) ** 2)
+
+        stock = Stock("TEA", StockType.COMMON, self.par_value_1, self.last_dividend_1, self.fixed_dividend_0)
+        exchange.add_stock(stock)
+        self.assertIsNotNone(stock.statistics())
+        with self.assertRaises(KeyError):
+            exchange.statistics(["BEER_COMMON"])
+
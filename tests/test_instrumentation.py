@@ -0,0 +1,104 @@
+import io
+import json
+import os
+import random
+import tempfile
+import unittest
+
+from datetime import datetime, timedelta
+from super_simple_stocks import Stock, StockType, Trade, BuySellIndicator, GlobalBeverageCorporationExchange
+import instrumentation
+from instrumentation import Histogram, PeriodicDump
+
+
+class TestHistogram(unittest.TestCase):
+    def test_percentiles(self):
+        rng = random.Random(1)
+        values = [int(rng.lognormvariate(8, 2)) for _ in range(10000)]
+        histogram = Histogram()
+        for value in values:
+            histogram.record(value)
+
+        values.sort()
+        self.assertEqual(histogram.count, len(values))
+        self.assertEqual(histogram.min, values[0])
+        self.assertEqual(histogram.max, values[-1])
+        for fraction in (0.5, 0.9, 0.99):
+            exact = values[int(fraction * len(values)) - 1]
+            self.assertLessEqual(abs(histogram.percentile(fraction) - exact), exact / 64 + 1)
+
+    def test_merge(self):
+        histogram_1 = Histogram()
+        histogram_2 = Histogram()
+        for value in range(100):
+            histogram_1.record(value)
+            histogram_2.record(1000 + value)
+        histogram_1.merge(histogram_2)
+
+        self.assertEqual(histogram_1.count, 200)
+        self.assertEqual(histogram_1.percentile(0.25), 49)
+        self.assertEqual(histogram_1.max, 1099)
+        self.assertIsNone(Histogram().percentile(0.5))
+
+
+class TestInstrumentation(unittest.TestCase):
+    timestamp_start = datetime(2018, 5, 4, 12, 30)
+
+    def tearDown(self):
+        instrumentation.disable()
+
+    def make_exchange(self):
+        stock = Stock("AMZN", StockType.COMMON, 25, 1.0, None)
+        return GlobalBeverageCorporationExchange({stock.symbol_and_type(): stock})
+
+    def record(self, exchange, count):
+        for i in range(count):
+            exchange.record_trade(Trade("AMZN", StockType.COMMON, self.timestamp_start + timedelta(minutes=i),
+                                        10, 100.0, BuySellIndicator.BUY))
+
+    def test_enable_and_disable(self):
+        price = Stock.price
+        exchange = self.make_exchange()
+        stats = instrumentation.enable()
+        self.assertIs(instrumentation.enable(), stats)
+        self.assertIsNot(Stock.price, price)
+
+        self.record(exchange, 30)
+        self.assertEqual(exchange.get_stock("AMZN_COMMON").price(self.timestamp_start + timedelta(minutes=30)), 100.0)
+        exchange.all_share_index(self.timestamp_start + timedelta(minutes=30))
+
+        self.assertEqual(stats.latencies['GlobalBeverageCorporationExchange.record_trade'].count, 30)
+        self.assertEqual(stats.latencies['Stock.record_trade'].count, 30)
+        self.assertEqual(stats.latencies['TradeLog.insert'].count, 30)
+        self.assertEqual(stats.latencies['Stock.price'].count, 2)
+        self.assertEqual(stats.window_sizes.max, 15)
+        self.assertEqual(stats.trade_counts, {"AMZN_COMMON": 30})
+
+        instrumentation.disable()
+        self.assertIs(Stock.price, price)
+        self.assertIsNone(instrumentation.active())
+        self.record(exchange, 1)
+        self.assertEqual(stats.latencies['Stock.record_trade'].count, 30)
+
+    def test_dump(self):
+        exchange = self.make_exchange()
+        stats = instrumentation.enable()
+        self.record(exchange, 5)
+
+        text = io.StringIO()
+        stats.dump(text)
+        self.assertIn("Stock.record_trade", text.getvalue())
+        self.assertIn("1 stocks, 5 trades", text.getvalue())
+
+        data = io.StringIO()
+        stats.dump(data, format='json')
+        self.assertEqual(json.loads(data.getvalue())['latencies_ns']['Stock.record_trade']['count'], 5)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "stats.json")
+            dump = PeriodicDump(0.01, path=path, format='json')
+            dump.start()
+            self.record(exchange, 5)
+            dump.stop()
+            with open(path) as file:
+                self.assertEqual(json.load(file)['trade_counts'], {"AMZN_COMMON": 10})
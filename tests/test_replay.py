@@ -0,0 +1,92 @@
+import math
+import time
+import unittest
+
+from datetime import timedelta
+from super_simple_stocks import StockType, Trade, BuySellIndicator, GlobalBeverageCorporationExchange, datetime_to_ns
+from replay import Replay
+from exchange_fixture import ExchangeFixture
+
+
+class TestReplay(ExchangeFixture, unittest.TestCase):
+    stocks = [(symbol, StockType.COMMON) for symbol in ("AMZN", "JPM", "TEA")]
+    step = timedelta(seconds=47)
+
+    def expected_price(self, trades, symbol_and_type, moment, window):
+        in_window = [trade for trade in trades if trade.symbol_and_type() == symbol_and_type and
+                     moment - window <= trade.timestamp <= moment]
+        if len(in_window) == 0:
+            return None
+        return sum(trade.total_price for trade in in_window) / sum(trade.quantity for trade in in_window)
+
+    def test_on_trades(self):
+        trades = self.make_trades(0, 80)
+        exchange = GlobalBeverageCorporationExchange(self.make_stocks())
+        replay = Replay(self.make_stocks(), trades)
+
+        for trade, (timestamp, index, prices) in zip(trades, replay.on_trades()):
+            exchange.record_trade(trade)
+            self.assertEqual(timestamp, trade.timestamp)
+            expected = exchange.all_share_index(timestamp)
+            if expected is None:
+                self.assertIsNone(index)
+            else:
+                self.assertAlmostEqual(index, expected)
+            for symbol_and_type, price in prices.items():
+                expected = exchange.get_stock(symbol_and_type).price(timestamp)
+                if expected is None:
+                    self.assertIsNone(price)
+                else:
+                    self.assertAlmostEqual(price, expected)
+
+    def test_samples_and_arrays(self):
+        trades = self.make_trades(0, 60)
+        window = timedelta(minutes=5)
+        replay = Replay(self.make_stocks(), trades, window=window, symbols=["TEA_COMMON", "AMZN_COMMON"])
+        start = self.timestamp_start - timedelta(minutes=1)
+        end = self.timestamp_start + timedelta(minutes=70)
+        step = timedelta(seconds=90)
+
+        samples = list(replay.samples(start, end, step))
+        table = replay.arrays(start, end, step)
+        self.assertEqual(len(samples), 48)
+        self.assertEqual(list(table), ['timestamp', 'all_share_index', 'TEA_COMMON', 'AMZN_COMMON'])
+
+        for i, (moment, index, prices) in enumerate(samples):
+            self.assertEqual(moment, start + i * step)
+            self.assertEqual(table['timestamp'][i], datetime_to_ns(moment))
+            expected = [self.expected_price(trades, symbol_and_type, moment, window)
+                        for symbol_and_type in self.make_stocks()]
+            if None in expected:
+                self.assertIsNone(index)
+                self.assertTrue(math.isnan(table['all_share_index'][i]))
+            else:
+                self.assertAlmostEqual(index, math.exp(sum(map(math.log, expected)) / 3))
+                self.assertAlmostEqual(table['all_share_index'][i], index)
+            self.assertEqual(list(prices), ["TEA_COMMON", "AMZN_COMMON"])
+            for symbol_and_type, price in prices.items():
+                expected = self.expected_price(trades, symbol_and_type, moment, window)
+                if expected is None:
+                    self.assertIsNone(price)
+                    self.assertTrue(math.isnan(table[symbol_and_type][i]))
+                else:
+                    self.assertAlmostEqual(price, expected)
+                    self.assertAlmostEqual(table[symbol_and_type][i], expected)
+
+    def test_speed(self):
+        replay = Replay(self.make_stocks(), self.make_trades(0, 10))
+        started = time.monotonic()
+        samples = list(replay.samples(self.timestamp_start, self.timestamp_start + timedelta(seconds=10),
+                                      timedelta(seconds=1), speed=100))
+        self.assertEqual(len(samples), 10)
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+
+    def test_invalid_trades(self):
+        trades = self.make_trades(0, 3)
+        with self.assertRaises(ValueError):
+            list(Replay(self.make_stocks(), trades[::-1]).on_trades())
+        with self.assertRaises(ValueError):
+            list(Replay(self.make_stocks(), [Trade("BEER", StockType.COMMON, self.timestamp_start, 1, 1.0,
+                                                   BuySellIndicator.BUY)]).on_trades())
+        with self.assertRaises(KeyError):
+            Replay(self.make_stocks(), trades, symbols=["BEER_COMMON"])
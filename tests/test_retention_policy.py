@@ -0,0 +1,65 @@
+import unittest
+
+from datetime import datetime, timedelta
+from super_simple_stocks import RetentionPolicy, Stock, StockType, Trade, BuySellIndicator
+from super_simple_stocks import GlobalBeverageCorporationExchange
+
+
+class TestRetentionPolicy(unittest.TestCase):
+    symbol = "AMZN"
+    par_value = 25
+    last_dividend = 1.0
+    fixed_dividend = None
+    timestamp_start = datetime(2018, 5, 4, 8)
+
+    def make_stock(self, retention=None):
+        stock = Stock(self.symbol, StockType.COMMON, self.par_value, self.last_dividend, self.fixed_dividend,
+                      retention=retention)
+        stock.trades.chunk_size = 4
+        return stock
+
+    def make_trade(self, minutes, price=100.0):
+        return Trade(self.symbol, StockType.COMMON, self.timestamp_start + timedelta(minutes=minutes),
+                     10, price, BuySellIndicator.BUY)
+
+    def test_wrong_horizon(self):
+        with self.assertRaises(ValueError):
+            RetentionPolicy(timedelta(0))
+
+    def test_history_stays_bounded(self):
+        stock = self.make_stock(RetentionPolicy(timedelta(hours=1)))
+        unbounded = self.make_stock()
+
+        for minutes in range(1000):
+            stock.record_trade(self.make_trade(minutes, 100.0 + minutes % 13))
+            unbounded.record_trade(self.make_trade(minutes, 100.0 + minutes % 13))
+            if minutes % 97 == 0:
+                current_time = self.timestamp_start + timedelta(minutes=minutes)
+                self.assertAlmostEqual(stock.price(current_time), unbounded.price(current_time))
+
+        self.assertLessEqual(len(stock.trades), 61 + stock.trades.chunk_size)
+        self.assertGreaterEqual(stock.trades[0].timestamp, self.timestamp_start + timedelta(minutes=999 - 60 - 4))
+        self.assertEqual(stock.ticker_price, unbounded.ticker_price)
+
+    def test_compaction_and_late_trades(self):
+        stock = self.make_stock(RetentionPolicy(timedelta(hours=1), compaction_resolution=timedelta(hours=1)))
+
+        stock.record_trades([self.make_trade(minutes) for minutes in range(0, 300, 5)])
+        stock.record_trade(self.make_trade(10, 200.0))
+
+        bars = stock.bars(timedelta(hours=1), self.timestamp_start, self.timestamp_start + timedelta(hours=5))
+        self.assertEqual(list(bars['counts']), [13, 12, 12, 12, 12])
+        self.assertEqual(bars['highs'][0], 200.0)
+        self.assertLessEqual(len(stock.trades), 13 + stock.trades.chunk_size)
+        self.assertEqual(stock.price(self.timestamp_start + timedelta(minutes=295)), 100.0)
+
+    def test_exchange_retention(self):
+        stock_1 = self.make_stock()
+        stock_2 = Stock("JPM", StockType.COMMON, self.par_value, self.last_dividend, self.fixed_dividend,
+                        retention=RetentionPolicy(timedelta(days=1)))
+        exchange = GlobalBeverageCorporationExchange({stock_1.symbol_and_type(): stock_1},
+                                                     retention=RetentionPolicy(timedelta(hours=1)))
+        exchange.add_stock(stock_2)
+
+        self.assertEqual(stock_1.retention.horizon, timedelta(hours=1))
+        self.assertEqual(stock_2.retention.horizon, timedelta(days=1))
@@ -0,0 +1,106 @@
+import unittest
+
+from datetime import timedelta
+from super_simple_stocks import Stock, StockType, Trade, BuySellIndicator, GlobalBeverageCorporationExchange
+from sharded_exchange import ShardedExchange
+from exchange_fixture import ExchangeFixture
+
+
+class _FailingStock(Stock):
+    def record_trades(self, trades):
+        raise RuntimeError("The batch can not be recorded.")
+
+
+class TestShardedExchange(ExchangeFixture, unittest.TestCase):
+    stocks = [(symbol, StockType.COMMON) for symbol in ("AMZN", "JPM", "TEA", "GIN", "ALE")]
+    step = timedelta(seconds=1)
+
+    def test_same_as_exchange(self):
+        trades = self.make_trades(0, 500, late=True)
+        current_time = self.timestamp_start + timedelta(minutes=12)
+        exchange = GlobalBeverageCorporationExchange(self.make_stocks())
+        exchange.record_trades(trades)
+
+        for shards in (1, 3):
+            with ShardedExchange(self.make_stocks(), shards=shards, batch_size=64) as sharded:
+                self.assertIsNone(sharded.all_share_index(current_time))
+                for trade in trades[:100]:
+                    sharded.record_trade(trade)
+                self.assertEqual(sharded.record_trades(trades[100:]), [])
+
+                self.assertAlmostEqual(sharded.all_share_index(current_time), exchange.all_share_index(current_time))
+                sharded.add_window(timedelta(minutes=1))
+                exchange.add_window(timedelta(minutes=1))
+                self.assertEqual(sharded.windows, exchange.windows)
+                sharded.track_statistics(timedelta(minutes=5))
+                exchange.track_statistics(timedelta(minutes=5))
+                self.assertEqual(sharded.statistics().prices.count, exchange.statistics().prices.count)
+                self.assertAlmostEqual(sharded.statistics().realized_volatility,
+                                       exchange.statistics().realized_volatility)
+                self.assertEqual(sharded.statistics(["TEA_COMMON"]).returns.count,
+                                 exchange.statistics(["TEA_COMMON"]).returns.count)
+                self.assertAlmostEqual(sharded.all_share_index(current_time, timedelta(minutes=1)),
+                                       exchange.all_share_index(current_time, timedelta(minutes=1)))
+                table = sharded.analytics(current_time)
+                expected = exchange.analytics(current_time)
+                order = sorted(range(len(table['symbol_and_type'])), key=table['symbol_and_type'].__getitem__)
+                expected_order = sorted(range(len(expected['symbol_and_type'])),
+                                        key=expected['symbol_and_type'].__getitem__)
+                for name, column in expected.items():
+                    self.assertEqual([table[name][i] for i in order], [column[i] for i in expected_order])
+                stocks = sharded.get_all_stocks()
+                for symbol_and_type, stock in exchange.get_all_stocks().items():
+                    self.assert_same_trades(stocks[symbol_and_type].trades, stock.trades)
+                self.assert_same_trades(sharded.get_stock("TEA_COMMON").trades, exchange.get_stock("TEA_COMMON").trades)
+                self.assertEqual(sharded.stock_price("TEA_COMMON", current_time),
+                                 exchange.stock_price("TEA_COMMON", current_time))
+                self.assertEqual(sharded.stock_ticker_price("TEA_COMMON"), exchange.stock_ticker_price("TEA_COMMON"))
+                self.assertEqual(sharded.stock_dividend_yield("TEA_COMMON"),
+                                 exchange.stock_dividend_yield("TEA_COMMON"))
+
+    def test_unknown_stock(self):
+        trade = Trade("BEER", StockType.COMMON, self.timestamp_start, 1, 1.0, BuySellIndicator.BUY)
+        with ShardedExchange(self.make_stocks(), shards=2) as sharded:
+            with self.assertRaises(ValueError):
+                sharded.record_trade(trade)
+            rejected = sharded.record_trades([trade, None])
+            self.assertEqual([type(error) for trade, error in rejected], [ValueError, TypeError])
+            with self.assertRaises(ValueError):
+                sharded.load_columns("BEER_COMMON", [0], [1.0], [1], [1])
+
+            sharded.add_stock(Stock("BEER", StockType.COMMON, self.par_value, self.last_dividend, None))
+            sharded.record_trade(trade)
+            self.assertEqual(len(sharded.get_stock("BEER_COMMON").trades), 1)
+
+    def test_bars(self):
+        trades = self.make_trades(0, 100, late=True)
+        with ShardedExchange(self.make_stocks(), shards=2) as sharded:
+            sharded.add_bar_resolution(timedelta(minutes=1))
+            sharded.record_trades(trades)
+            bars = sharded.bars("AMZN_COMMON", timedelta(minutes=1), self.timestamp_start,
+                                self.timestamp_start + timedelta(hours=1))
+            self.assertEqual(sum(bars['counts']), 20)
+            with self.assertRaises(KeyError):
+                sharded.bars("AMZN_COMMON", timedelta(minutes=5), self.timestamp_start,
+                             self.timestamp_start + timedelta(hours=1))
+
+    def test_rejected_and_failed_batches(self):
+        trades = self.make_trades(0, 10)
+        wrong = Trade("AMZN", StockType.COMMON, self.timestamp_start, 2.5, 1.0, BuySellIndicator.BUY)
+        with ShardedExchange(self.make_stocks(), shards=2) as sharded:
+            self.assertEqual(sharded.record_trades(trades[:5] + [wrong] + trades[5:]), [])
+            rejected = sharded.rejected()
+            self.assertEqual(len(rejected), 1)
+            self.assertEqual(rejected[0][0].quantity, 2.5)
+            self.assertIsInstance(rejected[0][1], TypeError)
+            self.assertEqual(sharded.rejected(), [])
+            self.assertEqual(sum(len(stock.trades) for stock in sharded.get_all_stocks().values()), 10)
+
+        stocks = self.make_stocks()
+        stocks["AMZN_COMMON"] = _FailingStock("AMZN", StockType.COMMON, self.par_value, self.last_dividend, None)
+        with ShardedExchange(stocks, shards=1) as sharded:
+            sharded.record_trades(trades)
+            with self.assertRaises(RuntimeError):
+                sharded.get_stock("JPM_COMMON")
+            sharded.record_trades([trade for trade in trades if trade.symbol == "JPM"])
+            self.assertEqual(len(sharded.get_stock("JPM_COMMON").trades), 2)
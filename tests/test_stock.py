@@ -57,6 +57,28 @@ class TestStock(unittest.TestCase):
         with self.assertRaises(ValueError):
             stock.record_trade(trade_3)
 
+    def test_record_trade_wrong_fields(self):
+        stock = Stock(self.symbol_1, StockType.COMMON, self.par_value_1, self.last_dividend_1, self.fixed_dividend_0)
+        trade_1 = Trade(self.symbol_1, StockType.COMMON, self.timestamp_now,
+                        float(self.quantity_1), self.price_per_share_1, BuySellIndicator.SELL)
+        trade_2 = Trade(self.symbol_1, StockType.COMMON, self.timestamp_now,
+                        self.quantity_1, self.price_per_share_1, "SELL")
+        trade_3 = Trade(self.symbol_1, StockType.COMMON, self.timestamp_now,
+                        self.quantity_1, self.price_per_share_1, BuySellIndicator.SELL)
+        trade_3.quantity = 2 ** 63
+
+        with self.assertRaises(TypeError):
+            stock.record_trade(trade_1)
+        with self.assertRaises(ValueError):
+            stock.record_trade(trade_2)
+        with self.assertRaises(ValueError):
+            stock.record_trade(trade_3)
+
+        trade_3.quantity = self.quantity_2
+        stock.record_trade(trade_3)
+        self.assertEqual(list(stock.trades), [trade_3])
+        self.assertEqual(stock.price(self.timestamp_now), self.price_per_share_1)
+
     def test_record_trade_sorting(self):
         stock = Stock(self.symbol_1, StockType.COMMON, self.par_value_1, self.last_dividend_1, self.fixed_dividend_0)
 
@@ -130,3 +152,170 @@ class TestStock(unittest.TestCase):
         stock.record_trade(trade_3)
 
         self.assertEqual(stock.price(), 175)
+
+    def test_price_moving_window(self):
+        stock = Stock(self.symbol_1, StockType.COMMON, self.par_value_1, self.last_dividend_1, self.fixed_dividend_0)
+
+        trade_1 = Trade(self.symbol_1, StockType.COMMON, self.timestamp_now - timedelta(minutes=20),
+                        self.quantity_1, self.price_per_share_1, BuySellIndicator.SELL)
+        trade_2 = Trade(self.symbol_1, StockType.COMMON, self.timestamp_now - timedelta(minutes=10),
+                        self.quantity_2, self.price_per_share_2, BuySellIndicator.SELL)
+
+        stock.record_trade(trade_1)
+        stock.record_trade(trade_2)
+
+        self.assertEqual(stock.price(self.timestamp_now - timedelta(minutes=10)), 187.5)
+        self.assertEqual(stock.price(self.timestamp_now), 200)
+        self.assertEqual(stock.price(self.timestamp_now + timedelta(minutes=10)), None)
+        self.assertEqual(stock.price(self.timestamp_now - timedelta(minutes=10)), 187.5)
+
+    def test_price_late_trade(self):
+        stock = Stock(self.symbol_1, StockType.COMMON, self.par_value_1, self.last_dividend_1, self.fixed_dividend_0)
+
+        trade_1 = Trade(self.symbol_1, StockType.COMMON, self.timestamp_now,
+                        self.quantity_1, self.price_per_share_1, BuySellIndicator.SELL)
+        trade_2 = Trade(self.symbol_1, StockType.COMMON, self.timestamp_now - timedelta(minutes=5),
+                        self.quantity_2, self.price_per_share_2, BuySellIndicator.SELL)
+        trade_3 = Trade(self.symbol_1, StockType.COMMON, self.timestamp_now - timedelta(minutes=30),
+                        self.quantity_2, self.price_per_share_2, BuySellIndicator.SELL)
+
+        stock.record_trade(trade_1)
+        self.assertEqual(stock.price(self.timestamp_now), 150)
+
+        stock.record_trade(trade_2)
+        stock.record_trade(trade_3)
+        self.assertEqual(stock.price(self.timestamp_now), 187.5)
+
+    def test_columnar_price_and_ticker_price(self):
+        stock = Stock(self.symbol_1, StockType.COMMON, self.par_value_1, self.last_dividend_1, self.fixed_dividend_0,
+                      columnar=True)
+
+        trade_1 = Trade(self.symbol_1, StockType.COMMON, self.timestamp_now,
+                        self.quantity_1, self.price_per_share_1, BuySellIndicator.SELL)
+        trade_2 = Trade(self.symbol_1, StockType.COMMON, self.timestamp_now - timedelta(minutes=10),
+                        self.quantity_1, self.price_per_share_2, BuySellIndicator.SELL)
+
+        stock.record_trade(trade_1)
+        stock.record_trade(trade_2)
+
+        self.assertEqual(stock.ticker_price, self.price_per_share_1)
+        self.assertEqual(stock.price(self.timestamp_now), 175)
+        self.assertEqual(stock.trades[0].price_per_share, self.price_per_share_2)
+
+    def test_record_trades(self):
+        stock = Stock(self.symbol_1, StockType.COMMON, self.par_value_1, self.last_dividend_1, self.fixed_dividend_0)
+        stock.record_trade(Trade(self.symbol_1, StockType.COMMON, self.timestamp_now - timedelta(minutes=10),
+                                 self.quantity_1, self.price_per_share_1, BuySellIndicator.SELL))
+        self.assertEqual(stock.price(self.timestamp_now), 150)
+
+        trade_1 = Trade(self.symbol_1, StockType.COMMON, self.timestamp_now,
+                        self.quantity_1, self.price_per_share_2, BuySellIndicator.SELL)
+        trade_2 = Trade(self.symbol_1, StockType.COMMON, self.timestamp_now - timedelta(minutes=5),
+                        self.quantity_2, self.price_per_share_2, BuySellIndicator.SELL)
+        trade_3 = Trade(self.symbol_1, StockType.COMMON, self.timestamp_now - timedelta(minutes=30),
+                        self.quantity_2, self.price_per_share_1, BuySellIndicator.SELL)
+        false_trade = "a new trade"
+
+        rejected = stock.record_trades([trade_1, false_trade, trade_2, trade_3])
+
+        self.assertEqual(len(rejected), 1)
+        self.assertIs(rejected[0][0], false_trade)
+        self.assertIsInstance(rejected[0][1], TypeError)
+        self.assertEqual(len(stock.trades), 4)
+        self.assertIs(stock.trades[0], trade_3)
+        self.assertIs(stock.trades[-1], trade_1)
+        self.assertEqual(stock.ticker_price, self.price_per_share_2)
+        self.assertEqual(stock.price(self.timestamp_now), 190)
+
+    def test_record_trades_wrong_fields(self):
+        stock = Stock(self.symbol_1, StockType.COMMON, self.par_value_1, self.last_dividend_1, self.fixed_dividend_0)
+        stock.add_bar_resolution(timedelta(hours=1))
+        trade_1 = Trade(self.symbol_1, StockType.COMMON, self.timestamp_now,
+                        self.quantity_1, self.price_per_share_1, BuySellIndicator.SELL)
+        trade_2 = Trade(self.symbol_1, StockType.COMMON, self.timestamp_now,
+                        float(self.quantity_1), self.price_per_share_1, BuySellIndicator.SELL)
+        trade_3 = Trade(self.symbol_1, StockType.COMMON, None,
+                        self.quantity_1, self.price_per_share_1, BuySellIndicator.SELL)
+        trade_4 = Trade(self.symbol_1, StockType.COMMON, self.timestamp_now,
+                        self.quantity_1, self.price_per_share_1, BuySellIndicator.SELL)
+        trade_4.price_per_share = "150"
+
+        rejected = stock.record_trades([trade_1, trade_2, trade_3, trade_4])
+
+        self.assertEqual([trade for trade, error in rejected], [trade_2, trade_3, trade_4])
+        self.assertEqual([type(error) for trade, error in rejected], [TypeError, TypeError, TypeError])
+        self.assertEqual(list(stock.trades), [trade_1])
+        bars = stock.bars(timedelta(hours=1), self.timestamp_now - timedelta(hours=1), self.timestamp_now + timedelta(hours=1))
+        self.assertEqual(list(bars['counts']), [1])
+
+    def test_vwap(self):
+        stock = Stock(self.symbol_1, StockType.COMMON, self.par_value_1, self.last_dividend_1, self.fixed_dividend_0)
+
+        for minutes, quantity, price in ((30, self.quantity_2, self.price_per_share_2),
+                                         (10, self.quantity_1, self.price_per_share_2),
+                                         (0, self.quantity_1, self.price_per_share_1)):
+            stock.record_trade(Trade(self.symbol_1, StockType.COMMON, self.timestamp_now - timedelta(minutes=minutes),
+                                     quantity, price, BuySellIndicator.SELL))
+
+        self.assertEqual(stock.vwap(self.timestamp_now - timedelta(minutes=15), self.timestamp_now), 200)
+        self.assertEqual(stock.vwap(self.timestamp_now - timedelta(minutes=15), self.timestamp_now +
+                                    timedelta(seconds=1)), 175)
+        self.assertEqual(stock.vwap(self.timestamp_now - timedelta(minutes=30), self.timestamp_now), 200)
+        self.assertEqual(stock.vwap(self.timestamp_now - timedelta(minutes=5), self.timestamp_now), None)
+
+    def test_price_at(self):
+        stock = Stock(self.symbol_1, StockType.COMMON, self.par_value_1, self.last_dividend_1, self.fixed_dividend_0)
+        stock.trades.chunk_size = 4
+
+        for minutes in (50, 3, 27, 14, 8, 33, 1, 19, 40, 22, 5, 11):
+            stock.record_trade(Trade(self.symbol_1, StockType.COMMON, self.timestamp_now - timedelta(minutes=minutes),
+                                     minutes + 1, float(minutes), BuySellIndicator.SELL))
+        moments = [self.timestamp_now - timedelta(minutes=minutes) for minutes in (60, 0, 30, 45, 2, 15, -20)]
+
+        prices = stock.price_at(moments)
+
+        self.assertEqual(prices[-1], None)
+        for moment, price in zip(moments, prices):
+            expected = stock.price(moment)
+            if expected is None:
+                self.assertEqual(price, None)
+            else:
+                self.assertAlmostEqual(price, expected)
+
+    def test_windows(self):
+        one_minute, five_minutes, one_hour = timedelta(minutes=1), timedelta(minutes=5), timedelta(hours=1)
+        stock = Stock(self.symbol_1, StockType.COMMON, self.par_value_1, self.last_dividend_1, self.fixed_dividend_0,
+                      windows=[one_minute, five_minutes])
+        stock.trades.chunk_size = 4
+
+        minutes = (50, 3, 27, 14, 8, 33, 1, 19, 40, 22, 5, 11, 0, 4, 2)
+        trades = [Trade(self.symbol_1, StockType.COMMON, self.timestamp_now - timedelta(minutes=minute, seconds=30),
+                        minute + 1, float(minute), BuySellIndicator.SELL) for minute in minutes]
+        for trade in trades[:6]:
+            stock.record_trade(trade)
+        self.assertEqual(stock.prices(self.timestamp_now), {one_minute: None, five_minutes: 3.0})
+        stock.record_trades(trades[6:])
+        stock.add_window(one_hour)
+        self.assertEqual(stock.windows, (one_minute, five_minutes, one_hour))
+
+        for moment in [self.timestamp_now - timedelta(minutes=minute) for minute in (60, 0, 30, 2, 15, 4, -20)]:
+            prices = stock.prices(moment)
+            for window in stock.windows:
+                in_window = [trade for trade in trades if trade.timestamp >= moment - window]
+                expected = sum(trade.total_price for trade in in_window) / sum(trade.quantity for trade in in_window) \
+                    if in_window else None
+                self.assertAlmostEqual(prices[window], expected)
+                self.assertAlmostEqual(stock.price(moment, window), expected)
+                self.assertAlmostEqual(stock.price_at([moment], window)[0], expected)
+        self.assertEqual(stock.price(self.timestamp_now), stock.price_at([self.timestamp_now])[0])
+
+        snapshot = stock.snapshot()
+        stock.record_trade(Trade(self.symbol_1, StockType.COMMON, self.timestamp_now, 1000, 1000.0,
+                                 BuySellIndicator.BUY))
+        self.assertNotEqual(stock.price(self.timestamp_now, one_minute), snapshot.price(self.timestamp_now, one_minute))
+
+        with self.assertRaises(KeyError):
+            stock.price(self.timestamp_now, timedelta(minutes=2))
+        with self.assertRaises(ValueError):
+            stock.add_window(timedelta(0))
+
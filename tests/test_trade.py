@@ -1,3 +1,4 @@
+import pickle
 import unittest
 
 from datetime import datetime
@@ -39,3 +40,38 @@ class TestTrade(unittest.TestCase):
         with self.assertRaises(ValueError):
             Trade(self.symbol, StockType.COMMON, datetime.now(),
                   self.quantity_1, self.price_per_share_0, BuySellIndicator.SELL)
+
+    def test_from_tuples(self):
+        timestamp = datetime.now()
+        trades = Trade.from_tuples([(self.symbol, StockType.COMMON, timestamp,
+                                     self.quantity_1, self.price_per_share_1, BuySellIndicator.SELL)])
+
+        self.assertEqual(len(trades), 1)
+        self.assertTrue(trades[0].equals(Trade(self.symbol, StockType.COMMON, timestamp,
+                                                 self.quantity_1, self.price_per_share_1, BuySellIndicator.SELL)))
+        self.assertEqual(trades[0].symbol_and_type(), "AMZN_COMMON")
+
+    def test_equality_and_pickling(self):
+        trade = Trade(self.symbol, StockType.COMMON, datetime.now(),
+                      self.quantity_1, self.price_per_share_1, BuySellIndicator.SELL)
+        trade.symbol_and_type()
+        other = Trade(self.symbol, StockType.COMMON, trade.timestamp,
+                      self.quantity_0 + 1, self.price_per_share_1, BuySellIndicator.SELL)
+
+        unpickled = pickle.loads(pickle.dumps(trade))
+
+        self.assertTrue(unpickled.equals(trade))
+        self.assertNotEqual(unpickled, trade)
+        self.assertEqual(unpickled.symbol_and_type(), trade.symbol_and_type())
+        self.assertFalse(other.equals(trade))
+        self.assertFalse(trade.equals(None))
+        self.assertEqual({trade: 1}[trade], 1)
+
+        trade.symbol = "JPM"
+        self.assertEqual(trade.symbol_and_type(), "JPM_COMMON")
+
+    def test_no_instance_dict(self):
+        trade = Trade(self.symbol, StockType.COMMON, datetime.now(),
+                      self.quantity_1, self.price_per_share_1, BuySellIndicator.SELL)
+
+        self.assertFalse(hasattr(trade, '__dict__'))
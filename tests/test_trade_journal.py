@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+
+from unittest import mock
+from datetime import timedelta
+from super_simple_stocks import Stock, StockType, Trade, BuySellIndicator, GlobalBeverageCorporationExchange
+import trade_journal
+from trade_journal import TradeJournal, replay, RECORD
+from exchange_fixture import ExchangeFixture
+
+
+class TestTradeJournal(ExchangeFixture, unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.journal_path = os.path.join(self.directory.name, "trades.journal")
+        self.snapshot_path = os.path.join(self.directory.name, "trades.snapshot")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def assertSameTrades(self, exchange, other):
+        stocks = exchange.get_all_stocks()
+        other_stocks = other.get_all_stocks()
+        for symbol_and_type, stock in stocks.items():
+            self.assert_same_trades(stock.trades, other_stocks[symbol_and_type].trades)
+
+    def test_replay(self):
+        with TradeJournal(self.journal_path, sync_every=7) as journal:
+            exchange = self.make_exchange(journal)
+            for trade in self.make_trades(0, 20, late=True):
+                exchange.record_trade(trade)
+            exchange.record_trades(self.make_trades(20, 50, late=True) + [None])
+
+        for columnar, load_slice in ((False, 7), (True, trade_journal.LOAD_SLICE)):
+            replayed = self.make_exchange(columnar=columnar)
+
+            with mock.patch.object(trade_journal, 'LOAD_SLICE', load_slice):
+                self.assertEqual(replay(replayed, self.journal_path), 50)
+            self.assertSameTrades(exchange, replayed)
+            current_time = self.timestamp_start + timedelta(minutes=60)
+            self.assertEqual(replayed.all_share_index(current_time), exchange.all_share_index(current_time))
+
+    def test_replay_from_snapshot(self):
+        with TradeJournal(self.journal_path) as journal:
+            exchange = self.make_exchange(journal)
+            exchange.record_trades(self.make_trades(0, 30, late=True))
+            journal.snapshot(exchange, self.snapshot_path)
+            exchange.record_trades(self.make_trades(30, 40, late=True))
+
+        # A record cut short by a crash is ignored.
+        with open(self.journal_path, 'ab') as file:
+            file.write(b'\1' * (RECORD.size - 1))
+
+        replayed = self.make_exchange()
+
+        self.assertEqual(replay(replayed, self.journal_path, self.snapshot_path), 40)
+        self.assertSameTrades(exchange, replayed)
+
+    def test_not_a_journal(self):
+        with open(self.journal_path, 'wb') as file:
+            file.write(b'something else')
+
+        with self.assertRaises(ValueError):
+            TradeJournal(self.journal_path)
+
+    def test_symbol_too_long(self):
+        symbol = "A" * 20
+        stock = Stock(symbol, StockType.COMMON, self.par_value, self.last_dividend, None)
+        trade = Trade(symbol, StockType.COMMON, self.timestamp_start, 1, 100.0, BuySellIndicator.BUY)
+        with TradeJournal(self.journal_path) as journal:
+            exchange = GlobalBeverageCorporationExchange({stock.symbol_and_type(): stock}, journal=journal)
+            with self.assertRaises(ValueError):
+                exchange.record_trade(trade)
+            self.assertEqual(len(stock.trades), 0)
+
+            rejected = exchange.record_trades([trade])
+            self.assertEqual(len(rejected), 1)
+            self.assertIs(rejected[0][0], trade)
+            self.assertIsInstance(rejected[0][1], ValueError)
+            self.assertEqual(len(stock.trades), 0)
+
+            stock.record_trade(trade)
+            with self.assertRaises(ValueError):
+                journal.snapshot(exchange, self.snapshot_path)
+            self.assertFalse(os.path.exists(self.snapshot_path))
+        self.assertEqual(os.path.getsize(self.journal_path), len(trade_journal.JOURNAL_MAGIC))
@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+
+from trade_journal import TradeJournal, RECORD
+from trade_loader import load_csv, load_binary, CSV_HEADER
+from exchange_fixture import ExchangeFixture
+
+
+class TestTradeLoader(ExchangeFixture, unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "trades")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_csv(self, rows, header=True):
+        with open(self.path, 'w') as file:
+            if header:
+                file.write(",".join(CSV_HEADER) + "\n")
+            for row in rows:
+                file.write(",".join(row) + "\n")
+
+    def csv_row(self, trade):
+        return [trade.symbol, trade.stock_type.name, trade.timestamp.isoformat(), str(trade.quantity),
+                repr(trade.price_per_share), trade.buy_sell_indicator.name]
+
+    def assertLoaded(self, exchange, trades):
+        expected = self.make_exchange()
+        expected.record_trades(trades)
+        stocks = exchange.get_all_stocks()
+        for symbol_and_type, stock in expected.get_all_stocks().items():
+            self.assert_same_trades(stock.trades, stocks[symbol_and_type].trades)
+
+    def test_load_csv(self):
+        trades = self.make_trades(0, 50, late=True)
+        for header in (True, False):
+            self.write_csv([self.csv_row(trade) for trade in trades], header)
+            exchange = self.make_exchange()
+
+            report = load_csv(exchange, self.path, chunk_size=7)
+
+            self.assertEqual(report.rows, 50)
+            self.assertEqual(report.loaded, 50)
+            self.assertEqual(report.rejected, 0)
+            self.assertLoaded(exchange, trades)
+
+    def test_load_csv_rejected(self):
+        trades = self.make_trades(0, 10, late=True)
+        rows = [self.csv_row(trade) for trade in trades]
+        rows[1][3] = "-5"
+        rows[2][1] = "ORDINARY"
+        rows[4][2] = "yesterday"
+        rows[5] = rows[5][:4]
+        rows[7][0] = "TEA"
+        rows[8][5] = "HOLD"
+        self.write_csv(rows)
+        exchange = self.make_exchange()
+
+        report = load_csv(exchange, self.path, chunk_size=4, max_samples=4)
+
+        self.assertEqual(report.rows, 10)
+        self.assertEqual(report.loaded, 4)
+        self.assertEqual(report.rejected, 6)
+        self.assertEqual([sample[0] for sample in report.rejected_samples], [3, 4, 6, 7])
+        self.assertLoaded(exchange, [trades[0], trades[3], trades[6], trades[9]])
+
+    def test_load_csv_rejects_extra_fields(self):
+        trades = self.make_trades(0, 4, late=True)
+        rows = [self.csv_row(trade) for trade in trades]
+        rows[3].append("garbage")
+        self.write_csv(rows)
+        exchange = self.make_exchange()
+
+        report = load_csv(exchange, self.path, chunk_size=4)
+
+        self.assertEqual(report.loaded, 3)
+        self.assertEqual(report.rejected, 1)
+        self.assertEqual([sample[0] for sample in report.rejected_samples], [5])
+        self.assertLoaded(exchange, trades[:3])
+
+    def test_load_binary(self):
+        trades = self.make_trades(0, 50, late=True)
+        with TradeJournal(self.path) as journal:
+            journal.extend(trades)
+        with open(self.path, 'ab') as file:
+            file.write(RECORD.pack(0, 1.0, -1, 1, 1, b"AMZN"))
+            file.write(RECORD.pack(0, 1.0, 1, 1, 7, b"AMZN"))
+            file.write(b"\0" * (RECORD.size // 2))
+        exchange = self.make_exchange()
+
+        report = load_binary(exchange, self.path, chunk_size=16)
+
+        self.assertEqual(report.rows, 52)
+        self.assertEqual(report.loaded, 50)
+        self.assertEqual([sample[0] for sample in report.rejected_samples], [51, 52])
+        self.assertGreater(report.rows_per_second, 0)
+        self.assertLoaded(exchange, trades)
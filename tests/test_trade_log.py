@@ -0,0 +1,234 @@
+import copy
+import operator
+import pickle
+import random
+import unittest
+
+from datetime import datetime, timedelta
+from super_simple_stocks import TradeLog, Trade, StockType, BuySellIndicator, datetime_to_ns
+
+
+class TestTradeLog(unittest.TestCase):
+    symbol = "AMZN"
+    quantity_1 = 100
+    quantity_2 = 300
+    price_per_share_1 = 150
+    price_per_share_2 = 200
+    timestamp_now = datetime(2018, 5, 4, 12, 30, 15, 250)
+
+    def columns(self, trades):
+        return ([datetime_to_ns(trade.timestamp) for trade in trades], [trade.price_per_share for trade in trades],
+                [trade.quantity for trade in trades], [trade.buy_sell_indicator.value for trade in trades])
+
+    def test_insert_sorting(self):
+        trade_log = TradeLog(self.symbol, StockType.COMMON)
+        trade_1 = Trade(self.symbol, StockType.COMMON, self.timestamp_now,
+                        self.quantity_1, self.price_per_share_1, BuySellIndicator.SELL)
+        trade_2 = Trade(self.symbol, StockType.COMMON, self.timestamp_now - timedelta(minutes=10),
+                        self.quantity_2, self.price_per_share_2, BuySellIndicator.BUY)
+        trade_3 = Trade(self.symbol, StockType.COMMON, self.timestamp_now + timedelta(minutes=10),
+                        self.quantity_1, self.price_per_share_2, BuySellIndicator.BUY)
+
+        self.assertEqual(trade_log.insert(trade_1), 0)
+        self.assertEqual(trade_log.insert(trade_2), 0)
+        self.assertEqual(trade_log.insert(trade_3), 2)
+
+        self.assertEqual(len(trade_log), 3)
+        self.assertEqual(list(trade_log), [trade_2, trade_1, trade_3])
+        self.assertEqual(list(trade_log.prices), [self.price_per_share_2, self.price_per_share_1,
+                                                  self.price_per_share_2])
+
+    def test_columnar_materializes_trades(self):
+        trade_log = TradeLog(self.symbol, StockType.PREFERRED, keep_objects=False)
+        trade = Trade(self.symbol, StockType.PREFERRED, self.timestamp_now,
+                      self.quantity_1, self.price_per_share_1, BuySellIndicator.BUY)
+
+        trade_log.insert(trade)
+        materialized = trade_log[-1]
+
+        self.assertIsNot(materialized, trade)
+        self.assertEqual(materialized.symbol, self.symbol)
+        self.assertEqual(materialized.stock_type, StockType.PREFERRED)
+        self.assertEqual(materialized.timestamp, self.timestamp_now)
+        self.assertEqual(materialized.quantity, self.quantity_1)
+        self.assertEqual(materialized.price_per_share, self.price_per_share_1)
+        self.assertEqual(materialized.buy_sell_indicator, BuySellIndicator.BUY)
+
+    def test_extend_columns_materializes_trades_once(self):
+        trade_log = TradeLog(self.symbol, StockType.COMMON)
+        trade_log.chunk_size = 4
+        trades = [Trade(self.symbol, StockType.COMMON, self.timestamp_now + timedelta(minutes=minute),
+                        self.quantity_1, float(minute), BuySellIndicator.SELL) for minute in range(10)]
+        trade_log.extend_columns(*self.columns(trades[:6]))
+        trade_log.extend_columns(*self.columns(trades[6:9]))
+
+        self.assertEqual(len(trade_log), 9)
+        self.assertTrue(all(map(Trade.equals, trade_log, trades[:9])))
+        self.assertIs(trade_log[4], trade_log[4])
+        trade_log.insert(trades[9])
+        self.assertIs(trade_log[-1], trades[9])
+        trade_log.insert(trades[0])
+        self.assertEqual(len(trade_log), 11)
+        self.assertTrue(all(map(Trade.equals, trade_log, trades[:1] + trades)))
+
+    def test_wrong_field_leaves_log_unchanged(self):
+        trade_log = TradeLog(self.symbol, StockType.COMMON)
+        trade_log.chunk_size = 4
+        trades = [Trade(self.symbol, StockType.COMMON, self.timestamp_now + timedelta(minutes=minute),
+                        self.quantity_1, float(minute), BuySellIndicator.SELL) for minute in range(6)]
+        trade_log.extend(trades)
+        wrong = Trade(self.symbol, StockType.COMMON, self.timestamp_now + timedelta(minutes=2),
+                      self.quantity_1, self.price_per_share_1, None)
+
+        for late in (False, True):
+            wrong.timestamp = self.timestamp_now + timedelta(minutes=2 if late else 10)
+            with self.assertRaises(AttributeError):
+                trade_log.insert(wrong)
+            timestamps, prices, quantities, sides = self.columns(trades[:2])
+            with self.assertRaises(TypeError):
+                trade_log.extend_columns(timestamps, prices, [self.quantity_1, 1.5], sides)
+            self.assertEqual(list(trade_log), trades)
+            self.assertEqual(trade_log.totals(0, 6), (self.quantity_1 * 15.0, 6 * self.quantity_1))
+
+    def test_bisect_left(self):
+        trade_log = TradeLog(self.symbol, StockType.COMMON, keep_objects=False)
+        for minutes in (0, 10, 20):
+            trade_log.insert(Trade(self.symbol, StockType.COMMON, self.timestamp_now + timedelta(minutes=minutes),
+                                   self.quantity_1, self.price_per_share_1, BuySellIndicator.SELL))
+
+        self.assertEqual(trade_log.bisect_left(self.timestamp_now - timedelta(minutes=1)), 0)
+        self.assertEqual(trade_log.bisect_left(self.timestamp_now + timedelta(minutes=10)), 1)
+        self.assertEqual(trade_log.bisect_left(self.timestamp_now + timedelta(minutes=21)), 3)
+
+    def test_insert_across_chunks(self):
+        trade_log = TradeLog(self.symbol, StockType.COMMON, keep_objects=False)
+        trade_log.chunk_size = 4
+        minutes = list(range(50))
+        random.Random(7).shuffle(minutes)
+
+        for i, minute in enumerate(minutes):
+            trade_log.insert(Trade(self.symbol, StockType.COMMON, self.timestamp_now + timedelta(minutes=minute),
+                                   i + 1, float(minute), BuySellIndicator.SELL))
+
+        self.assertEqual(len(trade_log), 50)
+        self.assertEqual(list(trade_log.prices), [float(minute) for minute in range(50)])
+        self.assertEqual(trade_log.price_at(17), 17.0)
+        self.assertEqual(trade_log.bisect_left(self.timestamp_now + timedelta(minutes=30)), 30)
+
+        notional, quantity = trade_log.totals(10, 20)
+        expected = [(minutes.index(minute) + 1, float(minute)) for minute in range(10, 20)]
+        self.assertEqual(notional, sum(q * p for q, p in expected))
+        self.assertEqual(quantity, sum(q for q, p in expected))
+
+    def test_insert_equal_timestamps_keeps_arrival_order(self):
+        trade_log = TradeLog(self.symbol, StockType.COMMON)
+        trade_1 = Trade(self.symbol, StockType.COMMON, self.timestamp_now,
+                        self.quantity_1, self.price_per_share_1, BuySellIndicator.SELL)
+        trade_2 = Trade(self.symbol, StockType.COMMON, self.timestamp_now,
+                        self.quantity_2, self.price_per_share_2, BuySellIndicator.BUY)
+
+        trade_log.insert(trade_1)
+        trade_log.insert(trade_2)
+
+        self.assertIs(trade_log[-1], trade_2)
+
+    def test_extend_merges_late_batch(self):
+        trade_log = TradeLog(self.symbol, StockType.COMMON, keep_objects=False)
+        trade_log.chunk_size = 4
+        for minute in range(0, 40, 2):
+            trade_log.insert(Trade(self.symbol, StockType.COMMON, self.timestamp_now + timedelta(minutes=minute),
+                                   self.quantity_1, float(minute), BuySellIndicator.SELL))
+
+        trade_log.extend([Trade(self.symbol, StockType.COMMON, self.timestamp_now + timedelta(minutes=minute),
+                                self.quantity_1, float(minute), BuySellIndicator.SELL)
+                          for minute in range(21, 50, 2)])
+
+        self.assertEqual(len(trade_log), 35)
+        self.assertEqual(list(trade_log.prices), [float(minute) for minute in range(0, 20, 2)] +
+                         [float(minute) for minute in range(20, 40)] +
+                         [float(minute) for minute in range(41, 50, 2)])
+        self.assertEqual(trade_log.bisect_left(self.timestamp_now + timedelta(minutes=21)), 11)
+
+    def test_extend_late_batches_across_chunks(self):
+        generator = random.Random(11)
+        for keep_objects in (True, False):
+            trade_log = TradeLog(self.symbol, StockType.COMMON, keep_objects=keep_objects)
+            trade_log.chunk_size = 4
+            expected = []
+            for batch in range(40):
+                trades = sorted((Trade(self.symbol, StockType.COMMON,
+                                       self.timestamp_now + timedelta(minutes=batch * 5 - generator.randint(0, 60)),
+                                       generator.randint(1, 50), float(batch * 100 + i), BuySellIndicator.SELL)
+                                 for i in range(generator.randint(1, 12))), key=lambda trade: trade.timestamp)
+                trade_log.extend(trades)
+                expected.extend(trades)
+                expected.sort(key=lambda trade: trade.timestamp)
+
+                self.assertEqual(len(trade_log), len(expected))
+                self.assertEqual(list(trade_log.prices), [trade.price_per_share for trade in expected])
+                notional, quantity = trade_log.totals(3, len(expected))
+                self.assertAlmostEqual(notional, sum(trade.total_price for trade in expected[3:]))
+                self.assertEqual(quantity, sum(trade.quantity for trade in expected[3:]))
+            self.assertTrue(all(len(chunk) <= 2 * trade_log.chunk_size for chunk in trade_log._chunks))
+            if keep_objects:
+                self.assertTrue(all(map(operator.is_, trade_log, expected)))
+
+    def test_cumulative_between_inserts(self):
+        generator = random.Random(13)
+        trade_log = TradeLog(self.symbol, StockType.COMMON, keep_objects=False)
+        trade_log.chunk_size = 4
+        expected = []
+        for i in range(120):
+            minute = i if generator.random() < 0.5 else generator.uniform(0, i)
+            trade = Trade(self.symbol, StockType.COMMON, self.timestamp_now + timedelta(minutes=minute),
+                          generator.randint(1, 50), float(generator.randint(1, 100)), BuySellIndicator.SELL)
+            trade_log.insert(trade)
+            expected.append(trade)
+            expected.sort(key=lambda trade: trade.timestamp)
+            if i % 7 == 0:
+                trade_log = trade_log.copy()
+
+            if generator.random() < 0.3:
+                index = generator.randint(0, len(expected))
+                notional, quantity = trade_log.cumulative(index)
+                self.assertAlmostEqual(notional, sum(trade.total_price for trade in expected[:index]))
+                self.assertEqual(quantity, sum(trade.quantity for trade in expected[:index]))
+        self.assertEqual(trade_log.totals(0, len(expected))[1], sum(trade.quantity for trade in expected))
+
+    def test_copy_is_isolated(self):
+        trade_log = TradeLog(self.symbol, StockType.COMMON, keep_objects=False)
+        trade_log.chunk_size = 4
+        for minute in range(0, 20, 2):
+            trade_log.insert(Trade(self.symbol, StockType.COMMON, self.timestamp_now + timedelta(minutes=minute),
+                                   self.quantity_1, float(minute), BuySellIndicator.SELL))
+
+        copied = trade_log.copy()
+        trade_log.insert(Trade(self.symbol, StockType.COMMON, self.timestamp_now + timedelta(minutes=5),
+                               self.quantity_1, 5.0, BuySellIndicator.SELL))
+        trade_log.insert(Trade(self.symbol, StockType.COMMON, self.timestamp_now + timedelta(minutes=30),
+                               self.quantity_1, 30.0, BuySellIndicator.SELL))
+        copied.extend([Trade(self.symbol, StockType.COMMON, self.timestamp_now + timedelta(minutes=minute),
+                             self.quantity_1, float(minute), BuySellIndicator.SELL) for minute in (1, 19)])
+
+        self.assertEqual(list(trade_log.prices), [0.0, 2.0, 4.0, 5.0, 6.0, 8.0, 10.0, 12.0, 14.0, 16.0, 18.0, 30.0])
+        self.assertEqual(list(copied.prices), [0.0, 1.0, 2.0, 4.0, 6.0, 8.0, 10.0, 12.0, 14.0, 16.0, 18.0, 19.0])
+
+    def test_copy_is_isolated_after_pickling(self):
+        for keep_objects in (True, False):
+            trade_log = TradeLog(self.symbol, StockType.COMMON, keep_objects=keep_objects)
+            trade_log.chunk_size = 4
+            for minute in range(0, 20, 2):
+                trade_log.insert(Trade(self.symbol, StockType.COMMON, self.timestamp_now + timedelta(minutes=minute),
+                                       self.quantity_1, float(minute), BuySellIndicator.SELL))
+            state = {'log': trade_log, 'copied': trade_log.copy()}
+
+            for restored in (pickle.loads(pickle.dumps(state)), copy.deepcopy(state)):
+                restored['log'].insert(Trade(self.symbol, StockType.COMMON, self.timestamp_now + timedelta(minutes=5),
+                                             self.quantity_1, 5.0, BuySellIndicator.SELL))
+                restored['log'].insert(Trade(self.symbol, StockType.COMMON,
+                                             self.timestamp_now + timedelta(minutes=19),
+                                             self.quantity_1, 19.0, BuySellIndicator.SELL))
+
+                self.assertEqual(len(restored['log']), 12)
+                self.assertEqual(list(restored['copied'].prices), [float(minute) for minute in range(0, 20, 2)])
+            self.assertEqual(list(trade_log.prices), [float(minute) for minute in range(0, 20, 2)])
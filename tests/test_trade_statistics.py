@@ -0,0 +1,174 @@
+import math
+import random
+import statistics
+import unittest
+
+from datetime import datetime, timedelta
+from super_simple_stocks import QuantileSketch, Moments, TradeStatistics, Stock, StockType, Trade, \
+    BuySellIndicator, RetentionPolicy, datetime_to_ns, timedelta_to_ns
+
+
+class TestQuantileSketch(unittest.TestCase):
+    def assert_quantiles(self, sketch, values, relative_accuracy):
+        values = sorted(values)
+        self.assertEqual(sketch.count, len(values))
+        for q in (0.0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1.0):
+            expected = values[int(q * (len(values) - 1))]
+            self.assertLessEqual(abs(sketch.quantile(q) - expected), relative_accuracy * expected + 1e-12)
+
+    def test_quantiles(self):
+        generator = random.Random(1)
+        values = [generator.lognormvariate(4, 1) for _ in range(5000)] + [0.0] * 10
+        sketch = QuantileSketch(0.02)
+        for value in values:
+            sketch.add(value)
+        self.assert_quantiles(sketch, values, 0.02)
+
+        for value in values[:2500]:
+            sketch.remove(value)
+        self.assert_quantiles(sketch, values[2500:], 0.02)
+
+        self.assertIsNone(QuantileSketch().quantile(0.5))
+        with self.assertRaises(ValueError):
+            sketch.add(-1.0)
+        with self.assertRaises(ValueError):
+            sketch.remove(1e9)
+        with self.assertRaises(ValueError):
+            sketch.quantile(1.5)
+
+    def test_merge(self):
+        generator = random.Random(2)
+        parts = [[generator.uniform(1, 1000) for _ in range(1000)] for _ in range(3)]
+        merged = QuantileSketch()
+        for part in parts:
+            sketch = QuantileSketch()
+            for value in part:
+                sketch.add(value)
+            merged.merge(sketch)
+        self.assert_quantiles(merged, sum(parts, []), 0.01)
+
+        with self.assertRaises(ValueError):
+            merged.merge(QuantileSketch(0.05))
+
+    def test_max_bins(self):
+        sketch = QuantileSketch(0.01, max_bins=50)
+        values = [1.5 ** i for i in range(200)]
+        for value in values:
+            sketch.add(value)
+        self.assertLessEqual(len(sketch._bins), 50)
+        self.assertEqual(sketch.count, 200)
+        for q in (0.9, 1.0):
+            expected = values[int(q * 199)]
+            self.assertLessEqual(abs(sketch.quantile(q) - expected), 0.01 * expected)
+
+
+class TestMoments(unittest.TestCase):
+    def test_add_remove_and_merge(self):
+        generator = random.Random(3)
+        values = [generator.gauss(0, 0.01) for _ in range(1000)]
+        moments = Moments()
+        for value in values:
+            moments.add(value)
+        self.assertAlmostEqual(moments.mean, statistics.mean(values))
+        self.assertAlmostEqual(moments.variance, statistics.pvariance(values))
+        self.assertAlmostEqual(moments.sum_of_squares, sum(value * value for value in values))
+
+        for value in values[:600]:
+            moments.remove(value)
+        self.assertEqual(moments.count, 400)
+        self.assertAlmostEqual(moments.variance, statistics.pvariance(values[600:]))
+
+        other = Moments()
+        for value in values[:600]:
+            other.add(value)
+        moments.merge(other)
+        self.assertAlmostEqual(moments.mean, statistics.mean(values))
+        self.assertAlmostEqual(moments.variance, statistics.pvariance(values))
+        self.assertIsNone(Moments().variance)
+
+
+class TestTradeStatistics(unittest.TestCase):
+    symbol = "AMZN"
+    timestamp_start = datetime(2018, 5, 4, 12, 30)
+
+    def make_trades(self, count, seed):
+        generator = random.Random(seed)
+        trades = []
+        for i in range(count):
+            delay = generator.uniform(0, 300) if generator.random() < 0.1 else 0
+            trades.append(Trade(self.symbol, StockType.COMMON,
+                                self.timestamp_start + timedelta(seconds=i * 13 - delay),
+                                generator.randint(1, 500), round(generator.uniform(90, 110), 2),
+                                BuySellIndicator.BUY))
+        return trades
+
+    def assert_live(self, stock, window):
+        trades = stock.trades
+        timestamps, prices, quantities = list(trades.timestamps), list(trades.prices), list(trades.quantities)
+        cutoff = timestamps[-1] - timedelta_to_ns(window)
+        live = [i for i, timestamp in enumerate(timestamps) if timestamp >= cutoff]
+        result = stock.statistics()
+
+        self.assertEqual(result.prices.count, len(live))
+        live_prices = sorted(prices[i] for i in live)
+        live_quantities = sorted(quantities[i] for i in live)
+        for q in (0.0, 0.5, 0.95, 1.0):
+            expected = live_prices[int(q * (len(live) - 1))]
+            self.assertLessEqual(abs(result.prices.quantile(q) - expected), 0.01 * expected + 1e-9)
+            expected = live_quantities[int(q * (len(live) - 1))]
+            self.assertLessEqual(abs(result.quantities.quantile(q) - expected), 0.01 * expected + 1e-9)
+
+        returns = [math.log(prices[i + 1] / prices[i]) for i in live[:-1]]
+        self.assertEqual(result.returns.count, len(returns))
+        if len(returns) > 0:
+            self.assertAlmostEqual(result.realized_volatility, math.sqrt(sum(value * value for value in returns)))
+            self.assertAlmostEqual(result.volatility, math.sqrt(statistics.pvariance(returns)))
+
+    def test_stock(self):
+        window = timedelta(minutes=10)
+        trades = self.make_trades(600, 4)
+        for columnar in (False, True):
+            stock = Stock(self.symbol, StockType.COMMON, 25, 1.0, None, columnar=columnar,
+                          retention=RetentionPolicy(timedelta(minutes=8)))
+            stock.trades.chunk_size = 16
+            for trade in trades[:50]:
+                stock.record_trade(trade)
+            stock.track_statistics(window)
+            self.assert_live(stock, window)
+
+            for trade in trades[50:200]:
+                stock.record_trade(trade)
+                self.assert_live(stock, window)
+            for start in range(200, 600, 40):
+                stock.record_trades(trades[start:start + 40])
+                self.assert_live(stock, window)
+            batch = trades[560:600]
+            stock.load_columns([datetime_to_ns(trade.timestamp) for trade in batch],
+                               [trade.price_per_share for trade in batch], [trade.quantity for trade in batch],
+                               [trade.buy_sell_indicator.value for trade in batch])
+            self.assert_live(stock, window)
+
+        snapshot = stock.snapshot()
+        stock.record_trade(Trade(self.symbol, StockType.COMMON, self.timestamp_start + timedelta(hours=10), 1, 1.0,
+                                 BuySellIndicator.BUY))
+        self.assertEqual(stock.statistics().prices.count, 1)
+        self.assertGreater(snapshot.statistics().prices.count, 1)
+
+        self.assertIsNone(Stock(self.symbol, StockType.COMMON, 25, 1.0, None).statistics())
+        with self.assertRaises(ValueError):
+            stock.track_statistics(timedelta(0))
+        with self.assertRaises(ValueError):
+            stock.track_statistics(window, relative_accuracy=1.0)
+
+    def test_merge(self):
+        first, second = TradeStatistics(), TradeStatistics()
+        for value in (1.0, 2.0, 3.0):
+            first.prices.add(value)
+            first.returns.add(value / 100)
+        for value in (4.0, 5.0):
+            second.prices.add(value)
+            second.returns.add(value / 100)
+        first.merge(second)
+        self.assertEqual(first.prices.count, 5)
+        self.assertAlmostEqual(first.prices.quantile(0.5), 3.0, delta=0.03)
+        self.assertAlmostEqual(first.realized_volatility, math.sqrt(sum((v / 100) ** 2 for v in range(1, 6))))
@@ -0,0 +1,234 @@
+import mmap
+import os
+import struct
+
+from array import array
+
+from super_simple_stocks import Trade, StockType, GlobalBeverageCorporationExchange, datetime_to_ns, symbol_and_type_key
+
+# Every trade is one fixed record: epoch nanoseconds, price per share, quantity, buy/sell
+# indicator value, stock type value and the symbol, UTF-8 encoded and padded with zeros.
+RECORD = struct.Struct('<qdqBB16s')
+
+JOURNAL_MAGIC = b'SSSJ0001'
+# A snapshot starts with its magic and the offset of the journal it has been taken at.
+SNAPSHOT_HEADER = struct.Struct('<8sQ')
+SNAPSHOT_MAGIC = b'SSSS0001'
+
+# The number of records grouped by stock and loaded at a time by replay().
+LOAD_SLICE = 65536
+
+
+def _encode_symbol(symbol: str) -> bytes:
+    """
+    :param symbol: The short name of a stock
+    :return: The symbol as it is stored in a journal record.
+    :raise ValueError:
+    """
+    encoded = symbol.encode('utf-8')
+    if len(encoded) > 16:
+        msg = "The symbol {symbol} does not fit in a journal record.".format(symbol=symbol)
+        raise ValueError(msg)
+    return encoded
+
+
+def pack_trade(trade: Trade) -> bytes:
+    """
+    :param trade: The trade to pack
+    :return: The fixed record of the trade.
+    :raise ValueError:
+    """
+    try:
+        return RECORD.pack(datetime_to_ns(trade.timestamp), trade.price_per_share, trade.quantity,
+                           trade.buy_sell_indicator.value, trade.stock_type.value, _encode_symbol(trade.symbol))
+    except struct.error as error:
+        msg = "The trade {trade} does not fit in a journal record: {error}".format(trade=trade, error=error)
+        raise ValueError(msg)
+
+
+class TradeJournal:
+    """
+    An append-only file of fixed records, one per recorded trade. Records are buffered and
+    written, then synced to disk, every sync_every trades, or when flush() is called.
+    .. note:: Pass the journal to GlobalBeverageCorporationExchange to append every trade it
+        records, and use replay() to rebuild an exchange from it after a restart. The exchange
+        packs each trade with pack() before recording it, so a trade that does not fit in a
+        record is rejected instead of being recorded without being journaled.
+    """
+    def __init__(self, path: str, sync_every: int=1000):
+        """
+        :param path: The path of the journal file, which is created if it does not exist
+        :param sync_every: The number of trades after which the buffered records are written and synced
+        :raise ValueError:
+        """
+        self.path = path
+        self.sync_every = sync_every
+        self._buffer = []
+        self._file = open(path, 'ab')
+
+        if self._file.tell() == 0:
+            self._file.write(JOURNAL_MAGIC)
+            self.flush()
+        else:
+            with open(path, 'rb') as journal:
+                if journal.read(len(JOURNAL_MAGIC)) != JOURNAL_MAGIC:
+                    msg = "The file {path} is not a trade journal.".format(path=path)
+                    raise ValueError(msg)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def append(self, trade: Trade):
+        """
+        :param trade: The recorded trade to append
+        :raise ValueError:
+        """
+        self.append_records((pack_trade(trade),))
+
+    def pack(self, trade: Trade) -> bytes:
+        """
+        :param trade: The trade to pack
+        :return: The record of the trade, to be given to append_records once it is recorded.
+        :raise ValueError:
+        """
+        return pack_trade(trade)
+
+    def append_records(self, records):
+        """
+        :param records: An iterable of the records of recorded trades, as returned by pack()
+        """
+        self._buffer.extend(records)
+        if len(self._buffer) >= self.sync_every:
+            self.flush()
+
+    def extend(self, trades):
+        """
+        :param trades: An iterable of the recorded trades to append
+        :raise ValueError:
+        """
+        for trade in trades:
+            self.append(trade)
+
+    def flush(self):
+        """Writes the buffered records and syncs the journal to disk."""
+        self._file.write(b''.join(self._buffer))
+        self._buffer = []
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def offset(self) -> int:
+        """
+        :return: The size of the journal in bytes, including the buffered records.
+        """
+        return self._file.tell() + RECORD.size * len(self._buffer)
+
+    def snapshot(self, exchange: GlobalBeverageCorporationExchange, path: str):
+        """Writes the trades currently recorded by the exchange to a snapshot file, so replay()
+        only has to read the journal from this point on.
+        :param exchange: The exchange this journal belongs to
+        :param path: The path of the snapshot file, which is replaced atomically
+        :raise ValueError:
+        """
+        self.flush()
+        stocks = exchange.get_all_stocks()
+        symbols = {symbol_and_type: _encode_symbol(stock.symbol) for symbol_and_type, stock in stocks.items()}
+
+        with open(path + '.tmp', 'wb') as snapshot:
+            snapshot.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, self.offset()))
+            for symbol_and_type, stock in stocks.items():
+                symbol = symbols[symbol_and_type]
+                for timestamps, prices, quantities, sides in stock.trades.iter_columns():
+                    snapshot.write(b''.join(RECORD.pack(timestamp, price, quantity, side, stock.stock_type.value,
+                                                        symbol)
+                                            for timestamp, price, quantity, side in
+                                            zip(timestamps, prices, quantities, sides)))
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(path + '.tmp', path)
+
+
+def _load_records(exchange: GlobalBeverageCorporationExchange, view) -> int:
+    """Groups the records by stock into columns, LOAD_SLICE records at a time, and loads each
+    slice into the exchange, so only the columns of one slice are held at once.
+    :param exchange: The exchange to load the trades into
+    :param view: A buffer of whole records
+    :return: The number of loaded trades.
+    """
+    keys = {}
+    loaded = 0
+    for start in range(0, len(view), LOAD_SLICE * RECORD.size):
+        with view[start:start + LOAD_SLICE * RECORD.size] as records:
+            columns = {}
+            for timestamp, price, quantity, side, stock_type, symbol in RECORD.iter_unpack(records):
+                try:
+                    group = columns[symbol, stock_type]
+                except KeyError:
+                    group = columns[symbol, stock_type] = (array('q'), array('d'), array('q'), array('B'))
+                group[0].append(timestamp)
+                group[1].append(price)
+                group[2].append(quantity)
+                group[3].append(side)
+
+        for key, (timestamps, prices, quantities, sides) in columns.items():
+            try:
+                symbol_and_type = keys[key]
+            except KeyError:
+                symbol, stock_type = key
+                symbol_and_type = keys[key] = symbol_and_type_key(symbol.rstrip(b'\0').decode('utf-8'),
+                                                                  StockType(stock_type))
+            exchange.load_columns(symbol_and_type, timestamps, prices, quantities, sides)
+            loaded += len(timestamps)
+    return loaded
+
+
+def _map(path: str, offset: int, loader) -> int:
+    """
+    :param path: The path of the file to map
+    :param offset: The offset of the first record in the file
+    :param loader: A callable that is given a buffer of the whole records in the file
+    :return: What loader returns, or 0 if there are no records.
+    """
+    with open(path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        # A record that has been cut short by a crash is ignored.
+        end = offset + (size - offset) // RECORD.size * RECORD.size
+        if end <= offset:
+            return 0
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                with view[offset:end] as records:
+                    return loader(records)
+
+
+def replay(exchange: GlobalBeverageCorporationExchange, journal_path: str, snapshot_path: str=None) -> int:
+    """Rebuilds the recorded trades of an exchange, which must already hold the stocks, from a
+    journal and optionally from a snapshot of it.
+    :param exchange: The exchange to load the trades into, without a journal attached
+    :param journal_path: The path of the journal
+    :param snapshot_path: The path of a snapshot taken with TradeJournal.snapshot, or None
+    :return: The number of loaded trades.
+    :raise ValueError:
+    .. note:: The files are memory-mapped and the trades are loaded column by column, a slice of
+        LOAD_SLICE records at a time, without constructing instances of Trade unless the stock
+        keeps them.
+    """
+    offset = len(JOURNAL_MAGIC)
+    loaded = 0
+
+    if snapshot_path is not None and os.path.exists(snapshot_path):
+        with open(snapshot_path, 'rb') as snapshot:
+            magic, offset = SNAPSHOT_HEADER.unpack(snapshot.read(SNAPSHOT_HEADER.size))
+        if magic != SNAPSHOT_MAGIC:
+            msg = "The file {path} is not a trade journal snapshot.".format(path=snapshot_path)
+            raise ValueError(msg)
+        loaded += _map(snapshot_path, SNAPSHOT_HEADER.size, lambda records: _load_records(exchange, records))
+
+    return loaded + _map(journal_path, offset, lambda records: _load_records(exchange, records))
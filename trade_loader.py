@@ -0,0 +1,208 @@
+import csv
+import time
+
+from datetime import datetime
+from itertools import islice
+from super_simple_stocks import Trade, StockType, BuySellIndicator, GlobalBeverageCorporationExchange, ns_to_datetime
+from trade_journal import RECORD, JOURNAL_MAGIC
+
+CSV_HEADER = ['symbol', 'stock_type', 'timestamp', 'quantity', 'price_per_share', 'buy_sell_indicator']
+
+
+class LoadReport:
+    """The outcome of loading a file of trades into an exchange."""
+    def __init__(self, path: str, max_samples: int=100):
+        """
+        :param path: The path of the loaded file
+        :param max_samples: The number of rejected rows to keep as samples
+        """
+        self.path = path
+        self.rows = 0
+        self.loaded = 0
+        self.rejected = 0
+        # (row number, row, error message) for the first max_samples rejected rows.
+        self.rejected_samples = []
+        self.seconds = 0.0
+        self._max_samples = max_samples
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def reject(self, row_number: int, row, error: Exception):
+        self.rejected += 1
+        if len(self.rejected_samples) < self._max_samples:
+            self.rejected_samples.append((row_number, row, str(error)))
+
+    def __str__(self):
+        return "{path}: {rows} rows, {loaded} loaded, {rejected} rejected, {rate:.0f} rows/s".format(
+            path=self.path, rows=self.rows, loaded=self.loaded, rejected=self.rejected, rate=self.rows_per_second)
+
+
+def read_csv_chunks(file, chunk_size: int):
+    """
+    :param file: A text file of trades in CSV, with or without the CSV_HEADER row
+    :param chunk_size: The number of rows in each chunk
+    :return: A generator of (number of the first row, list of rows) for each chunk.
+    """
+    reader = csv.reader(file)
+    row_number = 1
+    first = next(reader, None)
+    if first is None:
+        return
+    if first != CSV_HEADER:
+        reader = _prepend(first, reader)
+    else:
+        row_number += 1
+
+    while True:
+        rows = list(islice(reader, chunk_size))
+        if len(rows) == 0:
+            return
+        yield row_number, rows
+        row_number += len(rows)
+
+
+def _prepend(first, rows):
+    yield first
+    yield from rows
+
+
+def _parse_csv_row(row: [str]) -> Trade:
+    """
+    :param row: The fields of one trade
+    :return: The trade, validated by Trade.
+    :raise ValueError:
+    """
+    if len(row) != len(CSV_HEADER):
+        msg = "A row must have {n} fields.".format(n=len(CSV_HEADER))
+        raise ValueError(msg)
+    symbol, stock_type, timestamp, quantity, price_per_share, buy_sell_indicator = row
+    try:
+        buy_sell_indicator = BuySellIndicator[buy_sell_indicator]
+    except KeyError:
+        msg = "The buy/sell indicator is wrong."
+        raise ValueError(msg)
+    # An unknown type of stock is passed on as it is, so Trade rejects it.
+    return Trade(symbol, StockType.__members__.get(stock_type, stock_type), datetime.fromisoformat(timestamp),
+                 int(quantity), float(price_per_share), buy_sell_indicator)
+
+
+def parse_csv_chunk(first_row_number: int, rows: [[str]], report: LoadReport) -> ([Trade], [int]):
+    """Parses a chunk of rows, column by column while they are all valid, and row by row otherwise
+    to find the invalid ones.
+    :param first_row_number: The number of the first row of the chunk in the file
+    :param rows: The fields of the trades
+    :param report: The report to which the invalid rows are added
+    :return: The valid trades and their row numbers.
+    """
+    try:
+        # zip() would drop the extra fields of a longer row, so those go row by row.
+        if not all(len(row) == len(CSV_HEADER) for row in rows):
+            msg = "A row must have {n} fields.".format(n=len(CSV_HEADER))
+            raise ValueError(msg)
+        symbols, stock_types, timestamps, quantities, prices, buy_sell_indicators = zip(*rows)
+        members = StockType.__members__
+        trades = list(map(Trade, symbols, [members.get(name, name) for name in stock_types],
+                          map(datetime.fromisoformat, timestamps), map(int, quantities), map(float, prices),
+                          [BuySellIndicator[name] for name in buy_sell_indicators]))
+        return trades, list(range(first_row_number, first_row_number + len(rows)))
+    except (ValueError, KeyError, TypeError):
+        pass
+
+    trades = []
+    row_numbers = []
+    for row_number, row in enumerate(rows, first_row_number):
+        try:
+            trades.append(_parse_csv_row(row))
+            row_numbers.append(row_number)
+        except (ValueError, TypeError) as error:
+            report.reject(row_number, row, error)
+    return trades, row_numbers
+
+
+def read_binary_chunks(file, chunk_size: int):
+    """
+    :param file: A binary file of trade_journal.RECORD records, such as a trade journal
+    :param chunk_size: The number of records in each chunk
+    :return: A generator of (number of the first record, list of unpacked records) for each chunk.
+    .. note:: A record that has been cut short at the end of the file is ignored.
+    """
+    start = file.read(len(JOURNAL_MAGIC))
+    if start != JOURNAL_MAGIC:
+        file.seek(0)
+
+    record_number = 1
+    while True:
+        data = file.read(chunk_size * RECORD.size)
+        data = data[:len(data) // RECORD.size * RECORD.size]
+        if len(data) == 0:
+            return
+        records = list(RECORD.iter_unpack(data))
+        yield record_number, records
+        record_number += len(records)
+
+
+def parse_binary_chunk(first_record_number: int, records: [tuple], report: LoadReport) -> ([Trade], [int]):
+    """
+    :param first_record_number: The number of the first record of the chunk in the file
+    :param records: The unpacked records
+    :param report: The report to which the invalid records are added
+    :return: The valid trades and their record numbers.
+    """
+    trades = []
+    record_numbers = []
+    for record_number, record in enumerate(records, first_record_number):
+        timestamp, price_per_share, quantity, buy_sell_indicator, stock_type, symbol = record
+        try:
+            trades.append(Trade(symbol.rstrip(b'\0').decode('utf-8'), StockType(stock_type),
+                                ns_to_datetime(timestamp), quantity, price_per_share,
+                                BuySellIndicator(buy_sell_indicator)))
+            record_numbers.append(record_number)
+        except ValueError as error:
+            report.reject(record_number, record, error)
+    return trades, record_numbers
+
+
+def _load(exchange: GlobalBeverageCorporationExchange, chunks, parse, report: LoadReport) -> LoadReport:
+    begin = time.perf_counter()
+    for first_number, rows in chunks:
+        report.rows += len(rows)
+        trades, numbers = parse(first_number, rows, report)
+        number_of = {trade: number for trade, number in zip(trades, numbers)}
+
+        rejected = exchange.record_trades(trades)
+        for trade, error in rejected:
+            report.reject(number_of[trade], trade, error)
+        report.loaded += len(trades) - len(rejected)
+    report.seconds = time.perf_counter() - begin
+    return report
+
+
+def load_csv(exchange: GlobalBeverageCorporationExchange, path: str, chunk_size: int=10000,
+             max_samples: int=100) -> LoadReport:
+    """Streams a CSV file of trades into the exchange, one chunk of rows at a time, so the memory
+    used does not depend on the size of the file.
+    :param exchange: The exchange that records the trades
+    :param path: The path of the file, with the columns in CSV_HEADER, timestamps in ISO 8601 and
+        the names of the StockType and BuySellIndicator members
+    :param chunk_size: The number of rows parsed and recorded at once
+    :param max_samples: The number of rejected rows to keep in the report
+    :return: The report of the load.
+    """
+    with open(path, newline='') as file:
+        return _load(exchange, read_csv_chunks(file, chunk_size), parse_csv_chunk, LoadReport(path, max_samples))
+
+
+def load_binary(exchange: GlobalBeverageCorporationExchange, path: str, chunk_size: int=10000,
+                max_samples: int=100) -> LoadReport:
+    """Streams a binary file of trade_journal.RECORD records, such as a trade journal, into the
+    exchange, one chunk of records at a time.
+    :param exchange: The exchange that records the trades
+    :param path: The path of the file
+    :param chunk_size: The number of records parsed and recorded at once
+    :param max_samples: The number of rejected records to keep in the report
+    :return: The report of the load.
+    """
+    with open(path, 'rb') as file:
+        return _load(exchange, read_binary_chunks(file, chunk_size), parse_binary_chunk, LoadReport(path, max_samples))